@@ -4,6 +4,8 @@ import matplotlib.colors as colors
 import numpy as np
 import os
 import xml.etree.ElementTree as ET
+from network_topology import load_topology
+from fcd_store import open_store
 
 # ================= 美化配置 (可选) =================
 import matplotlib as mpl
@@ -152,10 +154,11 @@ def plot_aligned_trajectory(test_name='20251122_20_cav_first', in_dir='east'):
     TL_FILE = "test/traffic_light.add.xml"  # 交通信号灯配置文件路径
     TARGET_VTYPE = "taxi"
 
-    # 1. 定义路网拓扑：{方向: (进口车道, 交叉口内部车道)}
+    # 1. 定义路网拓扑：{方向: (进口车道, 交叉口内部车道)}，内部车道由路网拓扑推导
+    topology = load_topology()
     LANE_MAP = {
-        'east': ('east_in_3', 'center_5_2'),
-        'west': ('west_in_3', 'center_15_3')
+        'east': ('east_in_3', topology.lane_chain('east_in_3')[1]),
+        'west': ('west_in_3', topology.lane_chain('west_in_3')[1])
     }
 
     if in_dir not in LANE_MAP:
@@ -174,64 +177,29 @@ def plot_aligned_trajectory(test_name='20251122_20_cav_first', in_dir='east'):
     if tl_config:
         print(f"成功解析交通信号灯配置，周期长度: {tl_config['cycle_length']}秒")
 
-    # ================= 第一步：数据读取与存储 =================
-    # 我们需要先存下来，计算出进口道的最大pos，再进行坐标转换
-    raw_data = {}  # {vid: [{'t': time, 'lane': lane, 'pos': pos, 'v': speed}, ...]}
-    max_inlet_pos_observed = 0.0  # 用于记录进口道观测到的最大位置
-
-    try:
-        context = ET.iterparse(FCD_FILE, events=("start", "end"))
-        context = iter(context)
-        event, root = next(context)
-
-        for event, elem in context:
-            if event == "end" and elem.tag == "timestep":
-                current_time = float(elem.get("time"))
-                if current_time > 3600:
-                    elem.clear()
-                    continue
-
-                for veh in elem.findall("vehicle"):
-                    lane = veh.get("lane")
-                    vtype = veh.get("type")
-                    vid = veh.get("id")
-
-                    # 筛选车型
-                    if TARGET_VTYPE and (TARGET_VTYPE not in vtype):
-                        continue
-
-                    # 筛选感兴趣的车道
-                    # 使用 exact match 或者 startswith 防止匹配到错误的副作用
-                    # 这里假设 sumolib 没有改乱 lane id，用包含匹配
-                    is_in_lane = IN_LANE_ID in lane
-                    is_inner_lane = INNER_LANE_ID in lane
-
-                    if not (is_in_lane or is_inner_lane):
-                        continue
-
-                    pos = float(veh.get("pos"))
-                    speed = float(veh.get("speed"))
-
-                    # 更新进口道的最大观测位置 (用于后续对齐)
-                    if is_in_lane:
-                        if pos > max_inlet_pos_observed:
-                            max_inlet_pos_observed = pos
-
-                    if vid not in raw_data:
-                        raw_data[vid] = []
-
-                    raw_data[vid].append({
-                        't': current_time,
-                        'lane': lane,
-                        'pos': pos,
-                        'v': speed,
-                        'is_inlet': is_in_lane  # 标记是否在进口道
-                    })
-
-                root.clear()
-    except FileNotFoundError:
+    # ================= 第一步：数据读取与筛选 =================
+    # 读取列式存储（首次使用时由 fcd.xml 转换，见 fcd_store.py），只取 3600s 内的行
+    store = open_store(FCD_FILE)
+    if store is None:
         print(f"错误: 找不到文件 {FCD_FILE}")
         return
+    start, stop = store.rows(None, 3600)
+    t = np.asarray(store.column("time")[start:stop])
+    veh = np.asarray(store.column("veh")[start:stop])
+    lane = np.asarray(store.column("lane")[start:stop])
+    pos = np.asarray(store.column("pos")[start:stop], dtype=np.float64)
+    speed = np.asarray(store.column("speed")[start:stop])
+
+    # 筛选车型与感兴趣的车道（在字典表上判断一次，再按下标映射到每一行）
+    # 这里假设 sumolib 没有改乱 lane id，用包含匹配
+    type_mask = store.matching(store.types, lambda v_type: not TARGET_VTYPE or TARGET_VTYPE in v_type)
+    is_in_lane = store.matching(store.lanes, lambda lane_id: IN_LANE_ID in lane_id)[lane]
+    is_inner_lane = store.matching(store.lanes, lambda lane_id: INNER_LANE_ID in lane_id)[lane]
+    keep = type_mask[np.asarray(store.column("type")[start:stop])] & (is_in_lane | is_inner_lane)
+
+    # 进口道观测到的最大位置 (用于后续对齐)
+    inlet_pos = pos[keep & is_in_lane]
+    max_inlet_pos_observed = max(0.0, float(inlet_pos.max())) if inlet_pos.size else 0.0
 
     # ================= 第二步：坐标对齐与转换 =================
     # 核心逻辑：使用 max_inlet_pos_observed 作为基准
@@ -242,26 +210,16 @@ def plot_aligned_trajectory(test_name='20251122_20_cav_first', in_dir='east'):
     print(f"检测到 {IN_LANE_ID} 的最大行驶位置(StopLine参考点)为: {max_inlet_pos_observed:.2f} m")
     print("正在执行坐标缝合...")
 
-    plot_trajectories = {}  # {vid: {'t':[], 'p':[], 'v':[]}}
-
-    for vid, records in raw_data.items():
-        plot_trajectories[vid] = {'t': [], 'p': [], 'v': []}
+    # 进口道：减去最大值，实现 0 对齐（比如最大是192.5，当前是190.0，画出来就是 2.5）；内部道：直接取负
+    plot_pos = np.where(is_in_lane, max_inlet_pos_observed - pos, -pos)
 
-        for r in records:
-            if r['is_inlet']:
-                # 进口道：减去最大值，实现 0 对齐
-                # 比如最大是192.5，当前是190.0，画出来就是 2.5 (距离停止线)
-                # 当前是192.5，画出来就是 0.0
-                plot_pos = max_inlet_pos_observed - r['pos']
-            else:
-                # 内部道：直接取负
-                plot_pos = -r['pos']
-
-            # 过滤掉异常跳变 (可选：如果数据中有瞬间跳变太大可以过滤)
-
-            plot_trajectories[vid]['t'].append(r['t'])
-            plot_trajectories[vid]['p'].append(plot_pos)
-            plot_trajectories[vid]['v'].append(r['v'])
+    # 按车辆分组（车辆下标按首次出现的顺序编号，稳定排序保持各车的时间顺序）
+    rows = np.flatnonzero(keep)
+    rows = rows[np.argsort(veh[rows], kind="stable")]
+    vids, first = np.unique(veh[rows], return_index=True)
+    plot_trajectories = {}  # {vid: {'t':[], 'p':[], 'v':[]}}
+    for vid, group in zip(vids.tolist(), np.split(rows, first[1:])):
+        plot_trajectories[store.vehicles[vid]] = {'t': t[group], 'p': plot_pos[group], 'v': speed[group]}
 
     print(f"准备绘图，共 {len(plot_trajectories)} 条轨迹...")
 
@@ -3,13 +3,54 @@ import numpy as np
 import os
 import json
 import time
+from network_topology import NET_FILE, load_topology
+from fcd_store import CHUNK_ROWS, open_store
+
+# 车辆类别（新增 HV_same 类别）与统计排队的进口道
+CATEGORIES = ('HV', 'HV_same', 'CAV')
+TARGET_EDGES = ('east_in', 'west_in', 'north_in', 'south_in')
+# 在线指标（cav_plus.py --metrics online，见 online_metrics.py）：代替 fcd.xml / queue.xml
+METRICS_FILE = 'online_metrics.json'
+
+
+def vehicle_category(vehicle_id, v_type):
+    """
+    核心分类逻辑：
+    1. CAV: 类型含 taxi
+    2. HV_same: 类型不含 taxi，但路线是东西向直行 (和 CAV 一样)
+    3. HV: 其他所有普通车 (南北向、左转车等)
+    """
+    # 判定是否为 CAV
+    is_taxi = 'taxi' in v_type
+    if not v_type and 'taxi' in vehicle_id: # 兼容处理
+        is_taxi = True
+        
+    # 判定是否为东西向直行 (Target Route)
+    is_ew = ('east_in' in vehicle_id) or ('west_in' in vehicle_id)
+    is_straight = 'straight' in vehicle_id
+    is_target_route = is_ew and is_straight
+
+    if is_taxi and is_target_route:
+        return 'CAV'
+    elif is_target_route:
+        return 'HV_same'
+    else:
+        return 'HV'
+
 
 class SumoAnalyzer:
-    def __init__(self, files):
+    def __init__(self, files, min_depart=None, meso_edges=None, online=None, net_file=NET_FILE):
         self.files = files
+        # 在线指标（online_metrics.json 的内容）：给出时代替 fcd.xml / queue.xml
+        self.online = online
+        # 热启动运行：只统计分叉时刻之后出发的车辆（预热阶段出发的车辆缺少排放设备，且不受控制）
+        self.min_depart = min_depart
+        # 中观仿真的道路（目前总是整个路网）：车辆只有路段级速度，没有舒适度指标（输出为 null），
+        # 延误与排队照常统计
+        self.meso_edges = sorted(meso_edges or ())
+        self.meso = bool(self.meso_edges)
         # 1. Tripinfo 数据容器 (宏观)
-        # 新增 HV_same 类别
-        self.cats = ['HV', 'HV_same', 'CAV']
+        self.cats = list(CATEGORIES)
         
         self.data = {cat: {'timeLoss': [], 'waitingCount': [], 'duration': [], 'routeLength': [], 'CO2': []} 
                      for cat in self.cats}
@@ -23,36 +64,20 @@ class SumoAnalyzer:
             'collisions': 0,
             'emergencyStops': 0,
             'max_queue_hv': 0.0,
-            'max_queue_cav': 0.0
+            'max_queue_cav': 0.0,
+            'meso': self.meso,
+            'meso_edges': self.meso_edges
         }
         
         # 4. 配置
-        self.cav_dedicated_lanes = {'east_in_3', 'west_in_3'}
-        self.target_edges = ('east_in', 'west_in', 'north_in', 'south_in')
+        self.target_edges = TARGET_EDGES
+        # CAV 专用道：进口道上仅允许 taxi 的车道（取自本次运行所用路网的拓扑）
+        self.topology = load_topology(net_file)
+        self.cav_dedicated_lanes = {lane for lane in self.topology.dedicated_lanes('taxi')
+                                    if lane.startswith(self.target_edges)}
 
     def get_vehicle_category(self, vehicle_id, v_type):
-        """
-        核心分类逻辑：
-        1. CAV: 类型含 taxi
-        2. HV_same: 类型不含 taxi，但路线是东西向直行 (和 CAV 一样)
-        3. HV: 其他所有普通车 (南北向、左转车等)
-        """
-        # 判定是否为 CAV
-        is_taxi = 'taxi' in v_type
-        if not v_type and 'taxi' in vehicle_id: # 兼容处理
-            is_taxi = True
-            
-        # 判定是否为东西向直行 (Target Route)
-        is_ew = ('east_in' in vehicle_id) or ('west_in' in vehicle_id)
-        is_straight = 'straight' in vehicle_id
-        is_target_route = is_ew and is_straight
-
-        if is_taxi and is_target_route:
-            return 'CAV'
-        elif is_target_route:
-            return 'HV_same'
-        else:
-            return 'HV'
+        return vehicle_category(vehicle_id, v_type)
 
     def parse_statistic(self):
         """解析 statistic.xml"""
@@ -104,6 +129,9 @@ class SumoAnalyzer:
                 if elem.tag == 'tripinfo':
                     v_id = elem.get('id')
                     v_type = elem.get('vType')
+                    if self.min_depart is not None and float(elem.get('depart')) < self.min_depart:
+                        elem.clear()
+                        continue
                     
                     # 使用新的分类逻辑
                     cat = self.get_vehicle_category(v_id, v_type)
@@ -124,59 +152,80 @@ class SumoAnalyzer:
             print(f"Error parsing tripinfo.xml: {e}")
 
     def parse_fcd(self):
-        """解析 fcd.xml 获取加速度和舒适度指标"""
-        if not os.path.exists(self.files['fcd']):
+        """读取 fcd.xml 的列式存储（首次使用时转换，见 fcd_store.py）获取加速度和舒适度指标"""
+        store = open_store(self.files['fcd'])
+        if store is None:
             print(f"Warning: {self.files['fcd']} not found. Skipping comfort analysis.")
             return
 
-        print("正在解析 FCD 数据 (可能耗时较长)...")
         start_time = time.time()
-        
-        last_state = {} 
-
         try:
-            for event, elem in ET.iterparse(self.files['fcd'], events=('end',)):
-                if elem.tag == 'timestep':
-                    time_now = float(elem.get('time'))
-                    
-                    for veh in elem.findall('vehicle'):
-                        v_id = veh.get('id')
-                        v_type = veh.get('type', '')
-                        v_speed = float(veh.get('speed'))
-                        
-                        # 使用新的分类逻辑
-                        cat = self.get_vehicle_category(v_id, v_type)
-                        
-                        if v_id in last_state:
-                            prev = last_state[v_id]
-                            dt = time_now - prev['time']
-                            
-                            if dt > 0:
-                                # 计算加速度 a
-                                curr_accel = (v_speed - prev['speed']) / dt
-                                
-                                # 计算 Jerk
-                                if prev['accel'] is not None:
-                                    curr_jerk = (curr_accel - prev['accel']) / dt
-                                    
-                                    # 累加统计
-                                    self.fcd_stats[cat]['sum_abs_accel'] += abs(curr_accel)
-                                    self.fcd_stats[cat]['sum_abs_jerk'] += abs(curr_jerk)
-                                    self.fcd_stats[cat]['count'] += 1
-                                
-                                # 更新状态
-                                last_state[v_id]['speed'] = v_speed
-                                last_state[v_id]['accel'] = curr_accel
-                                last_state[v_id]['time'] = time_now
-                        else:
-                            last_state[v_id] = {'speed': v_speed, 'accel': None, 'time': time_now}
-                    
-                    elem.clear() 
+            # 存储按时间排序：逐块（CHUNK_ROWS 行）读取所需的列，内存占用与 fcd 大小无关。
+            # 跨块的连续性由每辆车最近一个样本的时间 / 速度 / 加速度保存（车辆 ID 已是连续下标）
+            n_veh = len(store.vehicles)
+            last_t = np.full(n_veh, np.nan)
+            last_v = np.full(n_veh, np.nan)
+            last_a = np.full(n_veh, np.nan)
+            n_types = max(len(store.types), 1)
+            pair_cat = {}      # 车辆下标 * 类型数 + 类型下标 -> 类别下标
+            for start in range(0, len(store), CHUNK_ROWS):
+                stop = min(start + CHUNK_ROWS, len(store))
+                veh = np.asarray(store.column('veh')[start:stop])
+                # 块内按车辆稳定排序，同一车辆内保持时间顺序
+                order = np.argsort(veh, kind='stable')
+                veh = veh[order]
+                t = np.asarray(store.column('time')[start:stop])[order]
+                speed = np.asarray(store.column('speed')[start:stop])[order]
+                types = np.asarray(store.column('type')[start:stop])[order]
+
+                # 每行的上一个样本：块内同一车辆的上一行，车辆在块内首次出现时取上一块保存的样本
+                first = np.ones(len(veh), dtype=bool)
+                first[1:] = veh[1:] != veh[:-1]
+                prev_t = np.empty(len(veh))
+                prev_v = np.empty(len(veh))
+                prev_t[1:], prev_v[1:] = t[:-1], speed[:-1]
+                prev_t[first], prev_v[first] = last_t[veh[first]], last_v[veh[first]]
+
+                # 相邻两个样本之间才有加速度（没有时为 NaN），相邻两个加速度都存在时才有加加速度，与逐样本计算一致
+                dt = t - prev_t
+                link = dt > 0          # 没有上一个样本时 dt 为 NaN
+                accel = np.full(len(veh), np.nan)
+                accel[link] = (speed[link] - prev_v[link]) / dt[link]
+                prev_a = np.empty(len(veh))
+                prev_a[1:] = accel[:-1]
+                prev_a[first] = last_a[veh[first]]
+                counted = link & ~np.isnan(prev_a)
+                jerk = np.zeros(len(veh))
+                jerk[counted] = (accel[counted] - prev_a[counted]) / dt[counted]
+
+                # 保存每辆车在本块的最后一个样本
+                last = np.ones(len(veh), dtype=bool)
+                last[:-1] = first[1:]
+                last_t[veh[last]], last_v[veh[last]], last_a[veh[last]] = t[last], speed[last], accel[last]
+
+                # 分类只取决于车辆 ID 与类型：对出现过的 (车辆, 类型) 组合各分类一次
+                pairs, inverse = np.unique(veh.astype(np.int64) * n_types + types, return_inverse=True)
+                for k in pairs.tolist():
+                    if k not in pair_cat:
+                        pair_cat[k] = self.cats.index(self.get_vehicle_category(store.vehicles[k // n_types],
+                                                                                store.types[k % n_types]))
+                cat_idx = np.array([pair_cat[k] for k in pairs.tolist()], dtype=np.int8)[inverse]
+                for i, cat in enumerate(self.cats):
+                    mask = counted & (cat_idx == i)
+                    self.fcd_stats[cat]['sum_abs_accel'] += float(np.abs(accel[mask]).sum())
+                    self.fcd_stats[cat]['sum_abs_jerk'] += float(np.abs(jerk[mask]).sum())
+                    self.fcd_stats[cat]['count'] += int(mask.sum())
         except Exception as e:
             print(f"Error parsing fcd.xml: {e}")
-        
-        del last_state
-        print(f"FCD 解析完成，耗时: {time.time() - start_time:.2f}s")
+
+        print(f"FCD 统计完成，耗时: {time.time() - start_time:.2f}s")
+
+    def load_online(self):
+        """使用仿真中累计的舒适度与排队指标（cav_plus.py --metrics online）"""
+        for cat in self.cats:
+            self.fcd_stats[cat] = dict(self.online['fcd_stats'][cat])
+        self.global_stats['max_queue_hv'] = self.online['max_queue_hv']
+        self.global_stats['max_queue_cav'] = self.online['max_queue_cav']
 
     def calculate_results(self):
         """汇总计算所有指标"""
@@ -202,8 +251,10 @@ class SumoAnalyzer:
             else:
                 avg_delay = avg_stops = avg_co2 = avg_speed = 0.0
 
-            # 舒适度统计 (FCD)
-            if n_fcd > 0:
+            # 舒适度统计 (FCD)；中观仿真没有舒适度指标
+            if self.meso:
+                n_fcd = avg_abs_accel = avg_abs_jerk = None
+            elif n_fcd > 0:
                 avg_abs_accel = self.fcd_stats[cat]['sum_abs_accel'] / n_fcd
                 avg_abs_jerk = self.fcd_stats[cat]['sum_abs_jerk'] / n_fcd
             else:
@@ -216,8 +267,8 @@ class SumoAnalyzer:
                 'avg_stops_count': round(avg_stops, 3),
                 'avg_speed_m_s': round(avg_speed, 3),
                 'avg_co2_mg': round(avg_co2, 3),
-                'avg_abs_accel_m_s2': round(avg_abs_accel, 4),
-                'avg_abs_jerk_m_s3': round(avg_abs_jerk, 4)
+                'avg_abs_accel_m_s2': None if avg_abs_accel is None else round(avg_abs_accel, 4),
+                'avg_abs_jerk_m_s3': None if avg_abs_jerk is None else round(avg_abs_jerk, 4)
             }
         
         return results
@@ -236,8 +287,12 @@ class SumoAnalyzer:
         print(f"开始分析...")
         self.parse_statistic()
         self.parse_tripinfo()
-        self.parse_queue()
-        self.parse_fcd()
+        if self.online is None:
+            self.parse_queue()
+            if not self.meso:
+                self.parse_fcd()
+        else:
+            self.load_online()
         
         final_res = self.calculate_results()
         
@@ -275,55 +330,98 @@ class SumoAnalyzer:
         print(f"{'平均停车 (次)':<25} | {m_hv['avg_stops_count']:<12} | {m_hv_s['avg_stops_count']:<15} | {m_cav['avg_stops_count']:<12}")
         print(f"{'平均速度 (m/s)':<25} | {m_hv['avg_speed_m_s']:<12} | {m_hv_s['avg_speed_m_s']:<15} | {m_cav['avg_speed_m_s']:<12}")
         print(f"{'车均排放 (mg CO2)':<25} | {m_hv['avg_co2_mg']:<12} | {m_hv_s['avg_co2_mg']:<15} | {m_cav['avg_co2_mg']:<12}")
-        print(f"{'舒适度: |加速度|':<25} | {m_hv['avg_abs_accel_m_s2']:<12} | {m_hv_s['avg_abs_accel_m_s2']:<15} | {m_cav['avg_abs_accel_m_s2']:<12}")
-        print(f"{'舒适度: |加加速度|':<25} | {m_hv['avg_abs_jerk_m_s3']:<12} | {m_hv_s['avg_abs_jerk_m_s3']:<15} | {m_cav['avg_abs_jerk_m_s3']:<12}")
+        # 中观仿真的舒适度为 None，显示为 "-"
+        a = [m['avg_abs_accel_m_s2'] if m['avg_abs_accel_m_s2'] is not None else '-' for m in (m_hv, m_hv_s, m_cav)]
+        j = [m['avg_abs_jerk_m_s3'] if m['avg_abs_jerk_m_s3'] is not None else '-' for m in (m_hv, m_hv_s, m_cav)]
+        print(f"{'舒适度: |加速度|':<25} | {a[0]:<12} | {a[1]:<15} | {a[2]:<12}")
+        print(f"{'舒适度: |加加速度|':<25} | {j[0]:<12} | {j[1]:<15} | {j[2]:<12}")
         print("="*85 + "\n")
 
 
 # --- 使用示例 ---
-if __name__ == "__main__":
-    # 配置输入文件夹路径
-    FOLDER_NAME = os.listdir("output/plus")[0]
-    for FOLDER_NAME in os.listdir("output/plus"):
-        FOLDER_NAME = f'output/plus/{FOLDER_NAME}'
-        files_config = {
-            'statistic': f'{FOLDER_NAME}/statistic.xml',
-            'tripinfo':  f'{FOLDER_NAME}/tripinfo.xml',
-            'queue':     f'{FOLDER_NAME}/queue.xml',
-            'fcd':       f'{FOLDER_NAME}/fcd.xml'
-        }
-        
-        # 实例化并运行
-        analyzer = SumoAnalyzer(files_config)
-        
-        # 运行分析并导出 JSON
-        analyzer.run(output_json_path=f'{FOLDER_NAME}/analysis_result.json')
-
-all_data = {}
-queue_data = {}
-for FOLDER_NAME in os.listdir("output/plus"):
-    analysis_result = f'output/plus/{FOLDER_NAME}/analysis_result.json'
-    with open(analysis_result, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    # 收集Metrics数据
-    flatten_data = data['Metrics']
-    all_data[FOLDER_NAME] = flatten_data
-    # 收集排队数据
-    queue_data[FOLDER_NAME] = {
-        'max_queue_hv': data['Global']['max_queue_hv'],
-        'max_queue_cav': data['Global']['max_queue_cav']
+def analyze_folder(folder):
+    """分析单次仿真的输出目录，结果写入 {folder}/analysis_result.json"""
+    files_config = {
+        'statistic': f'{folder}/statistic.xml',
+        'tripinfo':  f'{folder}/tripinfo.xml',
+        'queue':     f'{folder}/queue.xml',
+        'fcd':       f'{folder}/fcd.xml'
     }
-import pandas as pd
-
-# 导出Metrics数据
-all_data = pd.DataFrame(all_data)
-os.makedirs('./results/plus', exist_ok=True)
-for indicator in flatten_data['HV'].keys():
-    indicator_result = all_data.map(lambda x: x[indicator])
-    indicator_result.to_csv(f'./results/plus/{indicator}.csv', index=False)
-
-# 导出排队数据
-# 将queue_data转换为DataFrame
-queue_df = pd.DataFrame(queue_data).T  # 转置，使得配置作为行，排队指标作为列
-# 导出为单个CSV文件
-queue_df.to_csv('./results/plus/queue_lengths.csv', index=True)  # 保留配置名称作为索引
+
+    # 从预热状态启动的运行（run_info.json 中有 load_state）只统计分叉之后出发的车辆
+    min_depart = None
+    meso_edges = None
+    online = None
+    net_file = NET_FILE
+    info_file = f'{folder}/run_info.json'
+    if os.path.exists(info_file):
+        with open(info_file, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        if info.get('load_state'):
+            min_depart = info.get('start_time')
+        # 中观仿真（cav_plus.py --meso）的道路：没有 fcd.xml，不统计舒适度
+        meso_edges = info.get('meso_edges')
+        # 运行所用路网（多路口干道等场景），旧的运行记录没有该项时为单路口路网
+        net_file = info.get('net_file', NET_FILE)
+        # 在线指标模式没有 fcd.xml / queue.xml
+        if info.get('metrics') == 'online':
+            with open(f'{folder}/{METRICS_FILE}', 'r', encoding='utf-8') as f:
+                online = json.load(f)
+
+    # 实例化并运行
+    analyzer = SumoAnalyzer(files_config, min_depart=min_depart, meso_edges=meso_edges, online=online,
+                            net_file=net_file)
+
+    # 运行分析并导出 JSON
+    return analyzer.run(output_json_path=f'{folder}/analysis_result.json')
+
+
+def export_tables(root="output/plus"):
+    """汇总 root 下各配置的 analysis_result.json，导出到 results/plus/"""
+    import pandas as pd
+
+    all_data = {}
+    queue_data = {}
+    for FOLDER_NAME in os.listdir(root):
+        analysis_result = f'{root}/{FOLDER_NAME}/analysis_result.json'
+        if not os.path.exists(analysis_result):
+            continue   # 不是结果目录（或尚未分析）
+        with open(analysis_result, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # 收集Metrics数据
+        flatten_data = data['Metrics']
+        all_data[FOLDER_NAME] = flatten_data
+        # 收集排队数据
+        queue_data[FOLDER_NAME] = {
+            'max_queue_hv': data['Global']['max_queue_hv'],
+            'max_queue_cav': data['Global']['max_queue_cav']
+        }
+
+    # 导出Metrics数据
+    all_data = pd.DataFrame(all_data)
+    os.makedirs('./results/plus', exist_ok=True)
+    for indicator in flatten_data['HV'].keys():
+        indicator_result = all_data.map(lambda x: x[indicator])
+        indicator_result.to_csv(f'./results/plus/{indicator}.csv', index=False)
+
+    # 导出排队数据
+    # 将queue_data转换为DataFrame
+    queue_df = pd.DataFrame(queue_data).T  # 转置，使得配置作为行，排队指标作为列
+    # 导出为单个CSV文件
+    queue_df.to_csv('./results/plus/queue_lengths.csv', index=True)  # 保留配置名称作为索引
+
+
+if __name__ == "__main__":
+    import sys
+    # 指定目录时只分析这些目录（multi_cav_plus.py 每个任务结束后调用）；
+    # 否则分析 output/plus 下全部配置并导出汇总表
+    folders = sys.argv[1:]
+    if folders:
+        for FOLDER_NAME in folders:
+            analyze_folder(FOLDER_NAME)
+    else:
+        for FOLDER_NAME in os.listdir("output/plus"):
+            # 只分析仿真结果目录（含 tripinfo.xml）
+            if os.path.exists(f'output/plus/{FOLDER_NAME}/tripinfo.xml'):
+                analyze_folder(f'output/plus/{FOLDER_NAME}')
+        export_tables("output/plus")
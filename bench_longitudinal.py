@@ -0,0 +1,74 @@
+"""
+纵向规划基准测试：比较逐车调用标量版本与一次批量调用的单车耗时，并校验两者结果一致。
+用法: python bench_longitudinal.py [--sizes 10 100 1000] [--repeat 200]
+"""
+import argparse
+import time
+import numpy as np
+from longitudinal_planner import (
+    calculate_longitudinal_command, calculate_longitudinal_batch,
+)
+
+MAX_SPEED = 16.67
+
+
+def make_inputs(n, rng):
+    """随机生成一组车辆状态：约一半刹停、其余为有/无前车的跟车加速"""
+    v = rng.uniform(0.0, MAX_SPEED, n)
+    a = rng.uniform(-3.0, 2.0, n)
+    target = np.where(rng.random(n) < 0.5, 0.0, MAX_SPEED)
+    dist = rng.uniform(0.1, 150.0, n)
+    gap = rng.uniform(0.0, 60.0, n)
+    lead_v = rng.uniform(0.0, MAX_SPEED, n)
+    no_leader = rng.random(n) < 0.3
+    gap[no_leader] = np.nan
+    lead_v[no_leader] = np.nan
+    return v, a, target, dist, gap, lead_v
+
+
+def run_scalar(v, a, target, dist, gap, lead_v):
+    out = []
+    for i in range(len(v)):
+        if target[i] == 0:
+            out.append(calculate_longitudinal_command(v[i], a[i], 0, dist_to_stop=dist[i], dt=0.1))
+        elif gap[i] != gap[i]:
+            out.append(calculate_longitudinal_command(v[i], a[i], target[i], dt=0.1))
+        else:
+            out.append(calculate_longitudinal_command(
+                v[i], a[i], target[i], dt=0.1, leader_gap=gap[i], leader_v=lead_v[i]))
+    return out
+
+
+def run_batch(v, a, target, dist, gap, lead_v):
+    return calculate_longitudinal_batch(
+        v, a, target, dist_to_stop=dist, dt=0.1, leader_gap=gap, leader_v=lead_v)
+
+
+def time_per_vehicle(func, inputs, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        func(*inputs)
+    return (time.perf_counter() - t0) / repeat / len(inputs[0]) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="纵向规划标量/批量版本基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="车辆数")
+    parser.add_argument("--repeat", type=int, default=200, help="每个规模的重复次数")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'车辆数':>8} {'标量(us/车)':>12} {'批量(us/车)':>12} {'加速比':>8} {'最大偏差':>10}")
+    for n in args.sizes:
+        # Python 中标量输入为 float，这里转成列表元素，与仿真中的调用一致
+        inputs = make_inputs(n, rng)
+        scalar_inputs = [x.tolist() for x in inputs]
+        max_err = float(np.max(np.abs(np.array(run_scalar(*scalar_inputs)) - run_batch(*inputs))))
+
+        scalar_us = time_per_vehicle(run_scalar, scalar_inputs, args.repeat)
+        batch_us = time_per_vehicle(run_batch, inputs, args.repeat)
+        print(f"{n:>8} {scalar_us:>12.3f} {batch_us:>12.3f} {scalar_us / batch_us:>7.1f}x {max_err:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
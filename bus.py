@@ -9,6 +9,35 @@ import json
 from analyze_results import analyze_all
 import os
 import shutil
+import argparse
+from sumo_backend import BACKENDS, load_backend, StepRateMeter
+from network_topology import load_topology
+from vehicle_registry import VehicleRegistry, VehClass
+from signal_state import SignalState
+from signal_timeline import SignalTimeline
+from event_log import PROFILES, EVENT_FILE, EventLog, console
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="公交信号优先仿真")
+    parser.add_argument("--no-gui", action="store_false", dest="gui",
+                        help="禁用GUI可视化（默认启用）", default=True)
+    # 后端：libsumo 为进程内调用（仅无 GUI 时生效，GUI 模式自动回退 traci）
+    parser.add_argument("--backend", choices=BACKENDS, default="traci",
+                        help="SUMO 驱动后端（默认 traci）")
+    # 性能模式：不启动 GUI、不改车辆颜色、不限速，TSP 事件写入内存缓冲，结束时保存为 events.jsonl
+    parser.add_argument("--profile", choices=PROFILES, default="default",
+                        help="运行模式（默认 default；perf 为无界面高吞吐模式）")
+    args = parser.parse_args()
+    return args.gui, args.backend, args.profile
+
+USE_GUI, BACKEND, PROFILE = parse_args()
+PERF = PROFILE == "perf"
+if PERF:
+    USE_GUI = False
+EVENTS = EventLog() if PERF else console
+traci, BACKEND = load_backend(BACKEND, USE_GUI)
+# 路网静态拓扑（信号灯 link 索引等），不再每步调用 getControlledLinks
+TOPOLOGY = load_topology()
 
 # 保存当前参数
 def save_current_params():
@@ -43,7 +72,7 @@ def is_current_green_lane_empty(green_lanes):
         occupancy = (traci.lane.getLastStepOccupancy(lane_id))
         # 也可以用车辆数判断：traci.lane.getLastStepVehicleNumber(lane_id) > 0
         if occupancy > QUEUE_THRESHOLD:
-            print(f"[TSP] 当前绿灯车道 {lane_id} 有车（占用率：{occupancy:.1f}），不执行红灯早断")
+            EVENTS("tsp_queue_block", lane=lane_id, occupancy=occupancy)
             return False
     return True
 
@@ -52,7 +81,7 @@ def get_current_green_lanes(tls_id, current_phase):
     获取当前相位的所有绿灯车道（state为'G'或'g'）
     返回：绿灯车道ID列表
     """
-    controlled_links = traci.trafficlight.getControlledLinks(tls_id)
+    controlled_links = TOPOLOGY.controlled_links(tls_id)
     green_lanes = []
     state_str = current_phase.state
 
@@ -66,11 +95,19 @@ def get_current_green_lanes(tls_id, current_phase):
     return green_lanes
 
 
+def get_signal(tls_id):
+    """信号灯状态快照（首次遇到时创建并订阅，之后每步由主循环刷新）"""
+    if tls_id not in SIGNALS:
+        SIGNALS[tls_id] = SignalState(tls_id, conn=traci, topology=TOPOLOGY)
+        TIMELINES[tls_id] = SignalTimeline.from_add_file(tls_id, SIGNALS[tls_id], TOPOLOGY)
+    return SIGNALS[tls_id]
+
+
 def handle_bus_priority(tls_id, bus_id):
     global  _bus_tsp_state
     key = (tls_id, bus_id)
 
-    if bus_id not in traci.vehicle.getIDList():
+    if not REGISTRY.is_alive(bus_id):
         _bus_tsp_state.pop(key, None)
         # 不在交通网络中
         return
@@ -82,31 +119,25 @@ def handle_bus_priority(tls_id, bus_id):
         # 不在公交车车道
         return
 
-    # === 获取当前激活的信号灯逻辑 ===
-    current_program_id = traci.trafficlight.getProgram(tls_id)
-    all_logics = traci.trafficlight.getAllProgramLogics(tls_id)
-    current_logic = None
-    for logic in all_logics:
-        if logic.programID == current_program_id:
-            current_logic = logic
-            break
-    if current_logic is None:
-        current_logic = all_logics[0]  # fallback
+    # === 获取当前激活的信号灯逻辑（SignalState 缓存，找不到时回退到第一个方案） ===
+    signal = get_signal(tls_id)
+    all_logics = signal.all_logics()
+    current_logic = signal.logic()
 
 
-    current_phase_index = traci.trafficlight.getPhase(tls_id)
+    current_phase_index = signal.phase
     current_phase = current_logic.phases[current_phase_index]
     state_str = current_phase.state
     # 获取当前相位的持续时间
-    current_phase_duration = traci.trafficlight.getPhaseDuration(tls_id)
-    next_switch = traci.trafficlight.getNextSwitch(tls_id)  # 下一次切换的仿真时间（秒）
+    current_phase_duration = signal.phase_duration
+    next_switch = signal.next_switch  # 下一次切换的仿真时间（秒）
     current_time = traci.simulation.getTime()  # 当前仿真时间
     remaining = next_switch - current_time  # 剩余时间（浮点数）
     pasting = current_phase_duration - remaining
     if pasting <= current_phase.minDur:
         # 当前相位已持续时间不足最小时间，不处理
         return
-    controlled_links = traci.trafficlight.getControlledLinks(tls_id)
+    controlled_links = signal.controlled_links()
 
     next_tls_list = traci.vehicle.getNextTLS(bus_id)
     dist_to_stop = None
@@ -116,7 +147,7 @@ def handle_bus_priority(tls_id, bus_id):
             break
     if dist_to_stop is None or dist_to_stop <= 0:
         _bus_tsp_state.pop(key, None)
-        print(f"[TSP] 清除无有效距离状态: {key}")
+        EVENTS("tsp_clear", key=key)
         return
     # print(f"[TSP] 距离 {dist_to_stop:.1f}m")
 
@@ -144,12 +175,14 @@ def handle_bus_priority(tls_id, bus_id):
             if extra > 0:
                 # ⭐ 关键：延长当前相位的剩余时间
                 new_remaining = remaining + extra
-                traci.trafficlight.setPhaseDuration(tls_id, new_remaining)
+                signal.set_phase_duration(new_remaining)
                 _bus_tsp_state[key] = {'total_extended': total_extended + extra}
-                print(f"{current_time:.1f}s [TSP] 🚦 绿灯延长！ {extra:.1f}s ({total_extended + extra:.1f}/{MAX_EXTENSION}) for {bus_id}")
+                EVENTS("tsp_extend", t=current_time, extra=extra, total=total_extended + extra,
+                       limit=MAX_EXTENSION, bus=bus_id)
                 _bus_tsp_history[bus_id] = {'type':'Green Light Early Activation','time': total_extended + extra}
                 # 修改车辆的颜色为绿色
-                traci.vehicle.setColor(bus_id, (0, 255, 0, 255))
+                if not PERF:
+                    traci.vehicle.setColor(bus_id, (0, 255, 0, 255))
         return
 
     # ==============================
@@ -161,22 +194,24 @@ def handle_bus_priority(tls_id, bus_id):
         # 2. 检查当前绿灯车道是否无车排队（核心新增逻辑）
         if not is_current_green_lane_empty(current_green_lanes):
             return  # 有排队，放弃红灯早断
-        for need_phase_idx, phase in enumerate(all_logics[1].phases):
-            # 检查该相位中，目标车道的状态是否为绿灯（'G'）
-            if phase.state[target_link_indices] == 'G' or phase.state[target_link_indices] == 'g':
-                break
-        next_phase_idx = (traci.trafficlight.getPhase(tls_id)+int(len(all_logics[1].phases)/4))%12
+        # 目标 link 下一个绿灯窗口的起始相位（时间线预测）
+        need_phase_idx = TIMELINES[tls_id].next_green_phase(bus_lane, current_time, links=(target_link_indices,))
+        next_phase_idx = (signal.phase+int(len(all_logics[1].phases)/4))%12
         if next_phase_idx == need_phase_idx:
-            traci.trafficlight.setPhase(tls_id, traci.trafficlight.getPhase(tls_id)+1)
-            print(f"{current_time:.1f}s [TSP] 🚦 红灯早断！跳到相位 {need_phase_idx} 供 {bus_id} (距路口 {dist_to_stop:.1f}m)")
+            signal.set_phase(signal.phase+1)
+            EVENTS("tsp_early_green", t=current_time, phase=need_phase_idx, bus=bus_id,
+                   dist=dist_to_stop)
             _bus_tsp_history[bus_id] = {'type':'Red Light Early Termination','time': remaining}
             # 修改车辆的颜色为红色
-            traci.vehicle.setColor(bus_id, (255, 0, 0, 255))
+            if not PERF:
+                traci.vehicle.setColor(bus_id, (255, 0, 0, 255))
         return
 
 #%%
 # ===== 全局状态 =====
 _bus_tsp_state = {}         # (tls_id, bus_id) -> {total_extended: float}
+SIGNALS = {}                # tls_id -> SignalState
+TIMELINES = {}              # tls_id -> SignalTimeline
 # 历史记录
 _bus_tsp_history = {}       # (tls_id, bus_id) -> [ {time: float, total_extended: float} ]
 OUTPUT_FOLDER = f"output/{time.strftime('%Y%m%d_%H%M%S')}/"
@@ -185,35 +220,46 @@ try:
     traci.close(wait=False)
 except:
     pass
-traci.start(["sumo-gui", "-c", "crossroad_simulation.sumocfg","--tripinfo-output",
+traci.start(["sumo-gui" if USE_GUI else "sumo", "-c", "crossroad_simulation.sumocfg","--tripinfo-output",
              f"{OUTPUT_FOLDER}tripinfo.xml","--queue-output",f"{OUTPUT_FOLDER}queue.xml",
              "--start"])
+# 车辆在出发时分类一次，公交车直接从分类集合中取
+REGISTRY = VehicleRegistry(conn=traci)
 simu_speed = 0 # 最大仿真倍速
 BUS_FIRST = True
 save_current_params()   # 仿真前备份可复现的全部支持文件
-view_id = "View #0"  # 对应默认视图ID
-traci.gui.setZoom(view_id, 800)
-traci.gui.setSchema(view_id, "real world")  # 核心：切换到真实世界配色方案
+if USE_GUI:
+    view_id = "View #0"  # 对应默认视图ID
+    traci.gui.setZoom(view_id, 800)
+    traci.gui.setSchema(view_id, "real world")  # 核心：切换到真实世界配色方案
 
 time_per_step = 0.1/simu_speed if simu_speed>0 else 0.1
 t0 = time.time()
+meter = StepRateMeter(BACKEND, f"bus_{BUS_FIRST}")
 # time.sleep(10) # 准备录屏
 while traci.simulation.getMinExpectedNumber() > 0:
     traci.simulationStep()
+    REGISTRY.update()
+    for signal in SIGNALS.values():
+        signal.update()
+    meter.tick()
     if BUS_FIRST:
         # 处理每辆公交车
-        for veh_id in traci.vehicle.getIDList():
-            if veh_id.startswith("bus_"):
-                next_tls_list = traci.vehicle.getNextTLS(veh_id)
-                if next_tls_list:
-                    tls_id = next_tls_list[0][0]
-                    handle_bus_priority(tls_id, veh_id)
+        for veh_id in REGISTRY.members(VehClass.BUS):
+            next_tls_list = traci.vehicle.getNextTLS(veh_id)
+            if next_tls_list:
+                tls_id = next_tls_list[0][0]
+                handle_bus_priority(tls_id, veh_id)
         # 控制仿真速度
-        if simu_speed>0:
+        if simu_speed>0 and not PERF:
             time.sleep(max(0, time_per_step - (time.time() - t0)))
             t0 = time.time()
 traci.close()
-time.sleep(1)
+meter.report()
+if PERF:
+    EVENTS.flush(f"{OUTPUT_FOLDER}{EVENT_FILE}")
+else:
+    time.sleep(1)
 analyze_all(OUTPUT_FOLDER)
 with open(f"{OUTPUT_FOLDER}bus_tsp_history.json", "w") as f:
     json.dump(_bus_tsp_history, f, indent=4)
@@ -5,6 +5,10 @@ import matplotlib.pyplot as plt
 from tqdm import tqdm
 colormap = plt.get_cmap('RdYlGn')
 import os
+from network_topology import load_topology
+from vehicle_registry import VehicleRegistry, VehClass
+from signal_state import SignalState
+from signal_timeline import SignalTimeline
 
 def set_cav_route(veh_id):
     # 假设CAV的目标是到达目的地
@@ -15,20 +19,18 @@ def set_cav_route(veh_id):
         return False
     # 开始设置其速度，保证平缓通过交叉口
     # 获取预计到达停止线时间
-    next_tls,_,dis_to_stop,current_state = traci.vehicle.getNextTLS(veh_id)[0]
+    _,link_index,dis_to_stop,_ = traci.vehicle.getNextTLS(veh_id)[0]
 
-    next_switch_time = traci.trafficlight.getNextSwitch(next_tls)
-    current_phase_remaing_time = next_switch_time-current_time
-    if current_state=='G':
-        except_time = (1e-6,current_phase_remaing_time+3)
+    # 该车所经 link 的下一个绿灯窗口（时间线以实时相位为锚点，已扣除当前相位已运行时间）
+    windows = TIMELINE.green_windows(None, current_time, n=1, links=(link_index,))
+    if not windows:
+        # 预测范围内该 link 没有绿灯窗口：不给速度建议，下一步再判断
+        return False
+    green_start, green_end, _ = windows[0]
+    if green_start==0.0:
+        except_time = (1e-6,green_end+3)
     else:
-        except_phase = 0
-        if current_phase<except_phase:
-            time_to_green = sum(phase_duration[current_phase:except_phase])
-            except_time = (time_to_green,time_to_green+phase_duration[except_phase])
-        else:
-            time_to_green = sum(phase_duration[current_phase:])+sum(phase_duration[:except_phase])
-            except_time = (time_to_green,time_to_green+phase_duration[except_phase])
+        except_time = (green_start,green_end)
 
     except_speed = (dis_to_stop/except_time[1],dis_to_stop/except_time[0])
     if (except_speed[1]<MIN_SPEED) or (except_speed[0]>MAX_SPEED):
@@ -56,16 +58,15 @@ def set_cav_route(veh_id):
 def judge_if_set_route(veh_id):
     global set_veh_list,nolonger_set_veh_list
     if veh_id not in nolonger_set_veh_list:
-        veh_type = traci.vehicle.getTypeID(veh_id)
         loc_edge = traci.vehicle.getRoadID(veh_id)
         loc_lane = traci.vehicle.getLaneID(veh_id)
-        # 获取车道的禁用车辆类型
-        allowed = traci.lane.getAllowed(loc_lane)
-        if "taxi" in veh_type:
+        # 获取车道的允许车辆类型（静态拓扑，本地查表）
+        allowed = TOPOLOGY.lane_allowed.get(loc_lane, ())
+        # 车辆类别在出发时已分类，这里只是查表
+        if REGISTRY.is_cav(veh_id):
             if 'in' in loc_edge:
                 if len(allowed)>0:
-                    if ('east' in veh_id or 'west' in veh_id) and \
-                            'straight' in veh_id:
+                    if REGISTRY.is_path_cav(veh_id):
                         if veh_id not in set_veh_list:
                             traci.vehicle.setColor(veh_id, (255, 255, 255, 255))
                         set_veh_list.append(veh_id)
@@ -94,29 +95,26 @@ def clear_set_route(ID_list):
             traci.vehicle.setDecel(veh_id,MAX_ACCLERATION)
             # nolonger_set_veh_list.remove(veh_id)
 
-def get_all_cav_loc(ID_list):
-    # 查找每个车道的allowed
-    cav_loc = {}
-    for lane in traci.lane.getIDList():
-        if len(traci.lane.getAllowed(lane))==1:
-            # print(traci.lane.getAllowed(lane))
-            cav_loc[lane] = []
-
-    for veh_id in ID_list:
-        veh_type = traci.vehicle.getTypeID(veh_id)
-        if "taxi" in veh_type:
-            next_tls = traci.vehicle.getNextTLS(veh_id)
-            if len(next_tls)>0:
-                _, _, dis_to_stop, _ = next_tls[0]
-                if dis_to_stop>=1e-3:
-                    lane = traci.vehicle.getLaneID(veh_id)
-                    if lane in cav_loc:
-                        cav_loc[lane] = cav_loc[lane]+[dis_to_stop]
+def get_all_cav_loc():
+    # 仅允许单一车型的车道（由静态拓扑预先算好）
+    cav_loc = {lane: [] for lane in SINGLE_CLASS_LANES}
+
+    # 只遍历在网 CAV（出发时已分类），无需逐车 getTypeID
+    for veh_id in REGISTRY.members(VehClass.CAV):
+        next_tls = traci.vehicle.getNextTLS(veh_id)
+        if len(next_tls)>0:
+            _, _, dis_to_stop, _ = next_tls[0]
+            if dis_to_stop>=1e-3:
+                lane = traci.vehicle.getLaneID(veh_id)
+                if lane in cav_loc:
+                    cav_loc[lane] = cav_loc[lane]+[dis_to_stop]
     for lane in cav_loc:
         cav_loc[lane] = sorted(cav_loc[lane])
     return cav_loc
 
 USE_GUI = False
+TOPOLOGY = load_topology()
+SINGLE_CLASS_LANES = [lane for lane, allowed in TOPOLOGY.lane_allowed.items() if len(allowed) == 1]
 # for MIN_SPEED in [0,15/3.6,20/3.6,25/3.6]:
 MIN_SPEED = [0,15/3.6,20/3.6,25/3.6,30/3.6][0]
 
@@ -146,6 +144,9 @@ traci.start([f"sumo{'-gui'*USE_GUI}", "-c", "crossroad_simulation.sumocfg",
              # 3. FCD (Floating Car Data): 包含每一秒的位置、速度、加速度，用于画时空图
              "--fcd-output", f"{OUTPUT_FOLDER}fcd.xml",
              "--start"])
+REGISTRY = VehicleRegistry(conn=traci)
+SIGNAL = SignalState('center', conn=traci, topology=TOPOLOGY)
+TIMELINE = SignalTimeline.from_add_file('center', SIGNAL, TOPOLOGY)
 MAX_SPEED = traci.lane.getMaxSpeed('east_in_3')
 MAX_ACCLERATION = traci.vehicletype.getDecel('taxi')
 MIN_ACCLERATION = MAX_ACCLERATION/3
@@ -162,8 +163,6 @@ time_per_step = 0.1/simu_speed if simu_speed>0 else 0.1
 # while traci.simulation.getMinExpectedNumber() > 0:
 
 # debug = False
-tls_program = (traci.trafficlight.getAllProgramLogics('center'))[1].phases
-phase_duration = [tls_program[i].duration for i in range(len(tls_program))]
 pbar = tqdm(total=37250)
 # for i in range(1000):
 i = 0
@@ -172,6 +171,8 @@ while traci.simulation.getMinExpectedNumber() > 0:
     i += 1
     pbar.update(1)
     traci.simulationStep()
+    REGISTRY.update()
+    SIGNAL.update()
     # 控制仿真速度
     if simu_speed>0:
         time.sleep(max(0, time_per_step - (time.time() - t0)))
@@ -179,11 +180,9 @@ while traci.simulation.getMinExpectedNumber() > 0:
 
     if not CAV_FIRST:
         continue
-    # 获取车辆要等的信号灯相位编号
-    current_phase = traci.trafficlight.getPhase('center')
     ID_list = traci.vehicle.getIDList()
     if i % 10 == 0:
-        cav_loc = get_all_cav_loc(ID_list)
+        cav_loc = get_all_cav_loc()
         for veh_id in ID_list:
         # 获取类型
             judgement = judge_if_set_route(veh_id)
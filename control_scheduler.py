@@ -0,0 +1,85 @@
+import math
+import time
+
+
+class ScheduledTask:
+    def __init__(self, name, func, period_steps, offset):
+        self.name = name
+        self.func = func
+        self.period_steps = period_steps
+        self.offset = offset
+        self.runs = 0
+        self.cpu_s = 0.0
+
+    def is_due(self, step):
+        return step % self.period_steps == self.offset
+
+
+class ControlScheduler:
+    """
+    多速率控制调度器：
+    每个控制器按各自周期（秒）和相位偏移注册，只在到期的仿真步执行。
+    未指定偏移时自动错峰：选择与已注册低频控制器重叠最少的相位，
+    避免多个重计算控制器落在同一步。
+    func 为 None 的任务只计数并返回任务名，由调用方分发执行（如控制器进程池）。
+    """
+
+    def __init__(self, step_length):
+        self.step_length = step_length
+        self.tasks = []
+
+    def _to_steps(self, period):
+        return max(1, int(round(period / self.step_length)))
+
+    def _pick_offset(self, period_steps):
+        """在 [0, period) 中选择与已有任务同时到期次数最少的偏移"""
+        if period_steps == 1:
+            return 0
+        others = [t for t in self.tasks if t.period_steps > 1]
+        if not others:
+            return 0
+        horizon = period_steps
+        for t in others:
+            horizon = horizon * t.period_steps // math.gcd(horizon, t.period_steps)
+            if horizon > 100000:
+                horizon = 100000
+                break
+        best_offset, best_load = 0, None
+        for offset in range(period_steps):
+            load = sum(1 for step in range(offset, horizon, period_steps)
+                       for t in others if t.is_due(step))
+            if best_load is None or load < best_load:
+                best_offset, best_load = offset, load
+        return best_offset
+
+    def register(self, name, func, period, offset=None):
+        """注册控制器：period 为执行周期（秒），offset 为相位偏移（步），None 表示自动错峰"""
+        period_steps = self._to_steps(period)
+        if offset is None:
+            offset = self._pick_offset(period_steps)
+        task = ScheduledTask(name, func, period_steps, offset % period_steps)
+        self.tasks.append(task)
+        return task
+
+    def has_due(self, step):
+        return any(task.is_due(step) for task in self.tasks)
+
+    def run(self, step):
+        """执行本步到期的控制器（按注册顺序），返回执行的控制器名"""
+        ran = []
+        for task in self.tasks:
+            if task.is_due(step):
+                if task.func is not None:
+                    t0 = time.perf_counter()
+                    task.func()
+                    task.cpu_s += time.perf_counter() - t0
+                task.runs += 1
+                ran.append(task.name)
+        return ran
+
+    def report(self):
+        for task in self.tasks:
+            avg_ms = task.cpu_s / task.runs * 1000 if task.runs else 0.0
+            print(f"[scheduler] {task.name}: 周期 {task.period_steps * self.step_length:.1f}s "
+                  f"偏移 {task.offset} 步, 执行 {task.runs} 次, 总耗时 {task.cpu_s:.2f}s, "
+                  f"平均 {avg_ms:.3f}ms/次")
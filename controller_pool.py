@@ -0,0 +1,223 @@
+import multiprocessing as mp
+import time
+import traceback
+from network_topology import load_topology
+from junction_controller import JunctionController, apply_params, release_vehicles
+from vehicle_snapshot import SnapshotView
+from signal_state import SignalView
+from signal_timeline import SignalTimeline
+from pressure_engine import PressureEngine, DetectorPressure
+from vehicle_actuator import VehicleActuator
+from event_log import console
+
+
+def split_shards(items, workers):
+    """按顺序把路口均分为 workers 个连续分片（相邻路口在同一分片）"""
+    n = max(1, min(workers, len(items)))
+    size, extra = divmod(len(items), n)
+    shards, start = [], 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        shards.append(items[start:end])
+        start = end
+    return shards
+
+
+class ShardRunner:
+    """
+    控制器进程中的一个分片：持有分片内各路口的 JunctionController 及其视图
+    （SnapshotView / SignalView / 压力引擎副本 / SignalTimeline），
+    每步只接收本分片车道与路口的订阅数据，返回车辆命令、信号命令与日志。
+    """
+
+    def __init__(self, spec):
+        # spawn 方式启动的进程重新导入模块，需再次应用主进程的参数覆盖
+        apply_params(spec.get("params", {}))
+        topology = load_topology(spec["net_file"])
+        self.logs = []
+        self.actuator = VehicleActuator(conn=None, use_color=spec["use_color"])
+        self.controllers = []
+        self.signals = {}
+        self.timelines = {}
+        self.pressures = {}
+        lanes = []
+        for junction in spec["junctions"]:
+            config = junction["config"]
+            tls_id = config["tls_id"]
+            controller = JunctionController(config, log=self._log)
+            signal = SignalView(tls_id, junction["signal"])
+            timeline = SignalTimeline.from_add_file(tls_id, signal, topology, spec["tls_file"])
+            signal.durations = timeline.durations
+            if spec["pressure_source"] == "detectors":
+                pressure = DetectorPressure(config["pressure_groups"], spec["ranges"],
+                                            conn=None, subscribe=False)
+            else:
+                pressure = PressureEngine(tls_id, config["pressure_groups"], spec["ranges"],
+                                          radius=spec["radius"], conn=None, topology=topology,
+                                          subscribe=False)
+            self.controllers.append(controller)
+            self.signals[tls_id] = signal
+            self.timelines[tls_id] = timeline
+            self.pressures[tls_id] = pressure
+            lanes.extend(controller.lanes)
+        self.snap = SnapshotView({lane: topology.lane_length[lane] for lane in lanes})
+        self.cpu_s = 0.0
+        self.steps = 0
+
+    def _log(self, kind, **fields):
+        # 控制事件随本步结果返回主进程，由主进程输出或记录
+        self.logs.append((kind, fields))
+
+    def step(self, msg):
+        t0 = time.perf_counter()
+        now = msg["time"]
+        due = msg["due"]
+        self.snap.load(now, msg["lanes"], msg["states"])
+        for tls_id, values in msg["signals"].items():
+            self.signals[tls_id].load(now, values)
+        for tls_id, res in msg.get("pressure", {}).items():
+            self.pressures[tls_id].sample(res)
+
+        # 与主进程内执行顺序一致：先全部路口的信号优先，再全部路口的轨迹控制
+        if "signal" in due:
+            for c in self.controllers:
+                c.signal_priority(self.snap, self.pressures[c.tls_id], self.signals[c.tls_id],
+                                  self.timelines[c.tls_id])
+        release, managed = set(), set()
+        if "trajectory" in due:
+            for c in self.controllers:
+                release |= c.trajectory(self.snap, self.actuator, self.signals[c.tls_id],
+                                        self.timelines[c.tls_id])
+                managed |= c.managed_last_step
+
+        pending, stats = self.actuator.take()
+        signal_cmds = [(tls_id, name, value) for tls_id, signal in self.signals.items()
+                       for name, value in signal.take_commands()]
+        logs, self.logs[:] = list(self.logs), []
+        cpu = time.perf_counter() - t0
+        self.cpu_s += cpu
+        self.steps += 1
+        return {"pending": pending, "stats": stats, "release": release, "managed": managed,
+                "signal": signal_cmds, "log": logs, "cpu": cpu}
+
+
+def _worker_main(conn, spec):
+    """控制器进程入口：收到 None 时返回统计并退出"""
+    try:
+        runner = ShardRunner(spec)
+    except Exception:
+        conn.send({"error": traceback.format_exc()})
+        return
+    conn.send({"ready": True})
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            conn.send({"cpu_s": runner.cpu_s, "steps": runner.steps})
+            break
+        try:
+            conn.send(runner.step(msg))
+        except Exception:
+            conn.send({"error": traceback.format_exc()})
+
+
+class ControllerPool:
+    """
+    按路口分片的控制器进程池：
+    1. 每个进程拥有一组连续路口（分片），在进程内持有这些路口的控制器状态
+    2. 主进程是唯一的 TraCI 客户端：每个到期步只把各分片自己的车道快照、信号状态和压力订阅结果发给对应进程
+    3. 各进程并行计算，主进程按分片顺序合并车辆命令（差分下发）、回放信号命令、输出控制事件，
+       最后统一释放离开编队的车辆（跨分片移动的车辆不会被上游路口覆盖）
+    """
+
+    def __init__(self, junctions, workers, net_file, tls_file, pressure_source, ranges, radius,
+                 use_color, params=None, log=console):
+        ctx = mp.get_context()
+        self.shards = split_shards(junctions, workers)
+        self.log = log
+        self.conns = []
+        self.procs = []
+        self.shard_tls = []
+        self.shard_lanes = []
+        for shard in self.shards:
+            spec = {
+                "net_file": net_file,
+                "tls_file": tls_file,
+                "pressure_source": pressure_source,
+                "ranges": ranges,
+                "radius": radius,
+                "use_color": use_color,
+                "params": params or {},
+                "junctions": [{"config": controller.config, "signal": signal.values()}
+                              for controller, signal in shard],
+            }
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker_main, args=(child, spec), daemon=True)
+            proc.start()
+            child.close()
+            self.conns.append(parent)
+            self.procs.append(proc)
+            self.shard_tls.append([controller.tls_id for controller, _ in shard])
+            self.shard_lanes.append([lane for controller, _ in shard for lane in controller.lanes])
+        for i, conn in enumerate(self.conns):
+            self._check(i, conn.recv())
+        self.worker_cpu = [0.0] * len(self.conns)
+        self.wall_s = 0.0
+        self.runs = 0
+        self.last_managed = 0   # 上一次分发中受控的车辆数
+
+    def _check(self, i, out):
+        if "error" in out:
+            raise RuntimeError(f"控制器进程 {i} 出错:\n{out['error']}")
+        return out
+
+    def run(self, due, snapshot, signals, pressures, actuator):
+        """分发本步到期的控制任务（信号 / 压力 / 轨迹），合并结果到 actuator 与 signals"""
+        t0 = time.perf_counter()
+        sample = "pressure" in due
+        for conn, tls_ids, lanes in zip(self.conns, self.shard_tls, self.shard_lanes):
+            lane_vehs, states = snapshot.export(lanes)
+            msg = {
+                "time": snapshot.time,
+                "due": due,
+                "lanes": lane_vehs,
+                "states": states,
+                "signals": {tls_id: signals[tls_id].values() for tls_id in tls_ids},
+            }
+            if sample:
+                msg["pressure"] = {tls_id: pressures[tls_id].raw() for tls_id in tls_ids}
+            conn.send(msg)
+
+        release, claimed = set(), set()
+        for i, conn in enumerate(self.conns):
+            out = self._check(i, conn.recv())
+            actuator.merge(out["pending"], out["stats"])
+            for tls_id, name, value in out["signal"]:
+                getattr(signals[tls_id], name)(value)
+            for kind, fields in out["log"]:
+                self.log(kind, **fields)
+            release |= out["release"]
+            claimed |= out["managed"]
+            self.worker_cpu[i] += out["cpu"]
+        release_vehicles(snapshot, actuator, release, claimed)
+        self.last_managed = len(claimed)
+        self.wall_s += time.perf_counter() - t0
+        self.runs += 1
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(None)
+                conn.recv()
+            except (EOFError, OSError):
+                pass
+        for proc in self.procs:
+            proc.join(timeout=5)
+
+    def report(self):
+        if not self.runs:
+            return
+        print(f"[pool] {len(self.conns)} 个控制器进程, 分发 {self.runs} 次, "
+              f"主进程等待 {self.wall_s:.2f}s ({self.wall_s / self.runs * 1000:.3f}ms/次)")
+        for i, (tls_ids, cpu) in enumerate(zip(self.shard_tls, self.worker_cpu)):
+            print(f"[pool] 进程 {i}: 路口 {','.join(tls_ids)}, 计算 {cpu:.2f}s "
+                  f"({cpu / self.runs * 1000:.3f}ms/次)")
@@ -0,0 +1,59 @@
+import json
+from collections import deque
+
+# 控制事件：控制器只记录 (事件类型, 字段)，默认输出到控制台，
+# 性能模式（--profile perf）下写入内存环形缓冲，运行结束时一次写出 JSONL
+PROFILES = ("default", "perf")
+EVENT_CAPACITY = 100000   # 环形缓冲容量（条），超出后丢弃最早的事件
+EVENT_FILE = "events.jsonl"
+
+# 控制台格式：信号优先事件在时间后显示路口 ID（多路口场景区分各路口）
+EVENT_FORMATS = {
+    "signal_extend": "[{t:.1f}s] {tls} 信号优先: 绿灯延长 {extension:.1f}s",
+    "signal_truncate": "[{t:.1f}s] {tls} 信号优先: 截断相位 {phase}! 跳转至 {next_phase} | "
+                       "节省 {saved:.1f}s | 当前方向压力 {pressure}",
+    "tsp_queue_block": "[TSP] 当前绿灯车道 {lane} 有车（占用率：{occupancy:.1f}），不执行红灯早断",
+    "tsp_clear": "[TSP] 清除无有效距离状态: {key}",
+    "tsp_extend": "{t:.1f}s [TSP] 🚦 绿灯延长！ {extra:.1f}s ({total:.1f}/{limit}) for {bus}",
+    "tsp_early_green": "{t:.1f}s [TSP] 🚦 红灯早断！跳到相位 {phase} 供 {bus} (距路口 {dist:.1f}m)",
+}
+# 单路口场景不显示路口 ID，与原先的 print 输出一致
+SINGLE_JUNCTION_FORMATS = {kind: fmt.replace("{tls} ", "") for kind, fmt in EVENT_FORMATS.items()}
+
+
+def console(kind, **fields):
+    """默认模式：按 EVENT_FORMATS 格式化后打印"""
+    print(EVENT_FORMATS[kind].format(**fields))
+
+
+def single_junction_console(kind, **fields):
+    """默认模式（单路口）：按 SINGLE_JUNCTION_FORMATS 格式化后打印"""
+    print(SINGLE_JUNCTION_FORMATS[kind].format(**fields))
+
+
+class EventLog:
+    """
+    性能模式的事件记录：emit 只把 (事件类型, 字段) 追加到定长 deque，不做字符串格式化与控制台输出，
+    flush 时写出紧凑 JSONL（每行一个事件，字段 "event" 为事件类型）。
+    """
+
+    def __init__(self, capacity=EVENT_CAPACITY):
+        self.events = deque(maxlen=capacity)
+        self.total = 0
+
+    def __call__(self, kind, **fields):
+        self.events.append((kind, fields))
+        self.total += 1
+
+    def flush(self, path):
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                for kind, fields in self.events:
+                    f.write(json.dumps({"event": kind, **fields}, ensure_ascii=False,
+                                       separators=(",", ":")))
+                    f.write("\n")
+            dropped = self.total - len(self.events)
+            print(f"[events] {len(self.events)} 条事件已保存到 {path}"
+                  + (f"（缓冲已满，丢弃最早的 {dropped} 条）" if dropped else ""))
+        except Exception as e:
+            print(f"Error saving events: {e}")
@@ -0,0 +1,219 @@
+import json
+import os
+import shutil
+import sys
+import time
+import xml.etree.ElementTree as ET
+from array import array
+import numpy as np
+
+# FCD 列式存储：fcd.xml 只流式解析一次，转换为同目录 fcd/ 下按列的 .npy 文件，
+# 之后的分析（分析脚本、轨迹图、Kepler 导出）直接内存映射所需的列，不再重复解析 XML。
+# 行按时间步顺序排列（同一时间步内保持 fcd.xml 中的顺序），steps.npy 记录每个时间步的起始行。
+STORE_DIR = "fcd"
+META_FILE = "meta.json"
+STEPS_FILE = "steps.npy"     # (时间步数, 2)：时间、起始行
+CHUNK_ROWS = 1 << 20         # 转换时每累积这么多行写一次磁盘
+# 列名 -> (dtype, array typecode)。time / speed 用 float64：分析中的加速度 / 加加速度由速度差分得到，
+# 与直接解析 XML 的结果保持一致；坐标等用 float32。
+# lane 为 lanes 字典中的下标（中观 FCD 没有车道，记录所在道路），type 为 types 字典中的下标。
+# fcd.xml 带 acceleration 属性时（--fcd-output.acceleration）直接使用，否则由同一车辆相邻两步的速度差分得到，
+# 车辆首个样本为 NaN
+COLUMNS = {
+    "time": ("<f8", "d"),
+    "veh": ("<i4", "i"),
+    "x": ("<f4", "f"),
+    "y": ("<f4", "f"),
+    "speed": ("<f8", "d"),
+    "accel": ("<f4", "f"),
+    "lane": ("<i4", "i"),
+    "pos": ("<f4", "f"),
+    "type": ("<i4", "i"),
+}
+# .npy 头部固定长度：转换开始时行数未知，先写占位头部，结束时原位改写
+_HEADER_LEN = 128
+
+
+def store_path(fcd_file):
+    return os.path.join(os.path.dirname(fcd_file), STORE_DIR)
+
+
+def _npy_header(dtype, rows):
+    header = repr({"descr": dtype, "fortran_order": False, "shape": (rows,)})
+    header = header.ljust(_HEADER_LEN - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+
+def _source_info(fcd_file):
+    st = os.stat(fcd_file)
+    return {"file": os.path.basename(fcd_file), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def is_current(fcd_file, path=None):
+    """列式存储存在且由当前的 fcd.xml 转换而来（大小与修改时间一致）"""
+    path = path or store_path(fcd_file)
+    try:
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return os.path.exists(fcd_file) and meta.get("source") == _source_info(fcd_file)
+
+
+def convert(fcd_file, path=None):
+    """
+    流式转换 fcd.xml -> 列式存储目录，返回目录路径。
+    先写入临时目录，完成后整体替换，转换中断时不会留下不完整的存储。
+    """
+    path = path or store_path(fcd_file)
+    tmp = f"{path}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    print(f"正在转换 {fcd_file} -> {path}/ ...")
+    start_time = time.time()
+
+    files = {}
+    buffers = {}
+    for name, (dtype, code) in COLUMNS.items():
+        files[name] = open(os.path.join(tmp, f"{name}.npy"), "wb")
+        files[name].write(_npy_header(dtype, 0))
+        buffers[name] = array(code)
+    vehicles, lanes, types = {}, {}, {}
+    last = {}          # 车辆下标 -> (时间, 速度)
+    steps = []
+    rows = 0
+
+    def flush():
+        for name, buf in buffers.items():
+            buf.tofile(files[name])
+            del buf[:]
+
+    try:
+        context = iter(ET.iterparse(fcd_file, events=("start", "end")))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end" or elem.tag != "timestep":
+                continue
+            t = float(elem.get("time"))
+            steps.append((t, rows))
+            for veh in elem.iter("vehicle"):
+                v_id = veh.get("id")
+                idx = vehicles.setdefault(v_id, len(vehicles))
+                lane = veh.get("lane") or veh.get("edge")
+                speed = float(veh.get("speed"))
+                accel = veh.get("acceleration")
+                if accel is not None:
+                    accel = float(accel)
+                else:
+                    prev = last.get(idx)
+                    accel = (speed - prev[1]) / (t - prev[0]) if prev and t > prev[0] else float("nan")
+                    last[idx] = (t, speed)
+                buffers["time"].append(t)
+                buffers["veh"].append(idx)
+                buffers["x"].append(float(veh.get("x", "nan")))
+                buffers["y"].append(float(veh.get("y", "nan")))
+                buffers["speed"].append(speed)
+                buffers["accel"].append(accel)
+                buffers["lane"].append(lanes.setdefault(lane, len(lanes)))
+                buffers["pos"].append(float(veh.get("pos", "nan")))
+                buffers["type"].append(types.setdefault(veh.get("type", ""), len(types)))
+                rows += 1
+            root.clear()
+            if len(buffers["time"]) >= CHUNK_ROWS:
+                flush()
+        flush()
+    finally:
+        for name, (dtype, _) in COLUMNS.items():
+            files[name].seek(0)
+            files[name].write(_npy_header(dtype, rows))
+            files[name].close()
+
+    np.save(os.path.join(tmp, STEPS_FILE), np.array(steps, dtype=np.float64).reshape(-1, 2))
+    meta = {
+        "source": _source_info(fcd_file),
+        "rows": rows,
+        "columns": {name: dtype for name, (dtype, _) in COLUMNS.items()},
+        "vehicles": list(vehicles),
+        "lanes": list(lanes),
+        "types": list(types),
+    }
+    with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    print(f"转换完成: {rows} 行, {len(vehicles)} 辆车, 耗时 {time.time() - start_time:.2f}s")
+    return path
+
+
+class FcdStore:
+    """
+    列式 FCD 的只读访问：column(name) 以内存映射方式加载单列，
+    vehicles / lanes / types 为下标到 ID 的字典表，rows(t0, t1) 给出时间范围对应的行区间。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.vehicles = self.meta["vehicles"]
+        self.lanes = self.meta["lanes"]
+        self.types = self.meta["types"]
+        self._columns = {}
+        self._steps = None
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def column(self, name):
+        arr = self._columns.get(name)
+        if arr is None:
+            file = os.path.join(self.path, f"{name}.npy")
+            # 空存储无法内存映射
+            arr = np.load(file, mmap_mode="r") if len(self) else np.load(file)
+            self._columns[name] = arr
+        return arr
+
+    def steps(self):
+        """(时间步数, 2)：每个时间步的时间与起始行"""
+        if self._steps is None:
+            self._steps = np.load(os.path.join(self.path, STEPS_FILE))
+        return self._steps
+
+    def rows(self, t0=None, t1=None):
+        """时间在 [t0, t1] 内的行区间 (start, stop)"""
+        steps = self.steps()
+        times, offsets = steps[:, 0], steps[:, 1].astype(np.int64)
+        i0 = 0 if t0 is None else int(np.searchsorted(times, t0, side="left"))
+        i1 = len(times) if t1 is None else int(np.searchsorted(times, t1, side="right"))
+        start = int(offsets[i0]) if i0 < len(times) else len(self)
+        stop = int(offsets[i1]) if i1 < len(times) else len(self)
+        return start, stop
+
+    def matching(self, table, predicate):
+        """字典表中满足条件的下标掩码，用于按车道 / 类型筛选：mask[column] 即逐行结果"""
+        return np.array([bool(predicate(name)) for name in table] or [False], dtype=bool)
+
+
+def open_store(fcd_file):
+    """
+    打开 fcd.xml 对应的列式存储，不存在或已过期时先转换。
+    转换后可删除 fcd.xml 节省空间，此时直接打开已有的存储；两者都不存在时返回 None
+    """
+    path = store_path(fcd_file)
+    if not is_current(fcd_file, path):
+        if not os.path.exists(fcd_file):
+            return FcdStore(path) if os.path.exists(os.path.join(path, META_FILE)) else None
+        convert(fcd_file, path)
+    return FcdStore(path)
+
+
+if __name__ == "__main__":
+    # 预先转换：python fcd_store.py output/plus/*/fcd.xml
+    if len(sys.argv) < 2:
+        print("用法: python fcd_store.py <fcd.xml> [...]")
+        sys.exit(2)
+    for fcd_file in sys.argv[1:]:
+        if is_current(fcd_file):
+            print(f"{store_path(fcd_file)}/ 已是最新")
+        else:
+            convert(fcd_file)
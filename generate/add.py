@@ -7,11 +7,11 @@ with open("./generate/config.json", "r", encoding="utf-8") as f:
     config = json.load(f)
 
 
-def inject_tl_into_net():
-    net_file = "./test/crossroad.net.xml"
-    tl_id = "center"
-    output_tll_file = "./test/traffic_light.add.xml"
-
+def build_tl_logic(root, tl_id, ew_edges=("east_in", "west_in"), offset=0, net_file="./test/crossroad.net.xml"):
+    """
+    由路网中受信号灯 tl_id 控制的 connection 生成 12 相位 tlLogic
+    （东西直行 / 东西左转 / 南北直行 / 南北左转，各带黄灯与全红），ew_edges 为东西向进口道。
+    """
     # 信号配时参数
     signal = config["signal_timing"]
     green_cav = signal["green_cav"]
@@ -28,9 +28,6 @@ def inject_tl_into_net():
     min_green_left = 20
     max_green_left = 60
 
-    tree = ET.parse(net_file)
-    root = tree.getroot()
-
     # === Step 1: 收集所有 tl="center" 的 connection ===
     connections = []
     max_index = -1
@@ -79,12 +76,12 @@ def inject_tl_into_net():
         if d == 'r':
             right_turns.add(idx)
         elif d == 's':
-            if frm in ("east_in", "west_in"):
+            if frm in ew_edges:
                 ew_straight.add(idx)
             else:
                 ns_straight.add(idx)
         elif d == 'l':
-            if frm in ("east_in", "west_in"):
+            if frm in ew_edges:
                 ew_left.add(idx)
             else:
                 ns_left.add(idx)
@@ -116,7 +113,7 @@ def inject_tl_into_net():
         "id": tl_id,
         "type": "static",
         "programID": "CAV",
-        "offset": "0"
+        "offset": str(offset)
     })
 
     # === 相位配置：绿灯→黄灯→全红，依次循环 ===
@@ -167,6 +164,17 @@ def inject_tl_into_net():
             print(f"[DEBUG] 相位: {mode}, dur={dur}, state={state_str}" + (
                 f", min={min_d}, max={max_d}" if is_green else ""))
 
+    return new_tl
+
+
+def inject_tl_into_net():
+    net_file = "./test/crossroad.net.xml"
+    tl_id = "center"
+    output_tll_file = "./test/traffic_light.add.xml"
+
+    tree = ET.parse(net_file)
+    new_tl = build_tl_logic(tree.getroot(), tl_id, net_file=net_file)
+
     # === 创建 additional 根节点并写入独立文件 ===
     additional = ET.Element("additional")
     additional.append(new_tl)
@@ -179,4 +187,77 @@ def inject_tl_into_net():
     print(f"[OK] 交通灯逻辑已成功写入: {output_tll_file}")
     print(f"请在 .sumocfg 配置文件中添加：<additional-files value=\"{output_tll_file}\"/>")
 
+def inject_corridor_tls():
+    """
+    干道各路口 J{k} 的 tlLogic（相位结构与单路口相同），写入 test/corridor/traffic_light.add.xml。
+    相位差按东行绿波设置：J{k} 的 offset = k * 路口间距 / 设计车速。
+    """
+    net_file = "./test/corridor/corridor.net.xml"
+    output_tll_file = "./test/corridor/traffic_light.add.xml"
+    corridor = config["corridor"]
+    speed_ms = config["speed_kmh"] / 3.6
+
+    root = ET.parse(net_file).getroot()
+    additional = ET.Element("additional")
+    for k in range(corridor["junctions"]):
+        tl_id = f"J{k}"
+        offset = int(round(k * corridor["spacing"] / speed_ms))
+        additional.append(build_tl_logic(root, tl_id, (f"{tl_id}_w_in", f"{tl_id}_e_in"),
+                                         offset=offset, net_file=net_file))
+    rough = ET.tostring(additional, 'utf-8')
+    reparsed = minidom.parseString(rough)
+    with open(output_tll_file, "w", encoding="utf-8") as f:
+        f.write(reparsed.toprettyxml(indent="  "))
+    print(f"[OK] {corridor['junctions']} 个路口的交通灯逻辑已写入: {output_tll_file}")
+
+
+def generate_pressure_detectors(net_file="./test/crossroad.net.xml",
+                                output_det_file="./test/pressure_detectors.add.xml"):
+    """
+    为每条进口车道生成 E2 面检测器（laneAreaDetector），覆盖停止线上游各检测范围，
+    供 cav_plus.py --pressure-source detectors 在 SUMO 内部计数。
+    检测器 ID: e2_<车道ID>_<范围米数>；车道短于检测范围时覆盖整条车道。
+    """
+    ranges = config["pressure_detectors"]["ranges"]
+
+    tree = ET.parse(net_file)
+    root = tree.getroot()
+
+    additional = ET.Element("additional")
+    count = 0
+    for edge in root.iter("edge"):
+        edge_id = edge.get("id")
+        # 只取紧邻交叉口的进口道（*_in），不含上游 *_in_far 与内部车道
+        if edge.get("function") == "internal" or not edge_id.endswith("_in"):
+            continue
+        for lane in edge.iter("lane"):
+            lane_id = lane.get("id")
+            lane_length = float(lane.get("length"))
+            for r in ranges:
+                length = min(float(r), lane_length)
+                additional.append(ET.Element("laneAreaDetector", {
+                    "id": f"e2_{lane_id}_{int(r)}",
+                    "lane": lane_id,
+                    "pos": f"{lane_length - length:.2f}",
+                    "length": f"{length:.2f}",
+                    "period": "3600",
+                    "file": "NUL",   # 不写检测器输出文件，只通过 TraCI 读取
+                }))
+                count += 1
+
+    rough = ET.tostring(additional, 'utf-8')
+    reparsed = minidom.parseString(rough)
+    with open(output_det_file, "w", encoding="utf-8") as f:
+        f.write(reparsed.toprettyxml(indent="  "))
+
+    print(f"[OK] {count} 个 E2 压力检测器已写入: {output_det_file}")
+
+
 inject_tl_into_net()
+if config.get("pressure_detectors", {}).get("enabled", False):
+    generate_pressure_detectors()
+if config.get("corridor", {}).get("enabled", False):
+    inject_corridor_tls()
+    if config.get("pressure_detectors", {}).get("enabled", False):
+        generate_pressure_detectors("./test/corridor/corridor.net.xml",
+                                    "./test/corridor/pressure_detectors.add.xml")
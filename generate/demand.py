@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import argparse
 import json
 
 # 读取配置文件
@@ -71,11 +72,8 @@ def prettify(elem):
     return minidom.parseString(xml_bytes).toprettyxml(indent="  ", encoding="utf-8")
 
 
-def generate_routes():
-    root = ET.Element("routes")
-    # 创建 bus line 映射以便后续查找
-    bus_line_by_id = {line["id"]: line for line in bus_lines}
-    # 1) 车型与分布：flow 可直接 type="mix" 抽样
+def add_vehicle_types(root):
+    # 车型与分布：flow 可直接 type="mix" 抽样
     ET.SubElement(root, "vType", id="private", vClass="private", length="4.5", width="1.8",
                   maxSpeed="50", accel="2.6", decel="4.5", sigma="0.5",color="1,1,1")
     ET.SubElement(root, "vType", id="truck", vClass="truck", length="7.5", width="2.5",
@@ -94,6 +92,14 @@ def generate_routes():
                   length="4.5", width="1.8", maxSpeed="50", accel="2", decel="3",
                   sigma="0.5", probability=str(vehicle_type_ratios["taxi"]))
 
+
+def generate_routes(route_file=route_filename):
+    root = ET.Element("routes")
+    # 创建 bus line 映射以便后续查找
+    bus_line_by_id = {line["id"]: line for line in bus_lines}
+    # 1) 车型与分布
+    add_vehicle_types(root)
+
     # -------------------------- 定义固定路线（直/左/右） --------------------------
     # 每个进口三条 route（注意仅写边 id，内部连接由 SUMO 自动衔接）
     route_map = {
@@ -239,9 +245,9 @@ def generate_routes():
     # 保存路由文件
     rough = ET.tostring(root, 'utf-8')
     reparsed = minidom.parseString(rough)
-    with open(route_filename, "w", encoding="utf-8") as f:
+    with open(route_file, "w", encoding="utf-8") as f:
         f.write(reparsed.toprettyxml(indent="  "))
-    print(f"交通需求（流量）文件生成成功：{route_filename}")
+    print(f"交通需求（流量）文件生成成功：{route_file}")
 
 def generate_additional():
     # 生成公交站点定义文件
@@ -266,6 +272,110 @@ def generate_additional():
     print(f"公交站点文件生成成功：{additional_filename}")
 
 
-random.seed(42)
-generate_routes()
-generate_additional()
+# -------------------------- 多路口干道（corridor）需求 --------------------------
+corridor_route_filename = "./test/corridor/traffic.rou.xml"
+
+
+def corridor_arterial(n, direction, start=0, end=None):
+    """
+    干道方向 direction（"east" 东行 / "west" 西行）上从路口 start 到 end（含）的边序列，
+    每个路口为 [近段进口, 出口]。东行按 J0..J{n-1}，西行按 J{n-1}..J0 计数。
+    """
+    end = n - 1 if end is None else end
+    ks = range(start, end + 1) if direction == "east" else range(n - 1 - start, n - 2 - end, -1)
+    in_side, out_side = ("w", "e") if direction == "east" else ("e", "w")
+    edges = []
+    for k in ks:
+        edges += [f"J{k}_{in_side}_in", f"J{k}_{out_side}_out"]
+    return edges
+
+
+def generate_corridor_routes(route_file=corridor_route_filename):
+    """
+    干道需求：两端入口的东/西行直行流（贯穿全线）与在各路口左/右转离开的转向流，
+    以及各支路的直行 / 汇入干道的转向流。车辆 ID 沿用单路口的 flow 命名（含方向与转向）。
+    """
+    corridor = config["corridor"]
+    n = corridor["junctions"]
+    root = ET.Element("routes")
+    add_vehicle_types(root)
+
+    routes = {}
+    # 干道：东行从西端进入（west），西行从东端进入（east）
+    for direction, origin, far_edge in (("east", "west", "W_in_far"), ("west", "east", "E_in_far")):
+        routes[f"r_{origin}_straight"] = [far_edge] + corridor_arterial(n, direction)
+        right_side, left_side = ("s", "n") if direction == "east" else ("n", "s")
+        for i in range(n):
+            k = i if direction == "east" else n - 1 - i
+            path = [far_edge] + corridor_arterial(n, direction, end=i)[:-1]
+            routes[f"r_{origin}_J{k}_right"] = path + [f"J{k}_{right_side}_out"]
+            routes[f"r_{origin}_J{k}_left"] = path + [f"J{k}_{left_side}_out"]
+    # 支路：北进口（南行）右转汇入西行、左转汇入东行；南进口相反
+    for k in range(n):
+        east_rest = corridor_arterial(n, "east", start=k + 1) if k < n - 1 else []
+        west_rest = corridor_arterial(n, "west", start=n - k) if k > 0 else []
+        for origin, d, opposite, right_rest, left_rest, right_out, left_out in (
+                ("north", "n", "s", west_rest, east_rest, "w", "e"),
+                ("south", "s", "n", east_rest, west_rest, "e", "w")):
+            routes[f"r_J{k}_{origin}_straight"] = [f"J{k}_{d}_in", f"J{k}_{opposite}_out"]
+            routes[f"r_J{k}_{origin}_right"] = [f"J{k}_{d}_in", f"J{k}_{right_out}_out"] + right_rest
+            routes[f"r_J{k}_{origin}_left"] = [f"J{k}_{d}_in", f"J{k}_{left_out}_out"] + left_rest
+    for rid, edges in routes.items():
+        ET.SubElement(root, "route", id=rid, edges=" ".join(edges))
+
+    # 各 route 的小时流量
+    route_vph = {}
+    turn_share = corridor["arterial_turn_share"]
+    for origin in ("west", "east"):
+        route_vph[f"r_{origin}_straight"] = corridor["arterial_flow"] * (1 - turn_share)
+        for k in range(n):
+            for turn in ("right", "left"):
+                route_vph[f"r_{origin}_J{k}_{turn}"] = corridor["arterial_flow"] * turn_share / (2 * n)
+    straight_r, left_r, right_r = corridor["side_turn_ratios"]
+    total = straight_r + left_r + right_r
+    for k in range(n):
+        for origin in ("north", "south"):
+            for turn, ratio in (("straight", straight_r), ("left", left_r), ("right", right_r)):
+                route_vph[f"r_J{k}_{origin}_{turn}"] = corridor["side_flow"] * ratio / total
+
+    bins = build_time_bins(simulation_start, simulation_end, time_bin)
+    scales = normalize_scale_over_bins(bins)
+    flow_idx = 0
+    for (b, e), scale in zip(bins, scales):
+        for rid, vph in route_vph.items():
+            if vph <= 0:
+                continue
+            ET.SubElement(root, "flow", id=f"f_{flow_idx}_{rid[2:]}_{int(b)}", type="mix",
+                          begin=str(b), end=str(e), route=rid,
+                          vehsPerHour=str(round(vph * scale, 4)),
+                          departLane="best", departSpeed="random")
+            flow_idx += 1
+
+    rough = ET.tostring(root, 'utf-8')
+    reparsed = minidom.parseString(rough)
+    with open(route_file, "w", encoding="utf-8") as f:
+        f.write(reparsed.toprettyxml(indent="  "))
+    print(f"干道交通需求文件生成成功：{route_file}（{n} 个路口）")
+
+
+parser = argparse.ArgumentParser(description="生成交通需求文件")
+# 时间片流量波动的随机种子（默认取 config.json 的 demand_seed），重复实验时每个种子一份需求
+parser.add_argument("--seed", type=int, default=config.get("demand_seed", 42),
+                    help="需求随机种子（默认 config.json 的 demand_seed）")
+parser.add_argument("--route-file", default=None,
+                    help="只生成路由文件到此路径（不生成附加文件），用于按种子生成多份需求")
+parser.add_argument("--corridor", action="store_true",
+                    help="与 --route-file 一起使用：生成干道场景的路由")
+args = parser.parse_args()
+
+random.seed(args.seed)
+if args.route_file:
+    if args.corridor:
+        generate_corridor_routes(args.route_file)
+    else:
+        generate_routes(args.route_file)
+else:
+    generate_routes()
+    generate_additional()
+    if config.get("corridor", {}).get("enabled", False):
+        generate_corridor_routes()
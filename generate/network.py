@@ -254,7 +254,154 @@ def build_net(nodes=NODES_FILE, edges=EDGES_FILE, out_net=NET_FILE, conns_path=C
     return True
 
 
+# -------------------------- 多路口干道（corridor） --------------------------
+# N 个信号交叉口沿 x 轴等间距排列，东西向为干道，每个路口有南北向支路。
+# 路口 J{k} 的进口道: J{k}_w_in / J{k}_e_in（干道近段，限制车型、禁变道）、J{k}_n_in / J{k}_s_in（支路）
+# 出口道: J{k}_e_out / J{k}_w_out（兼作下一路口进口的远段，不限车型）、J{k}_n_out / J{k}_s_out
+CORRIDOR = config.get("corridor", {})
+CORRIDOR_DIR = os.path.join(OUT_DIR, "corridor")
+CORRIDOR_NODES_FILE = os.path.join(CORRIDOR_DIR, "nodes.nod.xml")
+CORRIDOR_EDGES_FILE = os.path.join(CORRIDOR_DIR, "edges.edg.xml")
+CORRIDOR_CONN_FILE = os.path.join(CORRIDOR_DIR, "connections.con.xml")
+CORRIDOR_NET_FILE = os.path.join(CORRIDOR_DIR, "corridor.net.xml")
+
+# 各进口的 (直行, 右转, 左转) 出口方位
+CORRIDOR_TURNS = {"w": ("e", "s", "n"), "e": ("w", "n", "s"), "n": ("s", "w", "e"), "s": ("n", "e", "w")}
+
+
+def corridor_geometry(n=None):
+    """干道各节点坐标：路口 J{k}、路段中点 L{k}、两端入口 W/E 及其近段起点 WM/EM、支路端点 N{k}/S{k}"""
+    n = n or CORRIDOR["junctions"]
+    spacing = CORRIDOR["spacing"]
+    side_length = CORRIDOR["side_length"]
+    entry_length = CORRIDOR["entry_length"]
+    xs = [center_x + k * spacing for k in range(n)]
+    nodes = {f"J{k}": (x, center_y) for k, x in enumerate(xs)}
+    for k in range(n - 1):
+        nodes[f"L{k}"] = (xs[k] + spacing / 2, center_y)
+    nodes["WM"] = (xs[0] - spacing / 2, center_y)
+    nodes["W"] = (xs[0] - spacing / 2 - entry_length, center_y)
+    nodes["EM"] = (xs[-1] + spacing / 2, center_y)
+    nodes["E"] = (xs[-1] + spacing / 2 + entry_length, center_y)
+    for k, x in enumerate(xs):
+        nodes[f"N{k}"] = (x, center_y + side_length)
+        nodes[f"S{k}"] = (x, center_y - side_length)
+    return nodes
+
+
+def corridor_edges(n=None):
+    """[(edge_id, from, to, 车道功能串, 是否干道近段)]"""
+    n = n or CORRIDOR["junctions"]
+    arterial = CORRIDOR["arterial_lanes"]
+    side = CORRIDOR["side_lanes"]
+    side_out = "s" * CORRIDOR["side_out_lanes"]
+    edges = [
+        ("W_in_far", "W", "WM", arterial, False),
+        ("J0_w_in", "WM", "J0", arterial, True),
+        ("J0_w_out", "J0", "WM", arterial, False),
+        ("E_in_far", "E", "EM", arterial, False),
+        (f"J{n - 1}_e_in", "EM", f"J{n - 1}", arterial, True),
+        (f"J{n - 1}_e_out", f"J{n - 1}", "EM", arterial, False),
+    ]
+    for k in range(n - 1):
+        edges += [
+            (f"J{k}_e_out", f"J{k}", f"L{k}", arterial, False),
+            (f"J{k + 1}_w_in", f"L{k}", f"J{k + 1}", arterial, True),
+            (f"J{k + 1}_w_out", f"J{k + 1}", f"L{k}", arterial, False),
+            (f"J{k}_e_in", f"L{k}", f"J{k}", arterial, True),
+        ]
+    for k in range(n):
+        for d, end in (("n", f"N{k}"), ("s", f"S{k}")):
+            edges += [
+                (f"J{k}_{d}_in", end, f"J{k}", side, False),
+                (f"J{k}_{d}_out", f"J{k}", end, side_out, False),
+            ]
+    return edges
+
+
+def write_corridor_nodes(path=CORRIDOR_NODES_FILE, n=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    nodes = ET.Element("nodes")
+    for node_id, (x, y) in corridor_geometry(n).items():
+        node_type = "traffic_light" if node_id.startswith("J") else "priority"
+        ET.SubElement(nodes, "node", id=node_id, x=str(x), y=str(y), type=node_type)
+    with open(path, "wb") as f:
+        f.write(prettify(nodes))
+    print(f"[OK] corridor nodes -> {path}")
+
+
+def write_corridor_edges(path=CORRIDOR_EDGES_FILE, n=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    edges = ET.Element("edges")
+    for edge_id, frm, to, func_str, is_near in corridor_edges(n):
+        e = ET.SubElement(edges, "edge", id=edge_id, **{"from": frm, "to": to},
+                          numLanes=str(len(func_str)), speed=str(speed_ms))
+        for lane_idx, func in enumerate(func_str):
+            lane_attrs = {"index": str(lane_idx), "speed": str(speed_ms), "width": str(normal_lane_width)}
+            # 与单路口一致：只有干道近段限制车型并禁止变道，远段 / 出口 / 支路不限
+            if is_near:
+                if func == 'c':
+                    lane_attrs["allow"] = "taxi"
+                elif func == 's':
+                    lane_attrs["disallow"] = "taxi"
+                lane_attrs["changeLeft"] = "emergency"
+                lane_attrs["changeRight"] = "emergency"
+            ET.SubElement(e, "lane", **lane_attrs)
+    with open(path, "wb") as f:
+        f.write(prettify(edges))
+    print(f"[OK] corridor edges -> {path}")
+
+
+def write_corridor_connections(path=CORRIDOR_CONN_FILE, n=None):
+    n = n or CORRIDOR["junctions"]
+    cons = ET.Element("connections")
+    lanes = {edge_id: func_str for edge_id, _, _, func_str, _ in corridor_edges(n)}
+
+    def add_conn(fr_edge, fr_lane, to_edge, to_lane):
+        ET.SubElement(cons, "connection", **{"from": fr_edge, "to": to_edge,
+                                             "fromLane": str(fr_lane), "toLane": str(to_lane)})
+
+    for k in range(n):
+        for d, (to_s, to_r, to_l) in CORRIDOR_TURNS.items():
+            in_edge = f"J{k}_{d}_in"
+            func_str = lanes[in_edge]
+            straight_edge, right_edge, left_edge = (f"J{k}_{x}_out" for x in (to_s, to_r, to_l))
+            n_straight_out = len(lanes[straight_edge])
+            for lane_idx, func in enumerate(func_str):
+                if func in ('r', 't'):
+                    add_conn(in_edge, lane_idx, right_edge, 0)
+                if func in ('l', 'u'):
+                    add_conn(in_edge, lane_idx, left_edge, len(lanes[left_edge]) - 1)
+                if func in ('s', 't', 'u', 'c'):
+                    # 直行车道保持车道序号，CAV 专用道在下游同一序号上延续（编队路径跨路口连贯）
+                    add_conn(in_edge, lane_idx, straight_edge, min(lane_idx, n_straight_out - 1))
+
+    # 远段 -> 近段：逐车道对应
+    far_to_near = [("W_in_far", "J0_w_in"), ("E_in_far", f"J{n - 1}_e_in")]
+    for k in range(n - 1):
+        far_to_near += [(f"J{k}_e_out", f"J{k + 1}_w_in"), (f"J{k + 1}_w_out", f"J{k}_e_in")]
+    for far_edge, near_edge in far_to_near:
+        for lane_idx in range(len(lanes[near_edge])):
+            add_conn(far_edge, lane_idx, near_edge, lane_idx)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(prettify(cons))
+    print(f"[OK] corridor connections -> {path}")
+
+
+def build_corridor(n=None):
+    n = n or CORRIDOR["junctions"]
+    print(f"[RUN] 生成 {n} 路口干道")
+    write_corridor_nodes(n=n)
+    write_corridor_edges(n=n)
+    write_corridor_connections(n=n)
+    return build_net(CORRIDOR_NODES_FILE, CORRIDOR_EDGES_FILE, CORRIDOR_NET_FILE, CORRIDOR_CONN_FILE)
+
+
 write_nodes()
 write_edges()
 write_connections()
 build_net()
+if CORRIDOR.get("enabled", False):
+    build_corridor()
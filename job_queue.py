@@ -0,0 +1,154 @@
+import json
+import os
+import socket
+import uuid
+
+# 共享目录作业队列：多台主机挂载同一文件系统即可协同运行批量任务，不需要外部消息服务
+LEASE_S = 600.0       # 租约时长（秒）：运行中的任务超过该时间没有心跳即视为工作进程崩溃
+MAX_ATTEMPTS = 3      # 租约过期后最多重新入队的次数
+STATES = ("pending", "running", "done", "failed")
+
+
+class JobQueue:
+    """
+    基于目录的作业队列（root/{pending,running,done,failed}/<任务ID>.json）：
+    1. 发布：任务描述先写入 tmp/，再 os.replace 到 pending/（读者不会看到半截文件）
+    2. 认领：os.rename(pending/x, running/x)，同一文件系统上的 rename 是原子的，只有一个工作进程成功
+    3. 租约：running/ 中文件的修改时间即最近一次心跳，工作进程运行期间定期 touch；
+       超过 lease 秒未更新的任务由任意工作进程回收（先 rename 到 tmp/ 保证只回收一次），
+       重新放回 pending/，超过 max_attempts 次移入 failed/
+    4. 完成：结果写入 done/（或 failed/）后删除 running/ 中的文件
+    时间比较使用文件系统自身的时钟（touch 探针文件），不依赖各主机时钟同步。
+    """
+
+    def __init__(self, root, lease=LEASE_S, max_attempts=MAX_ATTEMPTS):
+        self.root = root
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.worker = f"{socket.gethostname()}-{os.getpid()}"
+        for state in STATES + ("tmp",):
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+
+    def _path(self, state, job_id):
+        return os.path.join(self.root, state, f"{job_id}.json")
+
+    def _write(self, state, job_id, data):
+        tmp = os.path.join(self.root, "tmp", f"{job_id}.{uuid.uuid4().hex}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp, self._path(state, job_id))
+
+    @staticmethod
+    def _read(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _ids(self, state):
+        return sorted(name[:-5] for name in os.listdir(os.path.join(self.root, state))
+                      if name.endswith(".json"))
+
+    def fs_now(self):
+        """文件系统当前时间（与租约文件的修改时间同源）"""
+        probe = os.path.join(self.root, ".clock")
+        with open(probe, "a"):
+            pass
+        os.utime(probe, None)
+        return os.stat(probe).st_mtime
+
+    # ---------------- 发布端 ----------------
+    def publish(self, job_id, spec):
+        """发布任务；已在排队或运行中的任务不重复发布，返回是否发布"""
+        if os.path.exists(self._path("pending", job_id)) or \
+                os.path.exists(self._path("running", job_id)):
+            return False
+        for state in ("done", "failed"):
+            # 上一次的结果（如失败）作废，重新运行
+            try:
+                os.remove(self._path(state, job_id))
+            except FileNotFoundError:
+                pass
+        self._write("pending", job_id, dict(spec, id=job_id, attempts=0))
+        return True
+
+    # ---------------- 工作端 ----------------
+    def reap(self):
+        """回收租约过期的任务，返回回收数"""
+        now = self.fs_now()
+        reaped = 0
+        for job_id in self._ids("running"):
+            path = self._path("running", job_id)
+            try:
+                if now - os.stat(path).st_mtime <= self.lease:
+                    continue
+                tmp = os.path.join(self.root, "tmp", f"{job_id}.reap.{uuid.uuid4().hex}")
+                os.rename(path, tmp)
+            except FileNotFoundError:
+                continue   # 任务刚完成或已被其他进程回收
+            spec = self._read(tmp)
+            spec["attempts"] = spec.get("attempts", 0) + 1
+            if spec["attempts"] >= self.max_attempts:
+                # 与 complete() 写入的失败结果一致，带上非零 exit_code
+                self._write("failed", job_id, dict(spec, exit_code=-1, error="租约多次过期"))
+            else:
+                self._write("pending", job_id, spec)
+            os.remove(tmp)
+            reaped += 1
+        return reaped
+
+    def claim(self, ready=None):
+        """认领一个任务（ready(spec) 为 False 的任务跳过），返回 (任务ID, 任务描述) 或 None"""
+        for job_id in self._ids("pending"):
+            path = self._path("pending", job_id)
+            try:
+                spec = self._read(path)
+                if ready is not None and not ready(spec):
+                    continue
+                # 先刷新修改时间再移动：进入 running/ 时租约即为新的
+                os.utime(path, None)
+                os.rename(path, self._path("running", job_id))
+            except (FileNotFoundError, ValueError):
+                continue   # 已被其他进程认领
+            return job_id, spec
+        return None
+
+    def heartbeat(self, job_id):
+        """续租；任务已被回收（租约丢失）时返回 False"""
+        try:
+            os.utime(self._path("running", job_id), None)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, job_id, result, failed=False):
+        """写回结果；租约已丢失时不写，返回 False"""
+        path = self._path("running", job_id)
+        if not os.path.exists(path):
+            return False
+        self._write("failed" if failed else "done", job_id, dict(result, worker=self.worker))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    # ---------------- 查询 ----------------
+    def state(self, job_id):
+        for state in STATES:
+            if os.path.exists(self._path(state, job_id)):
+                return state
+        # 回收过程中任务描述暂存在 tmp/，视为仍在运行
+        prefix = f"{job_id}.reap."
+        if any(name.startswith(prefix) for name in os.listdir(os.path.join(self.root, "tmp"))):
+            return "running"
+        return None
+
+    def result(self, job_id):
+        for state in ("done", "failed"):
+            try:
+                return self._read(self._path(state, job_id))
+            except FileNotFoundError:
+                continue
+        return None
+
+    def counts(self):
+        return {state: len(self._ids(state)) for state in STATES}
@@ -0,0 +1,431 @@
+import math
+import numpy as np
+from platoon_order import PlatoonOrder
+from event_log import console
+from longitudinal_planner import (
+    ACCEL_COMFORT_VAL, DECEL_SHAPE_FACTOR,
+    calculate_longitudinal_batch,
+)
+
+VEH_LENGTH = 4.5        # 车辆长度（米）
+
+# --- 协同控制参数 ---
+MAX_SPEED = 16.67       # 最大车速（m/s）
+MAX_EXTENSION = 15.0    # 绿灯最长延长时间（s）
+PRESSURE_THRESHOLD = 15 # 交通压力阈值（占有率/%）
+# 红灯早断参数
+EARLY_GREEN_PRESSURE = 1    # 南北左转只有少于3辆车排队时，才允许截断
+MIN_NS_LEFT_TIME = 5.0      # 南北左转最小绿灯运行时间 (秒)
+DETECTION_DIST = 200.0      # 头车检测距离
+PRESSURE_RANGES = (80.0, 150.0, DETECTION_DIST)  # 压力检测范围（绿灯延长 / 红灯早断 / 默认）
+
+# 停止线参数
+VIRTUAL_STOP_GAP = 30.0  # 虚拟停止线距离实际路口的距离 (米)
+STOP_BUFFER = 2.0       # 停止缓冲区距离 (米)
+# 纵向规划参数（舒适加速度、跟车时距、安全减速度等）见 longitudinal_planner.py
+
+# 防溜车/停车保持参数
+STANDSTILL_SPEED_THR = 0.1    # 判定为静止的速度阈值 (m/s)
+STOP_DISTANCE_DEADBAND = 0.5  # 定点停车时的距离死区 (m)，小于此距离且低速则直接停
+
+# 编队 / 非编队车辆的跟车参数
+DEFAULT_MINGAP = 2.5
+PLATOON_MINGAP = 0.5
+DEFAULT_TAU = 1.0
+PLATOON_TAU = 0.1
+BRAKING_HORIZON = 150.0
+
+MAJOR_GREEN = "G"
+
+
+def apply_params(params):
+    """
+    覆盖控制参数（调参 / 批量搜索用），如 {"MAX_EXTENSION": 20, "TIME_HEADWAY": 0.8}。
+    参数名须为本模块或 longitudinal_planner 中已有的大写常量；同名常量在两个模块中同时修改。
+    """
+    import longitudinal_planner
+    modules = [globals(), vars(longitudinal_planner)]
+    for name, value in params.items():
+        owners = [m for m in modules if name.isupper() and name in m]
+        if not owners:
+            raise ValueError(f"未知的控制参数: {name}")
+        for m in owners:
+            m[name] = type(m[name])(value)
+
+
+def derive_junction(topology, tls_id, phase_states, cav_class="taxi"):
+    """
+    由路网拓扑和 tlLogic 相位推导单个信号路口的控制配置：
+    1. 编队路径：该信号灯控制的 CAV 专用进口车道，经内部车道到出口车道的连贯车道链及累计里程偏移
+    2. 目标相位：编队进口道获得主绿灯（G）的第一个相位
+    3. 干扰相位：其余含主绿灯的相位，每个相位的压力检测车道组为在该相位获得 G 的进口车道
+    4. 起步前相位：目标相位之前（上一个绿灯相位之后）的黄灯 / 全红
+    """
+    paths = topology.cav_paths(cav_class, tls_id)
+    if not paths:
+        raise ValueError(f"信号灯 {tls_id} 没有 {cav_class} 专用进口车道")
+
+    def green_lanes(state):
+        out = []
+        for i, link in enumerate(topology.controlled_links(tls_id)):
+            if state[i] != MAJOR_GREEN:
+                continue
+            for frm, _, _ in link:
+                if frm not in out:
+                    out.append(frm)
+        return out
+
+    inlet_links = topology.link_indices(tls_id, paths[0]["inlet"])
+    target_phase = next(p for p, state in enumerate(phase_states)
+                        if any(state[i] == MAJOR_GREEN for i in inlet_links))
+    pressure_groups = {}
+    truncate_map = {}
+    for p, state in enumerate(phase_states):
+        if p == target_phase or MAJOR_GREEN not in state:
+            continue
+        group = f"phase_{p}"
+        pressure_groups[group] = green_lanes(state)
+        truncate_map[p] = group
+
+    pre_start = []
+    p = (target_phase - 1) % len(phase_states)
+    while p != target_phase and MAJOR_GREEN not in phase_states[p]:
+        pre_start.append(p)
+        p = (p - 1) % len(phase_states)
+
+    return {
+        "tls_id": tls_id,
+        "platoon_paths": paths,
+        "target_phase": target_phase,
+        "pressure_groups": pressure_groups,
+        "truncate_map": truncate_map,
+        "pre_start_phases": sorted(pre_start),
+    }
+
+
+def release_vehicles(snap, act, candidates, claimed=()):
+    """
+    退出控制的车辆恢复默认跟车参数。
+    claimed 为本步被任一路口纳入编队的车辆：跨路口移动的车辆不释放，避免覆盖下游路口的命令。
+    """
+    for veh_id in candidates:
+        if veh_id in claimed:
+            continue
+        # 只有当车辆还存在时，才进行重置，否则忽略（由快照订阅结果判断，无需 getIDList）
+        if snap.is_alive(veh_id):
+            act.set_color(veh_id, (255, 255, 0, 255))
+            act.set_speed(veh_id, -1)
+            act.set_speed_mode(veh_id, 31)
+            act.set_tau(veh_id, DEFAULT_TAU)
+            act.set_min_gap(veh_id, DEFAULT_MINGAP)
+            act.release(veh_id)
+        else:
+            act.forget(veh_id)
+
+
+class JunctionController:
+    """
+    单个信号路口的协同控制器（信号优先 + 编队轨迹控制），配置由 derive_junction 给出。
+    每个路口一个实例，持有本路口的编队顺序、绿灯延长限速时刻与受控车辆集合；
+    输入为快照 / 压力 / 信号 / 时间线视图，输出只经 act 与 signal 的写操作，
+    因此既可在主进程内逐路口执行，也可在控制器进程池中按分片执行。
+    """
+
+    def __init__(self, config, log=console):
+        self.config = config
+        self.tls_id = config["tls_id"]
+        self.platoon_paths = config["platoon_paths"]
+        self.target_phase = config["target_phase"]
+        self.pressure_groups = config["pressure_groups"]
+        self.truncate_map = {int(p): g for p, g in config["truncate_map"].items()}
+        self.pre_start_phases = frozenset(config["pre_start_phases"])
+        self.lanes = [lane for path in self.platoon_paths for lane in path["lanes"]]
+        self.log = log
+
+        # 每条路径一个持久有序车辆表，跨步复用上一步的顺序
+        self.platoon_orders = [PlatoonOrder(path["lanes"], path["offsets"])
+                               for path in self.platoon_paths]
+        # 状态变量
+        self.last_extension_time = -100
+        self.managed_last_step = set()
+        self._platoon_cache = (None, [])    # (仿真时间, 本步编队列表)
+
+    def collect_platoons(self, snap):
+        """
+        按路径刷新编队顺序，返回 [(路径配置, PlatoonOrder)]（只含非空路径）。
+        同一步内信号优先与轨迹控制共用一次结果。
+        """
+        if self._platoon_cache[0] == snap.time:
+            return self._platoon_cache[1]
+        platoons = []
+        for path_config, platoon in zip(self.platoon_paths, self.platoon_orders):
+            # 车辆已在快照中预筛选；在上一步顺序上增量排序
+            platoon.update(snap)
+            if len(platoon) > 0:
+                platoons.append((path_config, platoon))
+        self._platoon_cache = (snap.time, platoons)
+        return platoons
+
+    def signal_priority(self, snap, pressure, signal, timeline):
+        """
+        信号优化逻辑 (Signal Priority)：绿灯延长 / 红灯早断。
+        决策本身已由 last_extension_time 限速，无需每 0.1s 执行，由调度器按 SIGNAL_PERIOD 调用。
+        """
+        # 车辆状态来自订阅快照，交通压力来自 PressureEngine，信号状态来自 SignalState（本步内重复查询只是查表）
+        current_time = snap.time
+        current_phase = signal.phase
+        # 目标相位：编队进口道的绿灯相位（单路口为东西直行 Phase 0）
+        is_green_global = (current_phase == self.target_phase)
+        for path_config, platoon in self.collect_platoons(snap):
+            inlet_lane_id = path_config["inlet"]
+            all_path_cavs = platoon.vehicles
+
+            # 定义关键车辆
+            tail_veh = platoon.tail
+            tail_lane = snap.state(tail_veh).lane_id
+
+            approaching_head_veh = None
+            for v in all_path_cavs:
+                if snap.state(v).lane_id == inlet_lane_id:
+                    approaching_head_veh = v
+                    break
+
+            # ---------------------------------------------------
+            # 场景 A: 绿灯延长 (目标相位: 东西直行 Phase 0)
+            # ---------------------------------------------------
+            if  is_green_global:
+                if tail_lane == inlet_lane_id:
+                    # 进口道本次绿灯剩余时间（时间线已包含本周期的延长 / 早断）
+                    time_rem = timeline.green_remaining(inlet_lane_id, current_time)
+                    tail_state = snap.state(tail_veh)
+                    dist_tail_to_stop = snap.lane_length[tail_lane] - tail_state.lane_pos
+                    v_tail = max(1.0, tail_state.speed)
+                    eta_tail = dist_tail_to_stop / v_tail
+
+                    if eta_tail > time_rem:
+                        needed_extension = eta_tail - time_rem
+
+                        # >>> 修改：使用新函数检测侧向压力 <<<
+                        # 检测范围设为 80米，如果侧向 80米内有车，就不延长了，把路权还给别人
+                        # 这里把所有干扰流加起来
+                        total_cross_pressure = sum(pressure.pressure(group, 80.0)
+                                                   for group in self.truncate_map.values())
+
+                        if (needed_extension < MAX_EXTENSION and 
+                            total_cross_pressure < PRESSURE_THRESHOLD and 
+                            (current_time - self.last_extension_time > 3.0)): 
+
+                            current_duration = signal.phase_duration
+                            signal.set_phase_duration(current_duration + needed_extension + 2.0)
+                            self.last_extension_time = current_time
+                            self.log("signal_extend", t=current_time, tls=self.tls_id,
+                                     extension=needed_extension)
+
+            # ---------------------------------------------------
+            # 场景 B: 红灯早断/相位插入 (通用逻辑: 针对所有非目标绿灯)
+            # ---------------------------------------------------
+            else:
+                # 可截断的相位及其压力检测车道组（由 tlLogic 推导，格式: {相位ID: 检测车道组}）
+                truncate_map = self.truncate_map
+
+                # 检查当前相位是否在可截断列表中
+                if current_phase in truncate_map:
+                    pressure_group = truncate_map[current_phase]
+
+                    if approaching_head_veh: 
+                        head_state = snap.state(approaching_head_veh)
+                        dist_head_to_stop = snap.lane_length[head_state.lane_id] - head_state.lane_pos
+                        if dist_head_to_stop < DETECTION_DIST:
+
+                            # 1. 安全时间检查 (保持不变)
+                            next_switch = signal.next_switch
+                            time_spent = signal.elapsed(current_time)
+
+                            # >>> 修改：使用新函数检测当前放行方向的压力 <<<
+                            # 关键：这里检测范围要设大一点，比如 150米
+                            # 含义：只要当前绿灯方向 150米 内还有车，就绝对不能截断！
+                            current_pressure = pressure.pressure(pressure_group, 150.0)
+
+                            # 调试打印 (可选)：看看现在的压力是不是变正常了
+                            # print(f"DEBUG: 相位 {current_phase} 压力检测: {current_pressure} 辆")
+
+
+                            # 3. 触发早断
+                            # 注意：最小运行时间设为 5.0s，压力阈值设为 3
+                            if (current_pressure < EARLY_GREEN_PRESSURE and 
+                                time_spent > 5.0 and 
+                                (current_time - self.last_extension_time > 5.0)):
+
+                                # >>> 强制跳转到下一相位 (黄灯) <<<
+                                # 假设所有绿灯的下一相位都是黄灯，ID + 1
+                                next_phase_index = current_phase + 1
+                                signal.set_phase(next_phase_index)
+
+                                time_saved = next_switch - current_time
+                                self.last_extension_time = current_time
+
+                                self.log("signal_truncate", t=current_time, tls=self.tls_id,
+                                         phase=current_phase, next_phase=next_phase_index,
+                                         saved=time_saved, pressure=current_pressure)
+
+    def trajectory(self, snap, act, signal, timeline):
+        """
+        逐车轨迹控制 (Trajectory Control) - 五次多项式应用。
+        返回上一次受控、本次已不在编队中的车辆（由调用方在所有路口执行完后统一释放）。
+        """
+        # 车辆写操作经 act 暂存，步末只下发真正变化的值
+        current_time = snap.time
+
+        # 本帧受控车辆集合
+        managed_vehs_this_step = set()
+
+        # >>> 在循环外先获取信号状态，供所有车辆使用（SignalState 本步快照） <<<
+        current_phase = signal.phase
+        is_green_global = (current_phase == self.target_phase)
+        # 目标相位之前的黄灯 / 全红（即将起步）
+        is_pre_start = (current_phase in self.pre_start_phases)
+        # 纵向速度请求：先按路径逐车决策，收集输入后统一批量计算
+        # 每行 (v_curr, a_curr, target_speed, dist_to_stop, leader_gap, leader_v)，无前车为 NaN
+        plan_rows = []
+        plan_vehs = []   # [(veh_id, 颜色)]
+
+        def request_speed(veh_id, color, v_curr, a_curr, target_speed,
+                          dist_to_stop=math.nan, leader_gap=math.nan, leader_v=math.nan):
+            plan_rows.append((v_curr, a_curr, target_speed, dist_to_stop, leader_gap, leader_v))
+            plan_vehs.append((veh_id, color))
+
+        # 遍历每一条完整的路径
+        for path_config, platoon in self.collect_platoons(snap):
+            inlet_lane_id = path_config["inlet"]
+            all_path_cavs = platoon.vehicles
+
+            SLOT_LENGTH = VEH_LENGTH + PLATOON_MINGAP + STOP_BUFFER
+            action_share = {}
+            for i, veh_id in enumerate(all_path_cavs):
+                managed_vehs_this_step.add(veh_id)
+                veh_state = snap.state(veh_id)
+                v_curr = veh_state.speed
+                a_curr = veh_state.accel # 获取当前加速度
+                curr_lane = veh_state.lane_id
+                is_on_inlet = (curr_lane == inlet_lane_id)
+                act.set_speed_mode(veh_id, 31)
+
+                is_global_leader = (i == 0)
+                if not is_global_leader:
+                    leader_id = platoon.leader(veh_id)
+                    if is_on_inlet:
+                        leader_lane = snap.state(leader_id).lane_id
+                        # 核心判断：如果前车所在的不是进口道（说明它已经进了路口内部或者到了出口道）
+                        if leader_lane != inlet_lane_id:
+                            # 如果现在不是绿灯，中间有红灯阻隔，即使距离再近也不能跟车！
+                            if not is_green_global:
+                                is_global_leader = True
+                                # 此时被强制判定为头车，下文逻辑就会让它执行红灯停车（变橙色）
+                                # 而不是执行跟随逻辑（变蓝色闯红灯）
+
+                # === 领航者逻辑 (Leader) ===
+                if is_global_leader:
+                    should_stop = False
+                    if is_on_inlet:
+                        time_rem = timeline.green_remaining(inlet_lane_id, current_time)
+                        dist_tail_to_stop = snap.lane_length[curr_lane] - veh_state.lane_pos
+                        v_tail = v_curr
+                        eta_tail = dist_tail_to_stop / max(0.01,v_tail)
+                        if (not is_pre_start)and(not is_green_global):
+                            should_stop = True
+                        elif time_rem<15 and is_green_global: 
+                            # print(f'剩余时间{time_rem:.1f}s, {veh_id}车剩余距离{dist_tail_to_stop:.1f}m, tail车速度{v_tail:.1f}m/s, tail车到达时间{eta_tail:.1f}s')
+                            if (eta_tail > time_rem-3):
+                                should_stop = True
+
+                    # 场景 1: 红灯停车 (必须严格限制在进口道内)
+                    # 只有在进口道且红灯时，才执行停车逻辑。
+                    # 如果已经出了进口道(在路口内)，即使红灯也不能停，必须继续走。
+                    if should_stop:
+                        act.set_speed_mode(veh_id, 31) # 停车需要安全模式
+                        act.set_tau(veh_id, PLATOON_TAU)
+                        act.set_min_gap(veh_id, PLATOON_MINGAP)
+                        pos_curr = veh_state.lane_pos
+                        dist_to_stopline = snap.lane_length[curr_lane] - pos_curr
+                        dist_to_virtual_stop = dist_to_stopline - VIRTUAL_STOP_GAP
+                        if dist_to_virtual_stop < BRAKING_HORIZON:
+                            valid_dist = max(0.1, dist_to_virtual_stop)
+                            request_speed(veh_id, (255, 140, 0, 255), # 橙色
+                                          v_curr, a_curr, 0, dist_to_stop=valid_dist)
+                        # else:
+                            # act.set_speed(veh_id, -1)
+                        action_share[i] = "stop"
+                    # 场景 2: 绿灯行驶 OR 已经越过停止线 (通用加速逻辑)
+                    else:
+                        act.set_speed_mode(veh_id, 31)
+                        act.set_tau(veh_id, PLATOON_TAU)
+                        act.set_min_gap(veh_id, PLATOON_MINGAP)
+                        # >>> 修正点：无论在哪，只要没达到极速，就继续五次多项式加速 <<<
+                        # 颜色区分：
+                        # 进口道内加速：淡绿
+                        # 路口内/出口道加速：淡青 (方便观察是否延续了逻辑)
+                        request_speed(veh_id, (144, 238, 144, 255),
+                                      v_curr, a_curr, MAX_SPEED)
+                        action_share[i] = "accel"
+
+                # === 跟随者逻辑 (Follower) ===
+                else:
+                    leader_action = action_share[i-1]
+                    leader_id = platoon.leader(veh_id)
+                    leader_state = snap.state(leader_id)
+                    leader_v = leader_state.speed
+                    # accel_lead = leader_state.accel
+                    # 路径坐标差（同一车道链上的累计里程），与出发地点无关
+                    dist_to_lead = platoon.gap(veh_id) - VEH_LENGTH
+                    if leader_v <0.05:
+                        dist_to_my_stop = dist_to_lead - STOP_BUFFER
+                    else: 
+                        dist_to_stopline = snap.lane_length[curr_lane] - veh_state.lane_pos
+                        dist_to_virtual_stop = dist_to_stopline - VIRTUAL_STOP_GAP
+                        # 前方有多少action是stop的车
+                        num_stop_ahead = sum(1*(action == "stop") for action in action_share.values())
+                        dist_to_my_stop = dist_to_virtual_stop - num_stop_ahead * SLOT_LENGTH
+                    # print(f'no {i} : {dist_to_my_stop}')
+                    if (dist_to_my_stop > BRAKING_HORIZON):
+                        action_share[i] = "cruise"
+                        # print(f'no {i} : 未达到距离')
+                    elif (leader_action == "stop"):
+                        # >>> 恢复安全模式 <<<
+                        act.set_speed_mode(veh_id, 31) 
+                        act.set_tau(veh_id, PLATOON_TAU)
+                        act.set_min_gap(veh_id, PLATOON_MINGAP)
+
+                        braking_dist = max(0.1, dist_to_my_stop)
+                        request_speed(veh_id, (255, 165, 0, 255), # 橙色
+                                      v_curr, a_curr, 0, dist_to_stop=braking_dist)
+                        action_share[i] = "stop"
+                    # 2. 协同起步逻辑 (Mimic Leader Startup)
+                    elif leader_action == "accel":
+                        act.set_speed_mode(veh_id, 31) 
+                        act.set_tau(veh_id, PLATOON_TAU)
+                        act.set_min_gap(veh_id, PLATOON_MINGAP)
+                        # 计算与头车完全一致的加速曲线
+                        # 青色：协同强行加速中
+                        request_speed(veh_id, (0, 255, 255, 255),
+                                      v_curr, a_curr, MAX_SPEED,
+                                      leader_gap=dist_to_lead, leader_v=leader_v)
+                        action_share[i] = "accel"
+                    else:
+                        action_share[i] = 'unknown'
+
+        # 本步所有路径的速度请求一次向量化求解（与逐车调用标量版本结果一致）
+        if plan_rows:
+            v, a, target, dist, gap, lead_v = np.array(plan_rows).T
+            speeds = calculate_longitudinal_batch(
+                v, a, target, dist_to_stop=dist, dt=0.1,
+                comfort_accel=ACCEL_COMFORT_VAL, decel_shape_factor=DECEL_SHAPE_FACTOR,
+                leader_gap=gap, leader_v=lead_v,
+            )
+            for (veh_id, color), speed in zip(plan_vehs, speeds.tolist()):
+                act.set_speed(veh_id, speed)
+                act.set_color(veh_id, color)
+
+        # 上一帧受控、这一帧不在本路口编队中的车辆（可能已进入相邻路口的编队，由调用方统一判断）
+        vehs_to_release = self.managed_last_step - managed_vehs_this_step
+        self.managed_last_step = managed_vehs_this_step
+        return vehs_to_release
@@ -0,0 +1,283 @@
+import numpy as np
+
+# 纵向规划参数（cav_plus.py 与基准测试共用）
+STEP_LENGTH = 0.1             # 默认规划步长（秒），与仿真步长一致
+ACCEL_COMFORT_VAL = 1.5
+DECEL_SHAPE_FACTOR = 1.5
+
+# 安全与跟车参数
+LIMIT_DECEL_COMFORT = 1.5     # 舒适减速阈值
+LIMIT_DECEL_EMERGENCY = 5.0   # 紧急减速阈值
+SAFE_GAP_BASE = 2.0           # 静止时的最小间距 (m)
+TIME_HEADWAY = 0.5            # 期望跟车时距 (s) -> 间距 = Base + v * Headway
+FOLLOW_GAIN = 0.1             # 跟车速度调节增益 (K_p): 间距差1m，速度调整0.5m/s
+
+
+def calculate_longitudinal_command(
+    v_curr,
+    a_curr,
+    target_speed,
+    dist_to_stop=None,
+    dt=STEP_LENGTH,
+    comfort_accel=ACCEL_COMFORT_VAL,
+    decel_shape_factor=DECEL_SHAPE_FACTOR,
+    leader_gap=None,
+    leader_v=None,
+):
+    v0 = max(0.0, float(v_curr))
+    a0 = float(a_curr)
+    vt_cmd = float(target_speed)
+
+    # ------------------------------------------------------------
+    # 【修复 1】定点刹停模式 (Stop Mode)
+    # ------------------------------------------------------------
+    if target_speed == 0:
+        S = max(0.0, float(dist_to_stop))
+
+
+        if S <= 1e-6:
+            return 0.0
+
+        # 估计基准制动总时长：常加速度刹停的时间 T0 = 2S / v0（由 S = v0*T/2 推得）
+        eps_v = 1e-4
+        if v0 < eps_v:
+            # 当初速极低时，用 sqrt 规则给一个温和的时长，避免过小 T
+            # 推导：若常加速度 a_nom 则 S ~ 0.5*a*T^2 => T ~ sqrt(2S/a). 取 a_nom=1 作为时间尺度（单位无关，仅用于形状）
+            # 你也可以按系统经验写入一个 a_nom 常量替换 1.0
+            T0 = max(2.0 * (S ** 0.5), 2.0 * dt)
+        else:
+            T0 = 2.0 * S / v0
+
+        # 形状调节：shape_factor>1 => 更平缓、时间更长；<1 => 更激进
+        sf = max(0.3, float(decel_shape_factor))  # 下限避免过激进
+        T = max(1.5 * dt, sf * T0)
+
+        # 构建 quintic：x(t)=c0+c1 t+c2 t^2+c3 t^3+c4 t^4+c5 t^5
+        # 边界：
+        #  t=0:   x=0        v=v0       a=a0
+        #  t=T:   x=S        v=0        a=0
+        c0 = 0.0
+        c1 = v0
+        c2 = 0.5 * a0
+
+        # 方便起见定义中间量
+        xT0 = c1 * T + c2 * (T ** 2)        # = v0*T + 0.5*a0*T^2
+        vT0 = c1 + 2.0 * c2 * T             # = v0 + a0*T
+        aT0 = 2.0 * c2                      # = a0
+
+        # 解未知 c3,c4,c5 的线性系统（推导后的封闭式）
+        # 记 A=(S - xT0)/T^3, B=-(vT0)/T^3, C=-(aT0)/T^3
+        T2 = T * T
+        T3 = T2 * T
+
+        A = (S - xT0) / T3
+        B = (-vT0) / T3
+        C = (-aT0) / T3
+
+        # 由线性代数消元得到：
+        # u5 = 0.5 * [ C + (12 A)/T^2 - (6/T) B ]
+        # u4 = B - (3A)/T - 2 T u5
+        # u3 = A - T u4 - T^2 u5
+        invT = 1.0 / T
+        invT2 = invT * invT
+
+        u5 = 0.5 * (C + 12.0 * A * invT2 - 6.0 * invT * B)
+        u4 = B - 3.0 * A * invT - 2.0 * T * u5
+        u3 = A - T * u4 - T2 * u5
+
+        c3, c4, c5 = u3, u4, u5
+
+        # 计算下一时刻速度 v(dt)；限制不为负，且不超过当前速度太多（避免数值异常）
+        t = min(dt, T)  # 若 T<dt，按末速度0
+        if t >= T - 1e-9:
+            v_next = 0.0
+        else:
+            v_next = (
+                c1
+                + 2.0 * c2 * t
+                + 3.0 * c3 * (t ** 2)
+                + 4.0 * c4 * (t ** 3)
+                + 5.0 * c5 * (t ** 4)
+            )
+            # 数值保护
+            if not (v_next == v_next):  # NaN
+                v_next = 0.0
+            v_next = max(0.0, float(v_next))
+
+            # 额外的保守夹持：单步增幅不超过一个温和上限，避免意外上冲（通常不会发生在减速）
+            v_next = min(v_next, v0 + max(0.0, 0.5 * abs(a0)) * dt)
+
+        return v_next
+    # ------------------------------------------------------------
+    # 【修复 2】跟车/巡航模式 (Follow Mode)
+    # ------------------------------------------------------------
+    else:
+        vt_final = vt_cmd
+
+        if leader_gap is not None and leader_v is not None:
+            # 如果速度相差小于5%或者小于0.5m/s，不执行修正
+            if abs(leader_v - v0) < 0.5:
+                return leader_v
+            # [逻辑修复]: 前车静止时的防溜车逻辑
+            # 如果前车停了 (leader_v < 0.1) 且 我也停了 (v0 < 0.1)
+            else:
+                # 1. 计算期望间距 (Desired Gap)
+                # 期望间距 = 静止安全距离 + 当前速度 * 时距
+                # 例如：速度10m/s, 时距1.5s -> 期望保持 4 + 15 = 19m
+                desired_gap = SAFE_GAP_BASE + v0 * TIME_HEADWAY
+
+                # 2. 计算间距误差 (Gap Error)
+                current_gap = max(0.0, float(leader_gap))
+                gap_error = current_gap - desired_gap
+                # 正常的跟车速度计算
+                v_follow = leader_v + FOLLOW_GAIN * gap_error
+                v_follow = max(0.0, min(v_follow, vt_cmd))
+                
+                # 安全限制
+                actual_gap_for_safety = max(0.0, current_gap - SAFE_GAP_BASE)
+                v_soft = (leader_v**2 + 2.0 * LIMIT_DECEL_COMFORT * actual_gap_for_safety) ** 0.5
+                v_hard = (leader_v**2 + 2.0 * LIMIT_DECEL_EMERGENCY * actual_gap_for_safety) ** 0.5 # 这里修正公式，前车速度不能忽略
+                vt_final = min(v_follow, v_soft, v_hard)
+
+        # --- Quintic 速度规划 ---
+        dv = vt_final - v0
+        a_nom = max(comfort_accel, 0.5)
+        
+        if dv < -1.0: T_base = abs(dv) / (a_nom * 0.8)
+        else: T_base = abs(dv) / a_nom
+
+        T = max(1.0, 50 * dt, T_base) 
+
+        c1, c2 = v0, 0.5 * a0
+        V_total = vt_final - v0 - a0 * T
+        T2 = T * T
+        c3 = (2.0 * V_total + a0 * T) / T2
+        c4 = (-(5.0 / 4.0) * a0 * T - 2.0 * V_total) / (T2 * T)
+        c5 = (3.0 * V_total + 2.0 * a0 * T) / (5.0 * (T2 * T2))
+
+        t = dt if dt < T else T
+        v_next = c1 + 2*c2*t + 3*c3*t**2 + 4*c4*t**3 + 5*c5*t**4
+        if v_next != v_next: v_next = v0
+        v_next = max(0.0, v_next)
+
+        
+    return v_next
+
+
+def calculate_longitudinal_batch(
+    v_curr,
+    a_curr,
+    target_speed,
+    dist_to_stop=None,
+    dt=STEP_LENGTH,
+    comfort_accel=ACCEL_COMFORT_VAL,
+    decel_shape_factor=DECEL_SHAPE_FACTOR,
+    leader_gap=None,
+    leader_v=None,
+):
+    """
+    calculate_longitudinal_command 的向量化版本：一次计算一组车辆的下一步速度。
+    输入为等长数组（或可广播的标量）；target_speed == 0 的元素走定点刹停，
+    其余走跟车/巡航。leader_gap / leader_v 中的 NaN 表示该车没有前车。
+    各分支的运算顺序与标量版本保持一致，结果逐元素吻合。
+    """
+    v_curr = np.asarray(v_curr, dtype=float)
+    n = v_curr.shape[0]
+
+    def _col(x, fill):
+        if x is None:
+            return np.full(n, fill)
+        return np.broadcast_to(np.asarray(x, dtype=float), (n,))
+
+    v0 = np.maximum(0.0, v_curr)
+    a0 = _col(a_curr, 0.0)
+    vt_cmd = _col(target_speed, 0.0)
+    S_in = _col(dist_to_stop, 0.0)
+    gap_in = _col(leader_gap, np.nan)
+    lv = _col(leader_v, np.nan)
+
+    v_next = np.empty(n)
+    # t 为标量，幂次在 Python 中计算一次后广播，与标量版本逐位一致
+    t2, t3, t4 = dt ** 2, dt ** 3, dt ** 4
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # ------------------------------------------------------------
+        # 定点刹停模式 (Stop Mode)
+        # ------------------------------------------------------------
+        stop = vt_cmd == 0
+        if stop.any():
+            sv0, sa0 = v0[stop], a0[stop]
+            S = np.maximum(0.0, S_in[stop])
+            eps_v = 1e-4
+            T0 = np.where(sv0 < eps_v,
+                          np.maximum(2.0 * np.sqrt(S), 2.0 * dt),
+                          2.0 * S / sv0)
+            sf = max(0.3, float(decel_shape_factor))
+            T = np.maximum(1.5 * dt, sf * T0)
+
+            c1 = sv0
+            c2 = 0.5 * sa0
+            xT0 = c1 * T + c2 * (T * T)
+            vT0 = c1 + 2.0 * c2 * T
+            aT0 = 2.0 * c2
+            T2 = T * T
+            T3 = T2 * T
+            A = (S - xT0) / T3
+            B = (-vT0) / T3
+            C = (-aT0) / T3
+            invT = 1.0 / T
+            invT2 = invT * invT
+            u5 = 0.5 * (C + 12.0 * A * invT2 - 6.0 * invT * B)
+            u4 = B - 3.0 * A * invT - 2.0 * T * u5
+            u3 = A - T * u4 - T2 * u5
+
+            v = c1 + 2.0 * c2 * dt + 3.0 * u3 * t2 + 4.0 * u4 * t3 + 5.0 * u5 * t4
+            v = np.where(np.isnan(v), 0.0, v)
+            v = np.maximum(0.0, v)
+            v = np.minimum(v, sv0 + np.maximum(0.0, 0.5 * np.abs(sa0)) * dt)
+            # 剩余距离可忽略或规划时长不足一步：直接停车
+            v = np.where((S <= 1e-6) | (np.minimum(dt, T) >= T - 1e-9), 0.0, v)
+            v_next[stop] = v
+
+        # ------------------------------------------------------------
+        # 跟车/巡航模式 (Follow Mode)
+        # ------------------------------------------------------------
+        follow = ~stop
+        if follow.any():
+            fv0, fa0, fvt = v0[follow], a0[follow], vt_cmd[follow]
+            gap, flv = gap_in[follow], lv[follow]
+            has_leader = ~(np.isnan(gap) | np.isnan(flv))
+            # 与前车速度相差小于 0.5m/s：直接取前车速度
+            match_leader = has_leader & (np.abs(flv - fv0) < 0.5)
+
+            desired_gap = SAFE_GAP_BASE + fv0 * TIME_HEADWAY
+            current_gap = np.maximum(0.0, gap)
+            gap_error = current_gap - desired_gap
+            v_follow = flv + FOLLOW_GAIN * gap_error
+            v_follow = np.maximum(0.0, np.minimum(v_follow, fvt))
+            actual_gap_for_safety = np.maximum(0.0, current_gap - SAFE_GAP_BASE)
+            v_soft = np.sqrt(flv * flv + 2.0 * LIMIT_DECEL_COMFORT * actual_gap_for_safety)
+            v_hard = np.sqrt(flv * flv + 2.0 * LIMIT_DECEL_EMERGENCY * actual_gap_for_safety)
+            vt_final = np.where(has_leader,
+                                np.minimum(np.minimum(v_follow, v_soft), v_hard), fvt)
+
+            # --- Quintic 速度规划 ---
+            dv = vt_final - fv0
+            a_nom = max(comfort_accel, 0.5)
+            T_base = np.where(dv < -1.0, np.abs(dv) / (a_nom * 0.8), np.abs(dv) / a_nom)
+            T = np.maximum(max(1.0, 50 * dt), T_base)
+
+            c1, c2 = fv0, 0.5 * fa0
+            V_total = vt_final - fv0 - fa0 * T
+            T2 = T * T
+            c3 = (2.0 * V_total + fa0 * T) / T2
+            c4 = (-(5.0 / 4.0) * fa0 * T - 2.0 * V_total) / (T2 * T)
+            c5 = (3.0 * V_total + 2.0 * fa0 * T) / (5.0 * (T2 * T2))
+
+            # T >= 50*dt > dt，因此 t 恒为 dt
+            v = c1 + 2 * c2 * dt + 3 * c3 * t2 + 4 * c4 * t3 + 5 * c5 * t4
+            v = np.where(np.isnan(v), fv0, v)
+            v = np.maximum(0.0, v)
+            v_next[follow] = np.where(match_leader, flv, v)
+
+    return v_next
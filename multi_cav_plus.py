@@ -1,25 +1,667 @@
+import argparse
+import itertools
+import json
+import math
 import os
+import random
 import subprocess
+import sys
 import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+import run_cache
+from job_queue import JobQueue, LEASE_S
+from event_log import PROFILES
+from replication_stats import ReplicationStats
 
-def run_task(signal, traj, scale,gui):
-    signal_flag = "--no-signal" if not signal else ""
-    traj_flag = "--no-traj" if not traj else ""
-    gui_flag = "--no-gui" if not gui else ""
-    command = f"C:/ProgramData/anaconda3/envs/ENV2026/python.exe cav_plus.py {signal_flag} {traj_flag} --scale {scale} {gui_flag}"
-    print(f"Running: {command}")
-    subprocess.run(command, shell=True)
-
-# 批量用命令行运行，8个并行
-# tasks = [(signal, traj, scale,False) for signal in [True, False] for traj in [True, False] for scale in [1.0, 1.2]]
-tasks = [(signal,traj,88/52,False) for signal in [True, False] for traj in [True, False]]
-threads = []
-
-for task in tasks:
-# if True:
-    t = threading.Thread(target=run_task, args=task)
-    threads.append(t)
-    t.start()
-
-for t in threads:
-    t.join()
+# 批量运行 cav_plus.py：展开参数网格（信号优先 × 轨迹控制 × 流量 × 随机种子），
+# 同时运行的仿真数不超过 CPU 核数，每个任务独立的 TraCI 端口 / 标签 / 输出目录，
+# 汇总退出码、耗时与 steps/s 到 sweep_results.json。
+# 输出目录按输入内容哈希命名（run_cache.py），输入未变且结果完整的任务直接跳过。
+# --warmup T：每个（流量, 种子）只运行一次 T 秒无控制预热并保存状态，各控制方案从该状态分叉。
+# --search FILE：控制参数搜索（逐轮减半），候选参数先在短时长上评估，只保留最优的 1/eta 进入更长时长。
+# --replicate：每个配置按种子并行重复（SUMO 种子与需求种子相同），置信区间足够窄时停止追加
+# --queue DIR：任务不在本机运行，而是发布到共享目录队列（job_queue.py），
+#              由各主机上的 --worker DIR 进程认领运行，结果写回各任务的输出目录
+
+SWEEP_FOLDER = "output/sweep"
+BASE_PORT = 9000
+DEFAULT_SCALES = [88 / 52]
+SUMO_CONFIGS = {False: "crossroad_simulation.sumocfg", True: "corridor_simulation.sumocfg"}
+DETECTOR_FILES = {False: "test/pressure_detectors.add.xml",
+                  True: "test/corridor/pressure_detectors.add.xml"}
+ON_OFF = {"on": True, "off": False}
+# 参数搜索默认设置
+SEARCH_HORIZONS = [600, 1200, 3600]
+SEARCH_FOLDER = "output/search"
+# 重复实验默认设置
+REPLICATE_FOLDER = "output/replicate"
+CI_METRICS = ["CAV.avg_delay_s", "HV_same.avg_delay_s", "HV.avg_delay_s"]
+DEMAND_SCRIPT = "generate/demand.py"
+# 队列工作进程：无可认领任务时的轮询间隔（秒）
+POLL_S = 5.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="cav_plus.py 参数网格批量运行")
+    parser.add_argument("--signal", nargs="+", choices=list(ON_OFF), default=["on", "off"],
+                        help="信号优先取值（默认 on off）")
+    parser.add_argument("--traj", nargs="+", choices=list(ON_OFF), default=["on", "off"],
+                        help="轨迹控制取值（默认 on off）")
+    parser.add_argument("--scales", nargs="+", type=float, default=DEFAULT_SCALES,
+                        help="交通流量缩放比例（默认 88/52）")
+    parser.add_argument("--seeds", nargs="+", type=int, default=None,
+                        help="SUMO 随机种子（默认不指定，使用 sumocfg 中的设置）")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="同时运行的仿真数（默认 CPU 核数）")
+    parser.add_argument("--backend", default="libsumo", help="SUMO 驱动后端（默认 libsumo）")
+    parser.add_argument("--profile", choices=PROFILES, default="perf",
+                        help="cav_plus.py 运行模式（默认 perf：控制事件写入 events.jsonl，不输出到日志）")
+    parser.add_argument("--corridor", action="store_true", help="运行多路口干道场景")
+    parser.add_argument("--warmup", type=float, default=None,
+                        help="共享预热时长（秒），默认不预热、每个任务从 0 开始")
+    parser.add_argument("--base-port", type=int, default=BASE_PORT,
+                        help="TraCI 端口起始值，第 i 个任务使用 base-port + i")
+    parser.add_argument("--folder", default=SWEEP_FOLDER, help="批量输出根目录")
+    parser.add_argument("--force", action="store_true", help="忽略结果缓存，全部重新运行")
+    parser.add_argument("--dry-run", action="store_true", help="只打印命令，不运行")
+    # 参数搜索（逐轮减半）：信号优先与轨迹控制均启用，每个候选在全部（流量, 种子）上取平均
+    parser.add_argument("--search", default=None, metavar="FILE",
+                        help="参数搜索空间 JSON（如 search_space.json），给出时进入搜索模式")
+    parser.add_argument("--candidates", type=int, default=27, help="初始候选参数组数（默认 27）")
+    parser.add_argument("--horizons", nargs="+", type=float, default=SEARCH_HORIZONS,
+                        help="各轮评估时长（秒，默认 600 1200 3600）")
+    parser.add_argument("--eta", type=float, default=3.0, help="每轮保留前 1/eta（默认 3）")
+    parser.add_argument("--objective", default="avg_delay_s",
+                        help="目标指标（SumoAnalyzer 的 Metrics 字段，按样本量加权，越小越好）")
+    parser.add_argument("--search-seed", type=int, default=0, help="候选参数采样的随机种子")
+    # 重复实验：第 i 次重复使用种子 seeds[0] + i（默认从 1 开始），SUMO 与需求生成同一种子
+    parser.add_argument("--replicate", action="store_true", help="重复实验模式")
+    parser.add_argument("--min-reps", type=int, default=3, help="每个配置最少重复次数（默认 3）")
+    parser.add_argument("--max-reps", type=int, default=30, help="每个配置最多重复次数（默认 30）")
+    parser.add_argument("--ci-metrics", nargs="+", default=CI_METRICS,
+                        help="参与收敛判断的指标（类别.指标，默认三类车辆的 avg_delay_s）")
+    parser.add_argument("--ci-target", type=float, default=0.05,
+                        help="95%% 置信区间半宽目标（默认为均值的 5%%）")
+    parser.add_argument("--ci-absolute", action="store_true",
+                        help="--ci-target 按指标的绝对单位理解")
+    # 共享目录队列：发布端与工作进程需在同一仓库目录下启动（输出目录为相对路径）
+    parser.add_argument("--queue", default=None, metavar="DIR",
+                        help="把待运行任务发布到共享目录队列，由 --worker 进程运行")
+    parser.add_argument("--worker", default=None, metavar="DIR",
+                        help="作为工作进程从共享目录队列认领任务（--jobs 个并行）")
+    parser.add_argument("--lease", type=float, default=LEASE_S,
+                        help="任务租约时长（秒，默认 600），超时未续租的任务重新入队")
+    parser.add_argument("--wait", action="store_true",
+                        help="工作进程在队列为空时继续等待新任务（默认队列清空后退出）")
+    # 其余参数原样传给 cav_plus.py（如 --signal-period 0.5 --pressure-source detectors）
+    return parser.parse_known_args()
+
+
+def expand_grid(signals, trajs, scales, seeds):
+    """参数网格 -> 任务列表（每个任务一个 dict）"""
+    jobs = []
+    for signal, traj, scale, seed in itertools.product(signals, trajs, scales, seeds or [None]):
+        name = f"{signal}_{traj}_{scale:g}"
+        if seed is not None:
+            name += f"_s{seed}"
+        jobs.append({"name": name, "signal": signal, "traj": traj, "scale": scale, "seed": seed,
+                     "outputs": run_cache.RESULT_FILES})
+    return jobs
+
+
+def warmup_jobs(jobs, seconds):
+    """每个（流量, 种子）一个预热任务，返回 {(流量, 种子): 预热任务}"""
+    warmups = {}
+    for job in jobs:
+        group = (job["scale"], job["seed"])
+        if group not in warmups:
+            name = f"warmup_{job['scale']:g}"
+            if job["seed"] is not None:
+                name += f"_s{job['seed']}"
+            warmups[group] = {"name": name, "warmup": seconds, "scale": job["scale"],
+                              "seed": job["seed"], "outputs": (run_cache.STATE_FILE,)}
+    return warmups
+
+
+def input_files(args, extra):
+    """影响结果的输入文件：控制器 / 分析代码、generate/config.json、sumocfg 及其引用文件"""
+    sumocfg = SUMO_CONFIGS[args.corridor]
+    files = run_cache.local_modules() + [run_cache.GENERATE_CONFIG, sumocfg]
+    files += run_cache.sumocfg_inputs(sumocfg)
+    if "detectors" in extra:
+        files.append(DETECTOR_FILES[args.corridor])
+    return files
+
+
+def job_key(job, args, extra, files, warmup=None):
+    """
+    任务的内容键：网格参数、附加命令行参数、输入文件内容，以及所用预热状态的键。
+    驱动后端、端口与标签不影响结果，不计入。
+    """
+    params = {k: job[k] for k in ("signal", "traj", "warmup", "scale", "seed", "demand_seed",
+                                  "params", "end") if k in job}
+    params.update(corridor=args.corridor, extra=extra)
+    if warmup is not None:
+        params["warmup_key"] = warmup["key"]
+    return run_cache.run_key(params, files)
+
+
+def build_command(job, index, args, extra, warmup=None):
+    if "warmup" in job:
+        folder = os.path.join(args.folder, "warmup", f"{job['name']}-{job['key'][:12]}")
+    else:
+        folder = os.path.join(args.folder, f"{job['name']}-{job['key'][:12]}")
+    cmd = [sys.executable, "cav_plus.py", "--no-gui", "--scale", str(job["scale"]),
+           "--backend", args.backend, "--profile", args.profile, "--output", folder,
+           "--port", str(args.base_port + index), "--label", job["name"]]
+    if "warmup" in job:
+        cmd.extend(["--warmup", str(job["warmup"]),
+                    "--save-state", os.path.join(folder, run_cache.STATE_FILE)])
+    else:
+        if not ON_OFF[job["signal"]]:
+            cmd.append("--no-signal")
+        if not ON_OFF[job["traj"]]:
+            cmd.append("--no-traj")
+    if warmup is not None:
+        cmd.extend(["--load-state", os.path.join(warmup["folder"], run_cache.STATE_FILE)])
+    for name, value in job.get("params", {}).items():
+        cmd.extend(["--param", f"{name}={value}"])
+    if job.get("end") is not None:
+        cmd.extend(["--end", str(job["end"])])
+    if job.get("route_files"):
+        cmd.extend(["--route-files", job["route_files"]])
+    if job["seed"] is not None:
+        cmd.extend(["--seed", str(job["seed"])])
+    if args.corridor:
+        cmd.append("--corridor")
+    return cmd + extra, folder
+
+
+def run_process(cmd, log, heartbeat=None, interval=POLL_S):
+    """
+    运行子进程，返回退出码。给出 heartbeat 时每 interval 秒调用一次（队列续租），
+    返回 False（租约已丢失，任务已交给其他工作进程）时终止子进程并返回 None。
+    """
+    proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+    while True:
+        try:
+            return proc.wait(timeout=interval)
+        except subprocess.TimeoutExpired:
+            if heartbeat is not None and not heartbeat():
+                proc.kill()
+                proc.wait()
+                return None
+
+
+def run_job(job, cmd, folder, manifest, heartbeat=None, interval=POLL_S):
+    """运行单个仿真子进程并分析结果，标准输出写入任务目录的 log.txt"""
+    os.makedirs(folder, exist_ok=True)
+    run_cache.clear_key(folder)
+    t0 = time.perf_counter()
+    with open(os.path.join(folder, "log.txt"), "w", encoding="utf-8") as log:
+        code = run_process(cmd, log, heartbeat, interval)
+        if code == 0 and "analysis_result.json" in job["outputs"]:
+            # 生成 analysis_result.json（结果完整的标志之一）
+            code = run_process([sys.executable, "analyze_results_cav_plus.py", folder], log,
+                               heartbeat, interval)
+    if code == 0 and run_cache.outputs_complete(folder, job["outputs"]):
+        run_cache.save_key(folder, job["key"], manifest)
+    result = dict(job, exit_code=code, wall_s=round(time.perf_counter() - t0, 2),
+                  steps=None, steps_per_s=None, folder=folder, cached=False)
+    return read_run_info(result, folder)
+
+
+def read_run_info(result, folder):
+    """合并 cav_plus.py 结束时写出的运行摘要（步数 / steps/s / 仿真时长）"""
+    info_file = os.path.join(folder, "run_info.json")
+    if os.path.exists(info_file):
+        try:
+            with open(info_file, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            result["steps"] = info.get("steps")
+            result["steps_per_s"] = info.get("steps_per_s")
+            result["sim_time"] = info.get("sim_time")
+        except (OSError, ValueError):
+            pass
+    return result
+
+
+def schedule(tasks, args, label):
+    """
+    tasks: [(任务, 命令, 输出目录, manifest)]。键相同且输出完整的任务直接复用，
+    其余任务在有界线程池中运行（每个任务是独立的 Python + SUMO 子进程，线程只负责等待）。
+    """
+    results, pending = [], []
+    for job, cmd, folder, manifest in tasks:
+        job["folder"] = folder
+        if not args.force and run_cache.is_complete(folder, job["key"], job["outputs"]):
+            results.append(read_run_info(dict(job, exit_code=0, wall_s=0.0, steps=None,
+                                              steps_per_s=None, cached=True), folder))
+        else:
+            pending.append((job, cmd, folder, manifest))
+    workers = max(1, min(args.jobs, len(pending)))
+    print(f"[sweep] {label}: {len(tasks)} 个任务, 已有结果 {len(results)} 个, "
+          f"待运行 {len(pending)} 个, 并行 {workers} 个")
+    if args.dry_run:
+        for _, cmd, _, _ in pending:
+            print(" ".join(cmd))
+        return results, workers
+    if args.queue:
+        publish(pending, args, label)
+        return results, 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, *task) for task in pending]
+        for future in as_completed(futures):
+            r = future.result()
+            results.append(r)
+            status = "OK" if r["exit_code"] == 0 else f"失败({r['exit_code']})"
+            rate = f"{r['steps_per_s']:.1f} steps/s" if r["steps_per_s"] else "-"
+            print(f"[sweep] {len(results)}/{len(tasks)} {r['name']}: {status}, "
+                  f"{r['wall_s']:.1f}s, {rate}")
+    results.sort(key=lambda r: r["name"])
+    return results, workers
+
+
+# ---------------- 共享目录队列 ----------------
+def queue_id(folder):
+    """队列中的任务 ID：输出目录名（任务名 + 内容键前缀）"""
+    return os.path.basename(os.path.normpath(folder))
+
+
+def publish(pending, args, label):
+    """把待运行任务发布到队列；命令不含解释器路径，由工作进程用自己的 Python 运行"""
+    queue = JobQueue(args.queue, lease=args.lease)
+    published = 0
+    for job, cmd, folder, manifest in pending:
+        spec = {"job": job, "cmd": cmd[1:], "folder": folder, "manifest": manifest,
+                "after": job.get("after", [])}
+        published += queue.publish(queue_id(folder), spec)
+    print(f"[queue] {label}: 发布 {published} 个, 已在队列中 {len(pending) - published} 个 "
+          f"-> {args.queue}")
+
+
+def work(args):
+    """
+    队列工作进程：--jobs 个线程各自循环「回收过期租约 -> 认领 -> 运行 -> 写回结果」，
+    运行期间每 lease/4 秒续租一次。依赖（预热）未完成的任务暂不认领，依赖失败（或不在队列中）的任务直接记为失败。
+    默认在队列中没有排队与运行中的任务后退出，--wait 时持续等待。
+    """
+    queue = JobQueue(args.worker, lease=args.lease)
+    interval = min(POLL_S, args.lease / 4)
+    counts = {"done": 0, "failed": 0, "lost": 0}
+    lock = threading.Lock()
+
+    def ready(spec):
+        return all(queue.state(dep) not in ("pending", "running") for dep in spec["after"])
+
+    def loop():
+        while True:
+            queue.reap()
+            claimed = queue.claim(ready)
+            if claimed is None:
+                c = queue.counts()
+                if not args.wait and c["pending"] == 0 and c["running"] == 0:
+                    return
+                time.sleep(POLL_S)
+                continue
+            job_id, spec = claimed
+            # 只有已完成（done/ 中且 exit_code 为 0）的依赖算成功；失败、结果缺失或队列中不存在的依赖都算失败
+            failed_deps = [dep for dep in spec["after"]
+                           if queue.state(dep) != "done" or (queue.result(dep) or {}).get("exit_code") != 0]
+            if failed_deps:
+                r = dict(spec["job"], exit_code=-1, error=f"依赖失败: {','.join(failed_deps)}",
+                         folder=spec["folder"], cached=False)
+            else:
+                r = run_job(spec["job"], [sys.executable] + spec["cmd"], spec["folder"],
+                            spec["manifest"], lambda: queue.heartbeat(job_id), interval)
+            if r["exit_code"] is None or not queue.complete(job_id, r, r["exit_code"] != 0):
+                # 租约过期，任务已重新入队（由其他工作进程重跑）
+                status = "租约丢失"
+                key = "lost"
+            else:
+                status = "OK" if r["exit_code"] == 0 else f"失败({r['exit_code']})"
+                key = "done" if r["exit_code"] == 0 else "failed"
+            with lock:
+                counts[key] += 1
+            print(f"[worker] {job_id}: {status}, {r.get('wall_s', 0.0):.1f}s")
+
+    print(f"[worker] {queue.worker}: 队列 {args.worker}, 并行 {args.jobs} 个, "
+          f"租约 {args.lease:g}s")
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(max(1, args.jobs))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"[worker] 完成 {counts['done']} 个, 失败 {counts['failed']} 个, "
+          f"租约丢失 {counts['lost']} 个, 队列状态 {queue.counts()}")
+    return 1 if counts["failed"] else 0
+
+
+def run_warmups(jobs, args, extra, files, port_offset):
+    """共享预热：每个（流量, 种子）一次，返回 ({(流量, 种子): 预热任务}, 结果列表)"""
+    warmups = warmup_jobs(jobs, args.warmup)
+    tasks = []
+    for i, warmup in enumerate(warmups.values()):
+        warmup["key"], manifest = job_key(warmup, args, extra, files)
+        cmd, folder = build_command(warmup, port_offset + i, args, extra)
+        tasks.append((warmup, cmd, folder, manifest))
+    results, _ = schedule(tasks, args, "预热")
+    return warmups, results
+
+
+def run_jobs(jobs, args, extra, files, warmups, label):
+    """运行一组任务（有预热时从对应预热状态分叉），返回 (结果列表, 并行数)"""
+    tasks, failed = [], []
+    for i, job in enumerate(jobs):
+        warmup = warmups.get((job["scale"], job["seed"]))
+        if warmup is not None and not run_cache.is_complete(warmup["folder"], warmup["key"],
+                                                            warmup["outputs"]):
+            if args.queue:
+                # 预热同样在队列中：工作进程在预热完成后才认领该任务
+                job["after"] = [queue_id(warmup["folder"])]
+            else:
+                failed.append(dict(job, exit_code=-1, error="预热失败", cached=False))
+                continue
+        job["key"], manifest = job_key(job, args, extra, files, warmup)
+        cmd, folder = build_command(job, i, args, extra, warmup)
+        tasks.append((job, cmd, folder, manifest))
+    results, workers = schedule(tasks, args, label)
+    return sorted(results + failed, key=lambda r: r["name"]), workers
+
+
+def main():
+    args, extra = parse_args()
+    if args.worker:
+        return work(args)
+    if args.queue and (args.search or args.replicate):
+        # 搜索与重复实验需根据已完成的结果决定后续任务，只支持在本机调度
+        print("[queue] --queue 只支持参数网格批量运行，不能与 --search / --replicate 同时使用")
+        return 2
+    files = input_files(args, extra)
+    if args.search:
+        return search(args, extra, files)
+    if args.replicate:
+        if args.warmup:
+            print("[replicate] 重复实验的需求随种子变化，不能共享预热状态，忽略 --warmup")
+        return replicate(args, extra, files + [DEMAND_SCRIPT])
+    jobs = expand_grid(args.signal, args.traj, args.scales, args.seeds)
+    t0 = time.perf_counter()
+
+    # 1. 共享预热：每个（流量, 种子）一次
+    warmups, warmup_results = {}, []
+    if args.warmup:
+        warmups, warmup_results = run_warmups(jobs, args, extra, files, len(jobs))
+        if args.dry_run:
+            print("[sweep] 预热完成后各方案加载对应的 state.xml")
+            return 0
+
+    # 2. 各控制方案（有预热时从预热状态分叉）
+    results, workers = run_jobs(jobs, args, extra, files, warmups, "控制方案")
+    if args.dry_run:
+        return 0
+    if args.queue:
+        print(f"[queue] 在共享目录下启动 python multi_cav_plus.py --worker {args.queue}，"
+              f"全部完成后去掉 --queue 重新运行本命令即可汇总 sweep_results.json")
+        return 0
+
+    summary = {"jobs": len(jobs), "workers": workers, "warmup": args.warmup,
+               "cached": sum(r["cached"] for r in results),
+               "failed": sum(r["exit_code"] != 0 for r in results),
+               "wall_s": round(time.perf_counter() - t0, 2),
+               "warmups": warmup_results, "results": results}
+    os.makedirs(args.folder, exist_ok=True)
+    out_file = os.path.join(args.folder, "sweep_results.json")
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4, ensure_ascii=False)
+    print(f"[sweep] 完成, 失败 {summary['failed']} 个, 总耗时 {summary['wall_s']:.1f}s, "
+          f"结果已保存到 {out_file}")
+    return 1 if summary["failed"] else 0
+
+
+# ---------------- 参数搜索（逐轮减半） ----------------
+def sample_candidates(space, n, seed):
+    """
+    从搜索空间采样 n 组候选参数：[下限, 上限] 为均匀采样（两端均为整数时取整数），
+    列表长度不为 2 或 {"choices": [...]} 为离散取值。
+    """
+    rng = random.Random(seed)
+    candidates = []
+    for _ in range(n):
+        params = {}
+        for name, spec in space.items():
+            if isinstance(spec, dict):
+                params[name] = rng.choice(spec["choices"])
+            elif len(spec) == 2 and all(isinstance(v, int) for v in spec):
+                params[name] = rng.randint(spec[0], spec[1])
+            elif len(spec) == 2:
+                params[name] = round(rng.uniform(spec[0], spec[1]), 3)
+            else:
+                params[name] = rng.choice(spec)
+        candidates.append(params)
+    return candidates
+
+
+def objective(folder, metric):
+    """analysis_result.json 中各车辆类别的 metric 按样本量加权平均；无样本或缺失时为 inf"""
+    try:
+        with open(os.path.join(folder, "analysis_result.json"), "r", encoding="utf-8") as f:
+            metrics = json.load(f)["Metrics"]
+    except (OSError, ValueError, KeyError):
+        return math.inf
+    total = sum(m["sample_size"] for m in metrics.values())
+    if total == 0:
+        return math.inf
+    return sum(m[metric] * m["sample_size"] for m in metrics.values()) / total
+
+
+def search(args, extra, files):
+    """
+    逐轮减半（successive halving）：
+    1. 第 1 轮所有候选在最短时长上评估（各任务并行），按目标值排序保留前 1/eta
+    2. 保留的候选进入下一轮更长的时长，直到最后一轮
+    每个评估任务仍按内容键缓存，中断后重跑只运行未完成的任务；有 --warmup 时所有候选共享预热状态。
+    """
+    with open(args.search, "r", encoding="utf-8") as f:
+        space = json.load(f)
+    candidates = sample_candidates(space, args.candidates, args.search_seed)
+    groups = list(itertools.product(args.scales, args.seeds or [None]))
+    folder = args.folder if args.folder != SWEEP_FOLDER else SEARCH_FOLDER
+    args.folder = folder
+    t0 = time.perf_counter()
+
+    base_jobs = [{"scale": scale, "seed": seed} for scale, seed in groups]
+    warmups = {}
+    if args.warmup:
+        warmups, _ = run_warmups(base_jobs, args, extra, files, 0)
+    offset = args.warmup or 0.0
+
+    alive = list(range(len(candidates)))
+    rungs = []
+    for rung, horizon in enumerate(args.horizons):
+        jobs = []
+        for c in alive:
+            for scale, seed in groups:
+                name = f"c{c:03d}_h{horizon:g}_{scale:g}"
+                if seed is not None:
+                    name += f"_s{seed}"
+                jobs.append({"name": name, "candidate": c, "signal": "on", "traj": "on",
+                             "scale": scale, "seed": seed, "params": candidates[c],
+                             "end": offset + horizon, "outputs": run_cache.RESULT_FILES})
+        results, _ = run_jobs(jobs, args, extra, files, warmups,
+                              f"第 {rung + 1} 轮 ({horizon:g}s, {len(alive)} 组候选)")
+        if args.dry_run:
+            return 0
+
+        scores = {c: [] for c in alive}
+        for r in results:
+            value = objective(r["folder"], args.objective) if r["exit_code"] == 0 else math.inf
+            scores[r["candidate"]].append(value)
+        ranking = sorted(alive, key=lambda c: sum(scores[c]) / len(scores[c]))
+        rungs.append({"horizon": horizon, "ranking": [
+            {"candidate": c, "params": candidates[c],
+             "score": sum(scores[c]) / len(scores[c])} for c in ranking]})
+        best = rungs[-1]["ranking"][0]
+        print(f"[search] 第 {rung + 1} 轮最优: c{best['candidate']:03d} "
+              f"{args.objective}={best['score']:.3f} {best['params']}")
+        if rung + 1 < len(args.horizons):
+            alive = ranking[:max(1, math.ceil(len(ranking) / args.eta))]
+
+    best = rungs[-1]["ranking"][0]
+    summary = {"objective": args.objective, "space": space, "candidates": len(candidates),
+               "eta": args.eta, "groups": groups, "wall_s": round(time.perf_counter() - t0, 2),
+               "best": best, "rungs": rungs}
+    os.makedirs(folder, exist_ok=True)
+    out_file = os.path.join(folder, "search_results.json")
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4, ensure_ascii=False)
+    print(f"[search] 完成, 总耗时 {summary['wall_s']:.1f}s, 最优参数 {best['params']}, "
+          f"结果已保存到 {out_file}")
+    return 0 if math.isfinite(best["score"]) else 1
+
+
+# ---------------- 重复实验（置信区间自适应） ----------------
+_demand_lock = threading.Lock()
+
+
+def demand_file_path(seed, args):
+    """按种子生成的需求文件路径，文件名含需求配置与脚本的内容键（配置变化后自动重新生成）"""
+    key, _ = run_cache.run_key({"demand_seed": seed, "corridor": args.corridor},
+                               [run_cache.GENERATE_CONFIG, DEMAND_SCRIPT])
+    prefix = "corridor" if args.corridor else "crossroad"
+    return os.path.join(args.folder, "demand", f"{prefix}_s{seed}-{key[:12]}.rou.xml")
+
+
+def ensure_demand(path, seed, args):
+    """generate/demand.py --seed 生成需求文件；并行任务共用同一种子时只生成一次"""
+    with _demand_lock:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp"
+            cmd = [sys.executable, DEMAND_SCRIPT, "--seed", str(seed), "--route-file", tmp]
+            if args.corridor:
+                cmd.append("--corridor")
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+            os.replace(tmp, path)
+
+
+def run_replication(job, cmd, folder, manifest, args):
+    try:
+        ensure_demand(job["route_files"], job["demand_seed"], args)
+    except (subprocess.CalledProcessError, OSError) as e:
+        return dict(job, exit_code=-1, error=f"需求生成失败: {e}", folder=folder, cached=False)
+    return run_job(job, cmd, folder, manifest)
+
+
+def load_metrics(folder):
+    with open(os.path.join(folder, "analysis_result.json"), "r", encoding="utf-8") as f:
+        return json.load(f)["Metrics"]
+
+
+def replicate(args, extra, files):
+    """
+    每个配置（信号优先 × 轨迹控制 × 流量）按种子重复运行，各重复在有界线程池中并行。
+    每完成一次重复即在线更新各指标的均值 / 方差 / 95% 置信区间；配置达到最少重复次数且
+    跟踪指标的置信区间半宽均低于目标后不再追加重复（已在运行的重复照常完成）。
+    """
+    if args.folder == SWEEP_FOLDER:
+        args.folder = REPLICATE_FOLDER
+    tracked = [tuple(m.split(".", 1)) for m in args.ci_metrics]
+    base_seed = args.seeds[0] if args.seeds else 1
+    configs = expand_grid(args.signal, args.traj, args.scales, None)
+    state = {c["name"]: {"config": c, "stats": ReplicationStats(tracked), "launched": 0,
+                         "running": 0, "failed": 0, "runs": []} for c in configs}
+    # 未收敛时每个配置同时运行的重复数上限（均分并行度，避免单个配置超额追加）
+    share = max(1, args.jobs // len(configs))
+    t0 = time.perf_counter()
+
+    def converged(st):
+        return (st["stats"].n >= args.min_reps
+                and st["stats"].converged(args.ci_target, not args.ci_absolute))
+
+    def wants(st):
+        if st["launched"] >= args.max_reps or converged(st):
+            return False
+        return st["launched"] < args.min_reps or st["running"] < share
+
+    def finish(st, r):
+        st["runs"].append(r)
+        if r["exit_code"] != 0:
+            st["failed"] += 1
+            print(f"[replicate] {r['name']}: 失败({r['exit_code']})")
+            return
+        st["stats"].add(load_metrics(r["folder"]))
+        parts = []
+        for cat, name in tracked:
+            stat = st["stats"].stats.get((cat, name))
+            if stat is not None:
+                parts.append(f"{cat}.{name}={stat.mean:.3f}±{stat.half_width():.3f}")
+        tag = "已收敛" if converged(st) else ""
+        print(f"[replicate] {r['name']}{' (缓存)' if r['cached'] else ''}: "
+              f"n={st['stats'].n} {' '.join(parts)} {tag}")
+
+    executor = ThreadPoolExecutor(max_workers=max(1, args.jobs))
+    futures = {}
+    index = 0
+    while True:
+        # 填满空闲的并行槽位：优先给已启动重复最少的配置
+        while len(futures) < args.jobs:
+            candidates = [st for st in state.values() if wants(st)]
+            if not candidates:
+                break
+            st = min(candidates, key=lambda st: st["launched"])
+            seed = base_seed + st["launched"]
+            st["launched"] += 1
+            c = st["config"]
+            job = dict(c, name=f"{c['name']}_s{seed}", seed=seed, demand_seed=seed,
+                       outputs=run_cache.RESULT_FILES)
+            job["key"], manifest = job_key(job, args, extra, files)
+            job["route_files"] = demand_file_path(seed, args)
+            cmd, folder = build_command(job, index, args, extra)
+            index += 1
+            if args.dry_run:
+                print(" ".join(cmd))
+                continue
+            if not args.force and run_cache.is_complete(folder, job["key"]):
+                finish(st, read_run_info(dict(job, exit_code=0, wall_s=0.0, steps=None,
+                                              steps_per_s=None, folder=folder, cached=True),
+                                         folder))
+                continue
+            st["running"] += 1
+            futures[executor.submit(run_replication, job, cmd, folder, manifest, args)] = st
+        if not futures:
+            break
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            st = futures.pop(future)
+            st["running"] -= 1
+            finish(st, future.result())
+    executor.shutdown()
+    if args.dry_run:
+        return 0
+
+    summary = {"ci_target": args.ci_target, "ci_absolute": args.ci_absolute,
+               "ci_metrics": args.ci_metrics, "min_reps": args.min_reps,
+               "max_reps": args.max_reps, "wall_s": round(time.perf_counter() - t0, 2),
+               "configs": {}}
+    for name, st in state.items():
+        summary["configs"][name] = {
+            "replications": st["stats"].n, "failed": st["failed"],
+            "converged": converged(st),
+            "seeds": sorted(r["seed"] for r in st["runs"] if r["exit_code"] == 0),
+            "metrics": st["stats"].summary(),
+        }
+    os.makedirs(args.folder, exist_ok=True)
+    out_file = os.path.join(args.folder, "replication_results.json")
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4, ensure_ascii=False)
+    for name, c in summary["configs"].items():
+        print(f"[replicate] {name}: {c['replications']} 次重复, "
+              f"{'已收敛' if c['converged'] else '未收敛'}, 失败 {c['failed']} 次")
+    print(f"[replicate] 完成, 总耗时 {summary['wall_s']:.1f}s, 结果已保存到 {out_file}")
+    return 0 if all(c["failed"] == 0 for c in summary["configs"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+
+NET_FILE = "test/crossroad.net.xml"
+CACHE_DIR = "output/cache"
+CACHE_VERSION = 1
+
+
+def file_hash(path):
+    """路网文件内容哈希（缓存键）"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class NetworkTopology:
+    """
+    路网静态拓扑索引：车道长度、车道->道路、允许车型、内部车道链、信号灯 link 索引。
+    由 sumolib 从 .net.xml 构建一次，并按路网文件哈希缓存为 JSON，
+    控制器、分析与绘图脚本共享，静态查询均为本地字典访问，不走 TraCI。
+    """
+
+    def __init__(self, data):
+        self.net_file = data["net_file"]
+        self.net_hash = data["net_hash"]
+        self.junction_pos = {j: tuple(xy) for j, xy in data["junctions"].items()}
+
+        self.lane_length = {}
+        self.lane_edge = {}
+        self.lane_allowed = {}
+        self.lane_end = {}
+        self.internal_lanes = set()
+        for lane, info in data["lanes"].items():
+            self.lane_length[lane] = info["length"]
+            self.lane_edge[lane] = info["edge"]
+            self.lane_allowed[lane] = tuple(info["allowed"])
+            self.lane_end[lane] = tuple(info["end"])
+            if info["internal"]:
+                self.internal_lanes.add(lane)
+
+        # 车道 -> 出向连接 [(to_lane, via_lane, tls_id, link_index, dir)]
+        self.lane_next = {}
+        # 信号灯 -> link 索引 -> [(from_lane, to_lane, via_lane)]（与 getControlledLinks 格式一致）
+        self.tls_links = {}
+        for frm, to, via, tls, link_index, direction in data["connections"]:
+            self.lane_next.setdefault(frm, []).append((to, via, tls, link_index, direction))
+            if tls and link_index >= 0:
+                links = self.tls_links.setdefault(tls, [])
+                while len(links) <= link_index:
+                    links.append([])
+                links[link_index].append((frm, to, via))
+
+    # ---------------- 构建与缓存 ----------------
+    @classmethod
+    def build(cls, net_file=NET_FILE, net_hash=None):
+        """用 sumolib 解析 .net.xml（仅在缓存缺失或路网变化时调用）"""
+        import sumolib
+
+        net = sumolib.net.readNet(net_file, withInternal=True)
+        data = {
+            "version": CACHE_VERSION,
+            "net_file": net_file,
+            "net_hash": net_hash or file_hash(net_file),
+            "junctions": {n.getID(): list(n.getCoord()) for n in net.getNodes()},
+            "lanes": {},
+            "connections": [],
+        }
+        for edge in net.getEdges(withInternal=True):
+            internal = edge.getFunction() == "internal"
+            for lane in edge.getLanes():
+                data["lanes"][lane.getID()] = {
+                    "edge": edge.getID(),
+                    "length": lane.getLength(),
+                    "allowed": sorted(lane.getPermissions()),
+                    "end": list(lane.getShape()[-1]),
+                    "internal": internal,
+                }
+                for conn in lane.getOutgoing():
+                    data["connections"].append([
+                        lane.getID(), conn.getToLane().getID(), conn.getViaLaneID() or "",
+                        conn.getTLSID() or "", conn.getTLLinkIndex(), conn.getDirection(),
+                    ])
+        return cls(data), data
+
+    @classmethod
+    def load(cls, net_file=NET_FILE, cache_dir=CACHE_DIR):
+        """按路网文件哈希读取缓存；缓存不存在时解析路网并写入缓存"""
+        net_hash = file_hash(net_file)
+        cache_path = os.path.join(cache_dir, f"topology_{net_hash[:16]}.json")
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION and data.get("net_hash") == net_hash:
+                    return cls(data)
+            except (OSError, ValueError, KeyError):
+                pass
+
+        topo, data = cls.build(net_file, net_hash)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Error saving topology cache: {e}")
+        return topo
+
+    # ---------------- 静态查询 ----------------
+    def allows(self, lane, vclass):
+        return vclass in self.lane_allowed[lane]
+
+    def dedicated_lanes(self, vclass, internal=False):
+        """仅允许 vclass 通行的车道（默认不含交叉口内部车道）"""
+        return [lane for lane, allowed in self.lane_allowed.items()
+                if allowed == (vclass,) and (internal or lane not in self.internal_lanes)]
+
+    def lane_chain(self, from_lane, to_lane=None):
+        """
+        从进口车道经内部车道到出口车道的连贯车道链，例如
+        east_in_3 -> [east_in_3, :center_5_2, west_out_3]。
+        to_lane 为空时要求该车道只有一个出向连接。
+        """
+        nexts = self.lane_next.get(from_lane, [])
+        if to_lane is not None:
+            nexts = [n for n in nexts if n[0] == to_lane]
+        if len(nexts) != 1:
+            raise ValueError(f"车道 {from_lane} 到 {to_lane} 的连接不唯一: {nexts}")
+        to_lane, via = nexts[0][0], nexts[0][1]
+        chain = [from_lane]
+        # 内部车道可能再经过内部路口（如左转待转），逐段追踪直到出口车道
+        while via:
+            chain.append(via)
+            via = next((v for t, v, _, _, _ in self.lane_next.get(via, []) if t == to_lane), "")
+        chain.append(to_lane)
+        return chain
+
+    def lane_offsets(self, chain):
+        """车道链上每条车道起点的累计里程 {lane: offset}，路径坐标 = offset[lane] + 车道位置"""
+        offsets, total = {}, 0.0
+        for lane in chain:
+            offsets[lane] = total
+            total += self.lane_length[lane]
+        return offsets
+
+    def cav_paths(self, vclass="taxi", tls_id=None):
+        """
+        由路网连接自动推导编队路径：每条仅允许 vclass 通行、出向连接受信号灯控制的车道，
+        经内部车道到出口车道的车道链，附带累计里程偏移
+        [{"inlet", "lanes", "offsets", "tls"}]。tls_id 给出时只返回该信号灯的路径。
+        """
+        paths = []
+        for inlet in sorted(self.dedicated_lanes(vclass)):
+            nexts = self.lane_next.get(inlet, [])
+            tls_ids = {n[2] for n in nexts if n[2]}
+            if not tls_ids or (tls_id is not None and tls_id not in tls_ids):
+                continue
+            if len(nexts) != 1:
+                # 专用道有多个去向时车道链不唯一，无法作为单条编队路径
+                print(f"[topology] 专用车道 {inlet} 有 {len(nexts)} 个出向连接，跳过")
+                continue
+            chain = self.lane_chain(inlet)
+            paths.append({
+                "inlet": inlet,
+                "lanes": chain,
+                "offsets": self.lane_offsets(chain),
+                "tls": nexts[0][2],
+            })
+        return paths
+
+    def controlled_links(self, tls_id):
+        """与 traci.trafficlight.getControlledLinks 同格式的 link 列表"""
+        return self.tls_links.get(tls_id, [])
+
+    def link_indices(self, tls_id, from_lane):
+        """进口车道在信号灯 state 字符串中对应的 link 索引"""
+        return [to[3] for to in self.lane_next.get(from_lane, [])
+                if to[2] == tls_id and to[3] >= 0]
+
+
+_TOPOLOGY = {}
+
+
+def load_topology(net_file=NET_FILE, cache_dir=CACHE_DIR):
+    """进程内共享的拓扑实例（同一路网只加载一次）"""
+    key = os.path.abspath(net_file)
+    if key not in _TOPOLOGY:
+        _TOPOLOGY[key] = NetworkTopology.load(net_file, cache_dir)
+    return _TOPOLOGY[key]
@@ -0,0 +1,120 @@
+import json
+import traci
+import traci.constants as tc
+from vehicle_snapshot import VEHICLE_VARS
+from analyze_results_cav_plus import CATEGORIES, METRICS_FILE, TARGET_EDGES, vehicle_category
+
+# 在线指标（cav_plus.py --metrics online / both）：仿真过程中由订阅数据直接累计
+# 分析所需的舒适度（|加速度|、|加加速度|）与排队指标，不再需要逐步输出 fcd.xml / queue.xml。
+# 结果写入 online_metrics.json，analyze_results_cav_plus.py 用它代替 fcd.xml / queue.xml 生成 analysis_result.json
+METRICS_MODES = ("files", "online", "both")
+# fcd.xml 中速度保留 2 位小数（SUMO 默认 --precision 2）：按相同精度取整，
+# 加速度 / 加加速度与由 fcd.xml 差分得到的结果一致
+FCD_PRECISION = 2
+# 订阅变量：控制器快照所需变量 + 排队判断用的等待时间（VehicleSnapshot 在共享模式下直接读取）
+METRIC_VARS = VEHICLE_VARS + (tc.VAR_WAITING_TIME,)
+TYPE, LANE_ID, SPEED, LANE_POS, WAITING_TIME = (tc.VAR_TYPE, tc.VAR_LANE_ID, tc.VAR_SPEED,
+                                                tc.VAR_LANEPOSITION, tc.VAR_WAITING_TIME)
+
+
+class OnlineMetrics:
+    """
+    每步累计的分析指标：
+    1. 所有车辆出发时订阅一次 METRIC_VARS，每步通过 getAllSubscriptionResults 取回（控制器快照共用）
+    2. 舒适度：同一车辆相邻两步速度差分得到加速度，相邻两个加速度差分得到加加速度，按 HV / HV_same / CAV 累计
+    3. 排队：与 SUMO queue-output 的 queueing_length 相同，进口道车道上等待中（waiting time > 0）
+       车辆的车尾到车道末端的最大距离；记录各车道的最大值与逐步均值，并按 CAV 专用道 / 其他车道取峰值
+    """
+
+    def __init__(self, registry, topology, conn=traci):
+        self.conn = conn
+        self.registry = registry
+        self.queue_lanes = {lane: length for lane, length in topology.lane_length.items()
+                            if lane.startswith(TARGET_EDGES) and lane not in topology.internal_lanes}
+        self.cav_lanes = {lane for lane in topology.dedicated_lanes('taxi') if lane in self.queue_lanes}
+        self.fcd_stats = {cat: {'sum_abs_accel': 0.0, 'sum_abs_jerk': 0.0, 'count': 0}
+                          for cat in CATEGORIES}
+        self.queue_max = dict.fromkeys(self.queue_lanes, 0.0)
+        self.queue_sum = dict.fromkeys(self.queue_lanes, 0.0)
+        self.steps = 0
+        self.results = {}        # 本步订阅结果（VehicleSnapshot 共享模式直接读取）
+        self._last = {}          # veh_id -> [时间, 速度, 加速度]
+        self._category = {}      # veh_id -> 类别
+        self._length = {}        # veh_id -> 车长（首次排队时查询一次）
+        # 热启动：已在网的车辆
+        for veh_id in registry.classes:
+            conn.vehicle.subscribe(veh_id, METRIC_VARS)
+
+    def update(self):
+        """在 registry.update() 之后每步调用"""
+        conn = self.conn
+        for veh_id in self.registry.departed:
+            conn.vehicle.subscribe(veh_id, METRIC_VARS)
+        now = conn.simulation.getTime()
+        res = self.results = conn.vehicle.getAllSubscriptionResults()
+
+        last = self._last
+        queue = {}
+        queue_lanes = self.queue_lanes
+        for veh_id, r in res.items():
+            lane = r[LANE_ID]
+            if lane in queue_lanes and r[WAITING_TIME] > 0:
+                length = self._length.get(veh_id)
+                if length is None:
+                    length = self._length[veh_id] = conn.vehicle.getLength(veh_id)
+                back = queue_lanes[lane] - r[LANE_POS] + length
+                if back > queue.get(lane, 0.0):
+                    queue[lane] = back
+
+            speed = round(r[SPEED], FCD_PRECISION)
+            prev = last.get(veh_id)
+            if prev is None:
+                last[veh_id] = [now, speed, None]
+                self._category[veh_id] = vehicle_category(veh_id, r[TYPE])
+                continue
+            dt = now - prev[0]
+            if dt <= 0:
+                continue
+            accel = (speed - prev[1]) / dt
+            if prev[2] is not None:
+                stats = self.fcd_stats[self._category[veh_id]]
+                stats['sum_abs_accel'] += abs(accel)
+                stats['sum_abs_jerk'] += abs((accel - prev[2]) / dt)
+                stats['count'] += 1
+            prev[0], prev[1], prev[2] = now, speed, accel
+
+        # 已到达车辆（订阅已被 SUMO 移除）
+        for veh_id in self.registry.arrived:
+            last.pop(veh_id, None)
+            self._category.pop(veh_id, None)
+            self._length.pop(veh_id, None)
+
+        for lane, back in queue.items():
+            self.queue_sum[lane] += back
+            if back > self.queue_max[lane]:
+                self.queue_max[lane] = back
+        self.steps += 1
+
+    def result(self):
+        """
+        与 SumoAnalyzer 的 fcd_stats / 排队峰值对应的汇总（排队长度按 queue.xml 的精度取 2 位小数），
+        另含各车道排队的最大值与均值（米）
+        """
+        cav = [q for lane, q in self.queue_max.items() if lane in self.cav_lanes]
+        hv = [q for lane, q in self.queue_max.items() if lane not in self.cav_lanes]
+        return {
+            'steps': self.steps,
+            'fcd_stats': self.fcd_stats,
+            'max_queue_hv': round(max(hv, default=0.0), 2),
+            'max_queue_cav': round(max(cav, default=0.0), 2),
+            'lanes': {lane: {'max_queue_m': round(self.queue_max[lane], 2),
+                             'mean_queue_m': round(self.queue_sum[lane] / self.steps, 3) if self.steps else 0.0}
+                      for lane in sorted(self.queue_lanes)},
+        }
+
+    def save(self, path):
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.result(), f, indent=4, ensure_ascii=False)
+        except Exception as e:
+            print(f"Error saving online metrics: {e}")
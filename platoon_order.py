@@ -0,0 +1,89 @@
+class PlatoonOrder:
+    """
+    单条编队路径上的持久有序车辆表（按路径坐标降序，头车在前）：
+    1. 车辆进入路径车道（进口道）时加入，离开出口道后移除
+    2. 每步在上一步的顺序上做一次插入排序——专用道内车辆很少互相超越，
+       顺序基本不变时代价接近线性
+    3. 直接给出每辆车的前车 / 后车，控制器无需再按下标推算
+    路径坐标 = 所在车道的累计里程偏移 + 车道位置，由 VehicleSnapshot 的订阅结果本地计算，
+    与车辆出发地点无关，不产生额外 TraCI 调用。
+    """
+
+    def __init__(self, lanes, offsets=None):
+        self.lanes = list(lanes)
+        # 车道 -> 路径起点到该车道起点的累计里程（NetworkTopology.lane_offsets）
+        self.offsets = offsets if offsets is not None else {lane: 0.0 for lane in self.lanes}
+        self.vehicles = []
+        self._pos = {}
+        self._coord = {}
+
+    def update(self, snap):
+        """在 snap.update() 之后调用，刷新本步顺序"""
+        members = []
+        coord = {}
+        for lane in self.lanes:
+            offset = self.offsets[lane]
+            for v in snap.lane_vehicles(lane):
+                members.append(v)
+                coord[v] = offset + snap.state(v).lane_pos
+        member_set = set(members)
+
+        # 保留仍在路径上的车辆（维持上一步顺序），新进入的车辆追加到末尾
+        order = [v for v in self.vehicles if v in member_set]
+        known = set(order)
+        order.extend(v for v in members if v not in known)
+
+        # 插入排序（路径坐标降序）：已有序部分只比较一次
+        dist = coord
+        for i in range(1, len(order)):
+            v = order[i]
+            d = dist[v]
+            j = i - 1
+            while j >= 0 and dist[order[j]] < d:
+                order[j + 1] = order[j]
+                j -= 1
+            if j + 1 != i:
+                order[j + 1] = v
+
+        self.vehicles = order
+        self._pos = {v: i for i, v in enumerate(order)}
+        self._coord = coord
+
+    # ---------------- 查询 ----------------
+    def __len__(self):
+        return len(self.vehicles)
+
+    def __contains__(self, veh_id):
+        return veh_id in self._pos
+
+    def index(self, veh_id):
+        return self._pos[veh_id]
+
+    def position(self, veh_id):
+        """车辆的路径坐标（距路径起点的里程）"""
+        return self._coord[veh_id]
+
+    def gap(self, veh_id):
+        """与前车的路径坐标差（车头间距），头车返回 None"""
+        leader = self.leader(veh_id)
+        if leader is None:
+            return None
+        return self._coord[leader] - self._coord[veh_id]
+
+    def leader(self, veh_id):
+        """前车（更靠前的车辆），头车返回 None"""
+        i = self._pos[veh_id]
+        return self.vehicles[i - 1] if i > 0 else None
+
+    def follower(self, veh_id):
+        """后车，尾车返回 None"""
+        i = self._pos[veh_id] + 1
+        return self.vehicles[i] if i < len(self.vehicles) else None
+
+    @property
+    def head(self):
+        return self.vehicles[0] if self.vehicles else None
+
+    @property
+    def tail(self):
+        return self.vehicles[-1] if self.vehicles else None
@@ -0,0 +1,167 @@
+import math
+import traci
+import traci.constants as tc
+
+# 上下文订阅返回的车辆变量
+CONTEXT_VARS = (tc.VAR_LANE_ID, tc.VAR_LANEPOSITION)
+
+
+class PressureEngine:
+    """
+    基于路口上下文订阅的交通压力引擎：
+    1. 对交叉口（与信号灯同 ID）建立一次车辆上下文订阅，取回半径内所有车辆的车道与位置
+    2. 每步首次查询时单遍扫描，按已注册的车道组和检测范围分桶计数
+    3. 本步剩余查询全部是字典查找，不再产生任何 TraCI 往返
+    """
+
+    def __init__(self, junction_id, lane_groups, ranges, radius=200.0, conn=traci, topology=None,
+                 subscribe=True):
+        self.conn = conn
+        self.junction_id = junction_id
+        self.lane_groups = {name: list(lanes) for name, lanes in lane_groups.items()}
+        self.ranges = tuple(sorted(set(ranges)))
+
+        # 车道 -> 所属车道组（车道过滤表）；车道长度为静态属性，只取一次
+        self.lane_to_groups = {}
+        self.lane_length = {}
+        for name, lanes in self.lane_groups.items():
+            for lane in lanes:
+                self.lane_to_groups.setdefault(lane, []).append(name)
+                if lane not in self.lane_length:
+                    if topology is not None:
+                        self.lane_length[lane] = topology.lane_length[lane]
+                    else:
+                        self.lane_length[lane] = conn.lane.getLength(lane)
+
+        # 上下文订阅按车辆到路口中心的直线距离筛选，而压力按距停止线的距离计算，
+        # 因此半径需覆盖 "最大检测范围 + 停止线到路口中心的距离"，否则远端车辆会被漏计
+        if topology is not None:
+            cx, cy = topology.junction_pos[junction_id]
+        else:
+            cx, cy = conn.junction.getPosition(junction_id)
+        stop_offset = 0.0
+        for lane in self.lane_length:
+            if topology is not None:
+                ex, ey = topology.lane_end[lane]
+            else:
+                ex, ey = conn.lane.getShape(lane)[-1]
+            stop_offset = max(stop_offset, math.hypot(ex - cx, ey - cy))
+        self.radius = max(radius, self.ranges[-1] + stop_offset + 1.0)
+
+        # subscribe=False：控制器进程中的副本，订阅结果由主进程 raw() 取回后传入 sample()
+        if subscribe:
+            conn.junction.subscribeContext(
+                junction_id, tc.CMD_GET_VEHICLE_VARIABLE, self.radius, CONTEXT_VARS
+            )
+        self._counts = None
+        self._dists = None
+
+    def update(self):
+        """在 simulationStep() 之后调用：使上一步的分桶结果失效（惰性重算）"""
+        self._counts = None
+        self._dists = None
+
+    def sample(self, res=None):
+        """立即采样并分桶（供调度器按固定频率调用，查询时不再重算）；res 为外部传入的订阅结果"""
+        self._bucket(res)
+
+    def raw(self):
+        """本步上下文订阅结果（车辆 -> 车道 / 位置）"""
+        return self.conn.junction.getContextSubscriptionResults(self.junction_id) or {}
+
+    def _bucket(self, res=None):
+        """单遍扫描上下文订阅结果，按车道组和检测范围分桶"""
+        counts = {name: dict.fromkeys(self.ranges, 0) for name in self.lane_groups}
+        dists = {name: [] for name in self.lane_groups}
+        if res is None:
+            res = self.raw()
+        for values in res.values():
+            lane = values[tc.VAR_LANE_ID]
+            groups = self.lane_to_groups.get(lane)
+            if groups is None:
+                continue
+            dist_to_stop = self.lane_length[lane] - values[tc.VAR_LANEPOSITION]
+            for name in groups:
+                dists[name].append(dist_to_stop)
+                for r in self.ranges:
+                    if dist_to_stop < r:
+                        counts[name][r] += 1
+        self._counts = counts
+        self._dists = dists
+
+    def pressure(self, group, detection_range):
+        """
+        车道组内【距离停止线 detection_range 以内】的车辆数（无论是否移动）。
+        已注册的检测范围为 O(1) 查表，未注册的范围在本步缓存的距离列表上计数。
+        """
+        if self._counts is None:
+            self._bucket()
+        group_counts = self._counts[group]
+        if detection_range in group_counts:
+            return group_counts[detection_range]
+        return sum(1 for d in self._dists[group] if d < detection_range)
+
+
+def detector_id(lane, detection_range):
+    """E2 压力检测器 ID（与 generate/add.py 生成规则一致）"""
+    return f"e2_{lane}_{int(detection_range)}"
+
+
+class DetectorPressure:
+    """
+    基于 E2 面检测器的交通压力：计数在 SUMO 内部完成，Python 不做逐车处理。
+    每个检测器订阅一次 LAST_STEP_VEHICLE_NUMBER，采样时一次取回全部结果并按车道组求和。
+    接口与 PressureEngine 相同，检测范围必须是已生成检测器的范围。
+    """
+
+    def __init__(self, lane_groups, ranges, conn=traci, subscribe=True):
+        self.conn = conn
+        self.lane_groups = {name: list(lanes) for name, lanes in lane_groups.items()}
+        self.ranges = tuple(sorted(set(ranges)))
+
+        # (车道组, 检测范围) -> 检测器 ID 列表
+        self.group_detectors = {}
+        for name, lanes in self.lane_groups.items():
+            for r in self.ranges:
+                self.group_detectors[(name, r)] = [detector_id(lane, r) for lane in lanes]
+        self._counts = None
+        # subscribe=False：控制器进程中的副本，检测器计数由主进程 raw() 取回后传入 sample()
+        if not subscribe:
+            return
+
+        available = set(conn.lanearea.getIDList())
+        missing = [d for ids in self.group_detectors.values() for d in ids if d not in available]
+        if missing:
+            raise RuntimeError(f"缺少 E2 压力检测器 {missing[:3]} 等 {len(missing)} 个，"
+                               f"请先运行 generate/add.py 并加载 pressure_detectors.add.xml")
+
+        for ids in self.group_detectors.values():
+            for det in ids:
+                conn.lanearea.subscribe(det, [tc.LAST_STEP_VEHICLE_NUMBER])
+
+    def update(self):
+        """在 simulationStep() 之后调用：使上一步的计数失效（惰性重算）"""
+        self._counts = None
+
+    def sample(self, res=None):
+        """立即采样（供调度器按固定频率调用）；res 为外部传入的订阅结果"""
+        self._collect(res)
+
+    def raw(self):
+        """本步各检测器的订阅结果（只含本实例的检测器）"""
+        res = self.conn.lanearea.getAllSubscriptionResults()
+        return {det: res[det] for ids in self.group_detectors.values() for det in ids}
+
+    def _collect(self, res=None):
+        if res is None:
+            res = self.conn.lanearea.getAllSubscriptionResults()
+        self._counts = {
+            key: sum(res[det][tc.LAST_STEP_VEHICLE_NUMBER] for det in ids)
+            for key, ids in self.group_detectors.items()
+        }
+
+    def pressure(self, group, detection_range):
+        """车道组内【距离停止线 detection_range 以内】的车辆数（检测器计数）"""
+        if self._counts is None:
+            self._collect()
+        return self._counts[(group, detection_range)]
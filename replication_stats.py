@@ -0,0 +1,83 @@
+import math
+
+# t 分布 97.5% 分位数（自由度 1~30），更大的自由度取正态分位数 1.96
+T_975 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+         2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+         2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+
+
+def t_quantile(df):
+    if df < 1:
+        return math.inf
+    return T_975[df - 1] if df <= len(T_975) else 1.96
+
+
+class RunningStat:
+    """单个指标的在线均值 / 方差（Welford 算法），每完成一次重复更新一次"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def var(self):
+        """样本方差（n < 2 时为 0）"""
+        return self._m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def half_width(self):
+        """均值 95% 置信区间半宽（n < 2 时为 inf）"""
+        if self.n < 2:
+            return math.inf
+        return t_quantile(self.n - 1) * math.sqrt(self.var / self.n)
+
+    def converged(self, target, relative=True):
+        """置信区间半宽低于目标（relative 时为相对 |均值| 的比例）"""
+        hw = self.half_width()
+        if relative:
+            return hw <= target * abs(self.mean)
+        return hw <= target
+
+    def summary(self):
+        hw = self.half_width()
+        return {"n": self.n, "mean": round(self.mean, 4), "var": round(self.var, 4),
+                "ci95": None if math.isinf(hw) else round(hw, 4)}
+
+
+class ReplicationStats:
+    """
+    一个配置的全部指标统计：analysis_result.json 的 Metrics[类别][指标] 逐项在线更新，
+    只有 tracked 中的（类别, 指标）参与收敛判断，n 为最多的样本数
+    """
+
+    def __init__(self, tracked):
+        self.tracked = list(tracked)
+        self.stats = {}
+
+    def add(self, metrics):
+        for cat, values in metrics.items():
+            if values.get("sample_size") == 0:
+                # 本次重复中该类别没有完成的行程，指标为占位的 0，不计入
+                continue
+            for name, value in values.items():
+                self.stats.setdefault((cat, name), RunningStat()).add(float(value))
+
+    @property
+    def n(self):
+        return max((s.n for s in self.stats.values()), default=0)
+
+    def converged(self, target, relative=True):
+        return all((key in self.stats and self.stats[key].converged(target, relative))
+                   for key in self.tracked)
+
+    def summary(self):
+        out = {}
+        for (cat, name), stat in self.stats.items():
+            out.setdefault(cat, {})[name] = stat.summary()
+        return out
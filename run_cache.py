@@ -0,0 +1,133 @@
+import ast
+import hashlib
+import json
+import os
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from fcd_store import META_FILE, store_path
+from analyze_results_cav_plus import METRICS_FILE
+
+# 仿真结果缓存：每次运行按输入内容的哈希命名，输入不变且输出完整时直接复用
+KEY_FILE = "run_key.json"
+FCD_FILE = "fcd.xml"
+QUEUE_FILE = "queue.xml"
+RESULT_FILES = ("statistic.xml", "tripinfo.xml", QUEUE_FILE, FCD_FILE, "analysis_result.json")
+# 预热运行的输出：SUMO 状态文件
+STATE_FILE = "state.xml"
+# 控制器与分析代码的入口，入口脚本 import 的本地模块一并计入
+CODE_ENTRIES = ("cav_plus.py", "analyze_results_cav_plus.py")
+GENERATE_CONFIG = "generate/config.json"
+
+
+def file_hash(path):
+    """文件内容的 SHA-256（按路径 / 修改时间 / 大小缓存，同一批量运行中每个文件只读一次）"""
+    st = os.stat(path)
+    return _file_hash(path, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=None)
+def _file_hash(path, mtime_ns, size):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def local_modules(entries=CODE_ENTRIES, root="."):
+    """入口脚本及其递归 import 的本地模块（与入口同目录的 .py 文件）"""
+    found = []
+    stack = list(entries)
+    while stack:
+        path = stack.pop()
+        if path in found or not os.path.exists(os.path.join(root, path)):
+            continue
+        found.append(path)
+        with open(os.path.join(root, path), "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            stack.extend(f"{name.split('.')[0]}.py" for name in names)
+    return sorted(found)
+
+
+def sumocfg_inputs(sumocfg):
+    """sumocfg 引用的路网 / 路线 / 附加文件（路径相对于 sumocfg 所在目录）"""
+    base = os.path.dirname(sumocfg)
+    files = []
+    node = ET.parse(sumocfg).getroot().find("input")
+    if node is None:
+        return files
+    for tag in ("net-file", "route-files", "additional-files"):
+        for elem in node.iter(tag):
+            for name in elem.get("value", "").split(","):
+                if name.strip():
+                    files.append(os.path.normpath(os.path.join(base, name.strip())))
+    return files
+
+
+def run_key(params, files):
+    """
+    运行的内容键：参数（信号 / 轨迹 / 流量 / 种子 / 附加命令行参数等）与输入文件内容的 SHA-256。
+    返回 (key, manifest)，manifest 记录各项输入，写入结果目录便于追溯。
+    """
+    manifest = {"params": params, "files": {}}
+    for path in sorted(set(files)):
+        manifest["files"][path] = file_hash(path) if os.path.exists(path) else None
+    blob = json.dumps(manifest, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest(), manifest
+
+
+def is_complete(folder, key, outputs=RESULT_FILES):
+    """结果目录属于该键，且输出完整"""
+    try:
+        with open(os.path.join(folder, KEY_FILE), "r", encoding="utf-8") as f:
+            if json.load(f).get("key") != key:
+                return False
+    except (OSError, ValueError):
+        return False
+    return outputs_complete(folder, outputs)
+
+
+def outputs_complete(folder, outputs=RESULT_FILES):
+    """仿真正常结束，且全部输出（默认含 analysis_result.json）都已生成"""
+    try:
+        with open(os.path.join(folder, "run_info.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if info.get("exit_code") != 0:
+        return False
+    if info.get("metrics") == "online" and FCD_FILE in outputs:
+        # 在线指标模式（cav_plus.py --metrics online）不输出 fcd.xml / queue.xml
+        outputs = [name for name in outputs if name not in (FCD_FILE, QUEUE_FILE)] + [METRICS_FILE]
+    elif info.get("meso"):
+        # 中观仿真（cav_plus.py --meso）不输出 fcd.xml
+        outputs = [name for name in outputs if name != FCD_FILE]
+    for name in outputs:
+        path = os.path.join(folder, name)
+        if name == FCD_FILE and not os.path.exists(path):
+            # fcd.xml 已转换为列式存储后删除（见 fcd_store.py）
+            path = os.path.join(store_path(path), META_FILE)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return False
+    return True
+
+
+def clear_key(folder):
+    """开始（重新）运行前移除键文件：运行中断时目录不会被误判为完整"""
+    path = os.path.join(folder, KEY_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def save_key(folder, key, manifest):
+    """全部输出生成后写入键文件，标记该目录为键的完整结果"""
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, KEY_FILE), "w", encoding="utf-8") as f:
+        json.dump({"key": key, **manifest}, f, indent=4, ensure_ascii=False)
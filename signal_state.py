@@ -0,0 +1,176 @@
+import traci
+import traci.constants as tc
+
+# 信号灯订阅变量：当前相位 / 下次切换时刻 / 当前相位时长 / 当前方案
+TLS_VARS = (
+    tc.TL_CURRENT_PHASE,
+    tc.TL_NEXT_SWITCH,
+    tc.TL_PHASE_DURATION,
+    tc.TL_CURRENT_PROGRAM,
+)
+
+
+class SignalState:
+    """
+    单个信号灯的每步状态快照：
+    1. 相位、下次切换时刻、相位时长、当前方案通过订阅每步取回一次，本步内查询均为属性访问
+    2. 方案逻辑（getAllProgramLogics）与 link 索引 -> 车道映射只取一次并缓存
+    3. 通过 set_phase / set_phase_duration 修改信号后，缓存失效，下次访问时重新读取
+    """
+
+    def __init__(self, tls_id, conn=traci, topology=None):
+        self.conn = conn
+        self.tls_id = tls_id
+        self._topology = topology
+        self._logics = None
+        self._links = None
+        self._lane_links = None
+        self._dirty = False
+        self._program = None
+        conn.trafficlight.subscribe(tls_id, TLS_VARS)
+        self.update()
+
+    def update(self):
+        """在 simulationStep() 之后调用，刷新本步视图"""
+        res = self.conn.trafficlight.getSubscriptionResults(self.tls_id)
+        program = res[tc.TL_CURRENT_PROGRAM]
+        if program != self._program:
+            self._logics = None
+        self._phase = res[tc.TL_CURRENT_PHASE]
+        self._next_switch = res[tc.TL_NEXT_SWITCH]
+        self._phase_duration = res[tc.TL_PHASE_DURATION]
+        self._program = program
+        self._dirty = False
+
+    def _refresh(self):
+        # 本步内信号已被修改：订阅结果已过期，直接读取一次
+        get = self.conn.trafficlight
+        self._phase = get.getPhase(self.tls_id)
+        self._next_switch = get.getNextSwitch(self.tls_id)
+        self._phase_duration = get.getPhaseDuration(self.tls_id)
+        self._program = get.getProgram(self.tls_id)
+        self._dirty = False
+
+    # ---------------- 动态状态 ----------------
+    @property
+    def phase(self):
+        if self._dirty:
+            self._refresh()
+        return self._phase
+
+    @property
+    def next_switch(self):
+        if self._dirty:
+            self._refresh()
+        return self._next_switch
+
+    @property
+    def phase_duration(self):
+        if self._dirty:
+            self._refresh()
+        return self._phase_duration
+
+    @property
+    def program(self):
+        if self._dirty:
+            self._refresh()
+        return self._program
+
+    def remaining(self, now):
+        """当前相位剩余时间"""
+        return self.next_switch - now
+
+    def elapsed(self, now):
+        """当前相位已运行时间"""
+        return self.phase_duration - (self.next_switch - now)
+
+    # ---------------- 静态方案（缓存） ----------------
+    def all_logics(self):
+        if self._logics is None:
+            self._logics = self.conn.trafficlight.getAllProgramLogics(self.tls_id)
+        return self._logics
+
+    def logic(self):
+        """当前激活的方案逻辑（找不到时回退到第一个方案）"""
+        logics = self.all_logics()
+        program = self.program
+        for logic in logics:
+            if logic.programID == program:
+                return logic
+        return logics[0]
+
+    def controlled_links(self):
+        """与 getControlledLinks 同格式的 link 列表"""
+        if self._links is None:
+            if self._topology is not None:
+                self._links = self._topology.controlled_links(self.tls_id)
+            else:
+                self._links = self.conn.trafficlight.getControlledLinks(self.tls_id)
+        return self._links
+
+    def lane_links(self, lane):
+        """进口车道对应的 link 索引列表"""
+        if self._lane_links is None:
+            self._lane_links = {}
+            for i, link in enumerate(self.controlled_links()):
+                for frm, _, _ in link:
+                    self._lane_links.setdefault(frm, []).append(i)
+        return self._lane_links.get(lane, [])
+
+    # ---------------- 写操作 ----------------
+    def set_phase(self, index):
+        self.conn.trafficlight.setPhase(self.tls_id, index)
+        self._invalidate()
+
+    def set_phase_duration(self, duration):
+        self.conn.trafficlight.setPhaseDuration(self.tls_id, duration)
+        self._invalidate()
+
+    def _invalidate(self):
+        self._dirty = True
+        self._logics = None
+
+    def values(self):
+        """本步动态状态 (相位, 下次切换, 相位时长, 方案)，供控制器分片使用"""
+        return self.phase, self.next_switch, self.phase_duration, self.program
+
+
+class SignalView:
+    """
+    控制器进程中的信号灯视图：动态状态由主进程 SignalState.values() 传入，
+    set_phase / set_phase_duration 记录为命令由主进程回放，并按 SUMO 的语义更新本地状态，
+    使同一步内后续的查询（如轨迹控制、时间线）看到修改后的相位：
+    - setPhase(i): 相位变为 i，下次切换 = now + 相位 i 的方案时长
+    - setPhaseDuration(d): 下次切换 = now + d（相位时长不变）
+    """
+
+    def __init__(self, tls_id, values, durations=None):
+        self.tls_id = tls_id
+        self.durations = durations   # 当前方案各相位时长（set_phase 时使用）
+        self.commands = []           # [(SignalState 方法名, 参数)]
+        self.time = None
+        self.phase, self.next_switch, self.phase_duration, self.program = values
+
+    def load(self, time, values):
+        self.time = time
+        self.phase, self.next_switch, self.phase_duration, self.program = values
+
+    def remaining(self, now):
+        return self.next_switch - now
+
+    def elapsed(self, now):
+        return self.phase_duration - (self.next_switch - now)
+
+    def set_phase(self, index):
+        self.commands.append(("set_phase", index))
+        self.phase = index
+        self.phase_duration = self.durations[index]
+        self.next_switch = self.time + self.phase_duration
+
+    def set_phase_duration(self, duration):
+        self.commands.append(("set_phase_duration", duration))
+        self.next_switch = self.time + duration
+
+    def take_commands(self):
+        commands, self.commands = self.commands, []
+        return commands
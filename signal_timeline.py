@@ -0,0 +1,152 @@
+import bisect
+import xml.etree.ElementTree as ET
+
+TLS_ADD_FILE = "test/traffic_light.add.xml"
+GREEN_STATES = ("G", "g")
+
+
+class SignalTimeline:
+    """
+    信号配时时间线预测器：
+    1. 由 tlLogic 的相位时长构建累计时间数组（前缀和），一周期内每条 link 的绿灯窗口预先算好
+    2. 以 SignalState 的当前相位与下次切换时刻为锚点（已包含绿灯延长 / 早断等实时调整），
+       之后的相位按方案时长外推
+    3. 查询任意车道未来 N 个绿灯窗口时只需一次二分查找
+    """
+
+    def __init__(self, tls_id, durations, states, signal, link_indices):
+        self.tls_id = tls_id
+        self.durations = [float(d) for d in durations]
+        self.states = list(states)
+        self.signal = signal
+        # 进口车道 -> link 索引（车道任一 link 为绿灯即视为该车道绿灯）
+        self._link_indices = link_indices
+        self.n_phases = len(self.durations)
+        # 前缀和：cum[i] 为相位 i 在周期内的开始时刻，cum[n] 为周期长度
+        self.cum = [0.0]
+        for d in self.durations:
+            self.cum.append(self.cum[-1] + d)
+        self.cycle = self.cum[-1]
+        self._windows = {}
+
+    @classmethod
+    def from_add_file(cls, tls_id, signal, topology, add_file=TLS_ADD_FILE):
+        """从 traffic_light.add.xml 中读取 tlLogic（与 SignalState 当前方案一致）"""
+        root = ET.parse(add_file).getroot()
+        logic = None
+        for tl in root.iter("tlLogic"):
+            if tl.get("id") == tls_id:
+                logic = tl
+                if tl.get("programID") == signal.program:
+                    break
+        if logic is None:
+            raise ValueError(f"{add_file} 中没有信号灯 {tls_id} 的 tlLogic")
+        phases = logic.findall("phase")
+        return cls(
+            tls_id,
+            [p.get("duration") for p in phases],
+            [p.get("state") for p in phases],
+            signal,
+            lambda lane: topology.link_indices(tls_id, lane),
+        )
+
+    # ---------------- 周期内绿灯窗口（静态，按 link 组缓存） ----------------
+    def _links(self, lane, links):
+        """查询对象：显式给出的 link 索引，或车道的全部 link"""
+        if links is not None:
+            return tuple(links)
+        return tuple(self._link_indices(lane))
+
+    def is_green_phase(self, links, phase):
+        state = self.states[phase]
+        return any(state[i] in GREEN_STATES for i in links)
+
+    def _cycle_windows(self, links):
+        """一组 link 在一个周期内的绿灯窗口 (starts, ends, first_phase)，跨周期首尾相连的窗口合并"""
+        if links not in self._windows:
+            starts, ends, phases = [], [], []
+            for p in range(self.n_phases):
+                if not self.is_green_phase(links, p):
+                    continue
+                if ends and ends[-1] == self.cum[p]:
+                    ends[-1] = self.cum[p + 1]
+                else:
+                    starts.append(self.cum[p])
+                    ends.append(self.cum[p + 1])
+                    phases.append(p)
+            if len(starts) > 1 and starts[0] == 0.0 and ends[-1] == self.cycle:
+                # 末尾窗口延续到下一周期开头
+                ends[-1] = self.cycle + ends[0]
+                starts.pop(0)
+                ends.pop(0)
+                phases.pop(0)
+            self._windows[links] = (starts, ends, phases)
+        return self._windows[links]
+
+    # ---------------- 实时查询 ----------------
+    def green_windows(self, lane, now, n=2, horizon=None, links=None):
+        """
+        车道未来的绿灯窗口 [(开始, 结束, 相位)]，时间为相对 now 的秒数，
+        当前正处于绿灯时第一个窗口从 0 开始。返回最多 n 个窗口，或在 horizon 秒内的全部窗口。
+        links 给出时按这些 link 索引判断（如 getNextTLS 返回的 link），否则取车道的全部 link。
+        """
+        links = self._links(lane, links)
+        starts, ends, phases = self._cycle_windows(links)
+        if not starts:
+            return []
+        phase = self.signal.phase
+        if ends[0] - starts[0] >= self.cycle:
+            # 全周期绿灯
+            return [(0.0, float("inf"), phase)]
+        rem = max(0.0, self.signal.next_switch - now)
+        # 当前相位结束后按方案外推：周期坐标 u 对应相对时间 rem + (u - u0)
+        u0 = self.cum[phase + 1]
+        k, local = divmod(u0, self.cycle)
+        # 第一个结束时刻晚于 local 的窗口（O(log n)）
+        idx = bisect.bisect_right(ends, local)
+        if ends[-1] > self.cycle and local < ends[-1] - self.cycle:
+            # 仍处于上一周期延续过来的窗口内
+            k -= 1
+            idx = len(starts) - 1
+        elif idx == len(starts):
+            k += 1
+            idx = 0
+
+        out = []
+        if self.is_green_phase(links, phase):
+            out.append([0.0, rem, phase])
+        limit = n if horizon is None else None
+        while True:
+            base = k * self.cycle
+            s = base + starts[idx]
+            e = base + ends[idx]
+            t_s = rem + max(0.0, s - u0)
+            t_e = rem + (e - u0)
+            if out and t_s <= out[-1][1] + 1e-9:
+                # 与当前绿灯相连：延长当前窗口
+                out[-1][1] = t_e
+            else:
+                if horizon is not None and t_s > horizon:
+                    break
+                if limit is not None and len(out) >= limit:
+                    break
+                out.append([t_s, t_e, phases[idx]])
+            idx += 1
+            if idx == len(starts):
+                idx = 0
+                k += 1
+        return [tuple(w) for w in out]
+
+    def green_remaining(self, lane, now, links=None):
+        """当前绿灯剩余时间（当前不是绿灯返回 0）"""
+        windows = self.green_windows(lane, now, n=1, links=links)
+        if windows and windows[0][0] == 0.0:
+            return windows[0][1]
+        return 0.0
+
+    def next_green_phase(self, lane, now, links=None):
+        """下一个（非当前）绿灯窗口的起始相位"""
+        for start, _, phase in self.green_windows(lane, now, n=2, links=links):
+            if start > 0.0:
+                return phase
+        return None
@@ -0,0 +1,229 @@
+import json
+import time
+from array import array
+import numpy as np
+
+# 逐步耗时剖析（cav_plus.py --timing）：主循环各阶段的每步耗时、按 API 函数统计的 TraCI 调用次数与耗时、
+# 每辆受控车辆分摊的控制器耗时，运行结束时写入输出目录的 perf.json
+PERF_FILE = "perf.json"
+# 固定的对数直方图分箱（微秒）：1us ~ 2^20us(约 1s)，不同版本 / 运行之间可直接对比
+HIST_EDGES_US = [0.0] + [float(2 ** i) for i in range(21)] + [float("inf")]
+PERCENTILES = (50, 95, 99)
+
+
+def _is_domain(name, value):
+    # traci 的 domain 为带 _name 的实例，libsumo 的 domain 为小写类名的类
+    return hasattr(value, "_name") or (isinstance(value, type) and name[:1].islower())
+
+
+class _DomainCounter:
+    """单个 TraCI domain 的代理：方法调用计数并计时，其他属性原样返回"""
+
+    def __init__(self, counter, name, domain):
+        self._counter = counter
+        self._prefix = f"{name}."
+        self._domain = domain
+        self._cache = {}
+
+    def __getattr__(self, name):
+        func = self._cache.get(name)
+        if func is None:
+            value = getattr(self._domain, name)
+            if not callable(value):
+                return value
+            func = self._cache[name] = self._counter.wrap(self._prefix + name, value)
+        return func
+
+
+class TraciCallCounter:
+    """
+    TraCI / libsumo 模块的计数代理：conn.vehicle.getSpeed(...) 等调用按 "domain.函数" 统计次数与耗时，
+    模块级函数（simulationStep 等）同样统计。elapsed 为累计在 TraCI 调用中的时间，
+    StepProfiler 用它把各阶段耗时拆成 TraCI 部分与 Python 部分。
+    组件在构造时会缓存绑定方法（如 VehicleActuator），代理须在组件创建前替换 traci。
+    """
+
+    def __init__(self, module):
+        self._module = module
+        self._domains = {}
+        self._funcs = {}
+        self.calls = {}     # 函数名 -> [次数, 耗时]
+        self.elapsed = 0.0
+
+    def wrap(self, key, func):
+        stat = self.calls.setdefault(key, [0, 0.0])
+        perf_counter = time.perf_counter
+
+        def counted(*args, **kwargs):
+            t0 = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                dt = perf_counter() - t0
+                stat[0] += 1
+                stat[1] += dt
+                self.elapsed += dt
+        return counted
+
+    def __getattr__(self, name):
+        if name in self._domains:
+            return self._domains[name]
+        if name in self._funcs:
+            return self._funcs[name]
+        value = getattr(self._module, name)
+        if _is_domain(name, value):
+            proxy = self._domains[name] = _DomainCounter(self, name, value)
+            return proxy
+        if callable(value) and not isinstance(value, type):
+            func = self._funcs[name] = self.wrap(name, value)
+            return func
+        return value
+
+    def report(self):
+        """{函数名: {calls, total_s, mean_us}}，按总耗时降序"""
+        rows = sorted(self.calls.items(), key=lambda kv: -kv[1][1])
+        return {key: {"calls": n, "total_s": round(t, 4),
+                      "mean_us": round(t / n * 1e6, 3) if n else 0.0}
+                for key, (n, t) in rows if n}
+
+
+def distribution(samples_s):
+    """耗时样本（秒）-> 统计：总计 / 均值 / 分位数 / 最大值（微秒）与固定分箱直方图"""
+    if not len(samples_s):
+        return {"count": 0}
+    us = np.frombuffer(samples_s, dtype=np.float64) * 1e6
+    counts, _ = np.histogram(us, bins=HIST_EDGES_US)
+    stats = {"count": int(us.size), "total_s": round(float(us.sum()) / 1e6, 4),
+             "mean_us": round(float(us.mean()), 3), "max_us": round(float(us.max()), 3)}
+    for p, v in zip(PERCENTILES, np.percentile(us, PERCENTILES)):
+        stats[f"p{p}_us"] = round(float(v), 3)
+    stats["hist"] = {"edges_us": HIST_EDGES_US[:-1], "counts": counts.tolist()}
+    return stats
+
+
+class NullProfiler:
+    """未开启剖析时的空实现，主循环无需判断"""
+
+    def begin(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def end(self, managed=None):
+        pass
+
+
+class StepProfiler:
+    """
+    主循环逐步剖析：
+    1. begin() 开始一步，mark(phase) 结束当前阶段（记录阶段耗时及其中的 TraCI 耗时），end(managed) 结束一步
+    2. managed 为返回本步受控车辆数的函数（只在控制阶段执行过的步调用），
+       控制阶段耗时按车辆分摊（只统计有受控车辆的步）
+    每个阶段每步一个样本（阶段未执行的步不记录），用 array 存储，结束时统一计算分位数与直方图。
+    """
+
+    def __init__(self, counter=None, control_phase="control"):
+        self.counter = counter
+        self.control_phase = control_phase
+        self.phases = {}      # 阶段 -> array(耗时)
+        self.traci = {}       # 阶段 -> TraCI 调用累计耗时
+        self.steps = array("d")
+        self.per_vehicle = array("d")
+        self.vehicle_steps = 0
+        self._control = None
+
+    def _traci_elapsed(self):
+        return self.counter.elapsed if self.counter is not None else 0.0
+
+    def begin(self):
+        self._t_step = self._t = time.perf_counter()
+        self._c = self._traci_elapsed()
+        self._control = None
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        c = self._traci_elapsed()
+        dt = now - self._t
+        samples = self.phases.get(phase)
+        if samples is None:
+            samples = self.phases[phase] = array("d")
+            self.traci[phase] = 0.0
+        samples.append(dt)
+        self.traci[phase] += c - self._c
+        if phase == self.control_phase:
+            self._control = dt
+        self._t, self._c = now, c
+
+    def end(self, managed=None):
+        self.steps.append(time.perf_counter() - self._t_step)
+        if managed is None or self._control is None:
+            return
+        n = managed()
+        if n:
+            self.per_vehicle.append(self._control / n)
+            self.vehicle_steps += n
+
+    def save(self, path, extra=None):
+        result = {"steps": len(self.steps), "step": distribution(self.steps), "phases": {}}
+        for phase, samples in self.phases.items():
+            stats = distribution(samples)
+            stats["traci_s"] = round(self.traci[phase], 4)
+            stats["python_s"] = round(stats["total_s"] - self.traci[phase], 4)
+            result["phases"][phase] = stats
+        result["controller_per_vehicle"] = dict(distribution(self.per_vehicle),
+                                                vehicle_steps=self.vehicle_steps)
+        if self.counter is not None:
+            result["traci_calls"] = self.counter.report()
+        result.update(extra or {})
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=4, ensure_ascii=False)
+        except OSError as e:
+            print(f"Error saving perf stats: {e}")
+        return result
+
+    def report(self, result):
+        """控制台摘要：各阶段 p50 / p95 / p99 与 TraCI 占比，调用最多的 TraCI 函数"""
+        for phase, s in result["phases"].items():
+            if not s["count"]:
+                continue
+            share = s["traci_s"] / s["total_s"] * 100 if s["total_s"] else 0.0
+            print(f"[timing] {phase}: {s['count']} 次, 总计 {s['total_s']:.2f}s, "
+                  f"p50 {s['p50_us']:.0f}us p95 {s['p95_us']:.0f}us p99 {s['p99_us']:.0f}us, "
+                  f"TraCI {share:.0f}%")
+        v = result["controller_per_vehicle"]
+        if v["count"]:
+            print(f"[timing] 控制器每车耗时: p50 {v['p50_us']:.1f}us p95 {v['p95_us']:.1f}us "
+                  f"p99 {v['p99_us']:.1f}us ({v['vehicle_steps']} 车·步)")
+        for key, c in list(result.get("traci_calls", {}).items())[:5]:
+            print(f"[timing] TraCI {key}: {c['calls']} 次, {c['total_s']:.2f}s")
+
+
+def compare(base_file, new_file):
+    """对比两次运行的 perf.json（如控制器修改前后）：各阶段与每车控制耗时的 p50 / p95 / p99 变化"""
+    with open(base_file, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_file, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    rows = [(phase, base["phases"].get(phase), new["phases"].get(phase))
+            for phase in new["phases"]]
+    rows.append(("per_vehicle", base.get("controller_per_vehicle"),
+                 new.get("controller_per_vehicle")))
+    for name, a, b in rows:
+        if not a or not b or not a.get("count") or not b.get("count"):
+            continue
+        parts = []
+        for p in PERCENTILES:
+            key = f"p{p}_us"
+            change = (b[key] - a[key]) / a[key] * 100 if a[key] else 0.0
+            parts.append(f"p{p} {a[key]:.0f} -> {b[key]:.0f}us ({change:+.1f}%)")
+        print(f"[timing] {name}: {', '.join(parts)}")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        print("用法: python step_profiler.py <基准 perf.json> <新 perf.json>")
+        sys.exit(2)
+    compare(sys.argv[1], sys.argv[2])
@@ -0,0 +1,87 @@
+import json
+import os
+import time
+
+BACKENDS = ("traci", "libsumo")
+BENCH_FILE = "output/backend_bench.json"
+
+
+def load_backend(name="traci", use_gui=False):
+    """
+    选择 SUMO 驱动后端：
+    - traci  : 基于 socket，支持 sumo-gui
+    - libsumo: 进程内调用，省去每次调用的 socket 序列化；不支持 GUI，
+               请求 GUI 或未安装 libsumo 时自动回退到 traci
+    返回 (模块, 实际使用的后端名)，两个模块 API 一致，控制代码无需修改
+    """
+    if name == "libsumo":
+        if use_gui:
+            print("[backend] libsumo 不支持 sumo-gui，回退到 traci")
+        else:
+            try:
+                import libsumo
+                return libsumo, "libsumo"
+            except ImportError:
+                print("[backend] 未找到 libsumo，回退到 traci")
+    import traci
+    return traci, "traci"
+
+
+class StepRateMeter:
+    """统计仿真吞吐（steps/sec），并与另一后端的最近一次记录对比"""
+
+    def __init__(self, backend, run_key):
+        self.backend = backend
+        self.run_key = run_key
+        self.steps = 0
+        self.t0 = time.perf_counter()
+
+    def tick(self):
+        self.steps += 1
+
+    def summary(self):
+        wall = time.perf_counter() - self.t0
+        return {"backend": self.backend, "steps": self.steps, "wall_s": round(wall, 3),
+                "steps_per_s": round(self.steps / wall, 2) if wall > 0 else 0.0}
+
+    def save_summary(self, path, extra=None):
+        """把本次运行的吞吐写入 path（JSON），extra 为附加字段"""
+        info = self.summary()
+        info.update(extra or {})
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(info, f, indent=4, ensure_ascii=False)
+        except OSError as e:
+            print(f"Error saving run summary: {e}")
+        return info
+
+    def report(self, bench_file=BENCH_FILE):
+        wall = time.perf_counter() - self.t0
+        rate = self.steps / wall if wall > 0 else 0.0
+        print(f"[backend] {self.backend}: {self.steps} 步, 耗时 {wall:.1f}s, {rate:.1f} steps/s")
+
+        # 按 (运行配置, 后端) 记录最近一次吞吐，便于不同后端之间对比
+        bench = {}
+        if os.path.exists(bench_file):
+            try:
+                with open(bench_file, "r", encoding="utf-8") as f:
+                    bench = json.load(f)
+            except (OSError, ValueError):
+                bench = {}
+        runs = bench.setdefault(self.run_key, {})
+        runs[self.backend] = {"steps": self.steps, "wall_s": round(wall, 3),
+                              "steps_per_s": round(rate, 2)}
+        for other, rec in runs.items():
+            if other != self.backend and rec.get("steps_per_s"):
+                print(f"[backend] 对比 {other}: {rec['steps_per_s']:.1f} steps/s "
+                      f"(加速比 {rate / rec['steps_per_s']:.2f}x)")
+        try:
+            os.makedirs(os.path.dirname(bench_file), exist_ok=True)
+            # 先写临时文件再替换，避免并行批量运行时读到半截文件
+            tmp_file = f"{bench_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(bench, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_file, bench_file)
+        except OSError as e:
+            print(f"Error saving backend bench: {e}")
+        return rate
@@ -1,7 +1,8 @@
 import pandas as pd
-import xml.etree.ElementTree as ET
+import numpy as np
 import math
-from datetime import datetime, timedelta
+from datetime import datetime
+from fcd_store import open_store
 
 # ================= 配置区域 =================
 FCD_FILE = "output/20251122_20_cav_first/fcd.xml"  # 你的 SUMO 轨迹文件路径
@@ -24,8 +25,7 @@ ROTATION_ANGLE_RAD = math.atan(68 / 97)
 # ===========================================
 
 def convert_fcd_to_kepler_v2():
-    data = []
-    print(f"正在解析 {FCD_FILE} ...")
+    print(f"正在读取 {FCD_FILE} ...")
     print(f"应用坐标中心: {REF_LAT}, {REF_LON}")
     print(f"应用顺时针旋转角度: {math.degrees(ROTATION_ANGLE_RAD):.2f} 度")
 
@@ -39,52 +39,36 @@ def convert_fcd_to_kepler_v2():
     m_per_deg_lat = 111111
     m_per_deg_lon = 111111 * math.cos(math.radians(REF_LAT))
 
-    # 增量解析 XML
-    context = ET.iterparse(FCD_FILE, events=("start", "end"))
-    context = iter(context)
-    event, root = next(context)
-
-    count = 0
-    for event, elem in context:
-        if event == "end" and elem.tag == "timestep":
-            sim_seconds = float(elem.get("time"))
-
-            # --- 【核心修改1】时间格式化 ---
-            # 将仿真的秒数加到基准时间上
-            current_dt = BASE_TIME + timedelta(seconds=sim_seconds)
-            # 格式化为 Kepler 喜欢的字符串格式: YYYY-MM-DD HH:MM:SS
-            time_str = current_dt.strftime("%Y-%m-%d %H:%M:%S")
-
-            for veh in elem.findall("vehicle"):
-                vid = veh.get("id")
-                # 原始 SUMO 坐标 (米)
-                x_raw = float(veh.get("x"))
-                y_raw = float(veh.get("y"))
-                speed = float(veh.get("speed"))
-
-                # --- 【核心修改2】坐标旋转 (顺时针) ---
-                # 注意：这里假设 (0,0) 是旋转中心。如果路网中心不是(0,0)，可能需要先平移再旋转
-                # 通常 SUMO 路网是以 (0,0) 为起点的，这里直接旋转即可
-                x_rot = x_raw * cos_theta + y_raw * sin_theta
-                y_rot = y_raw * cos_theta - x_raw * sin_theta
-
-                # --- 【核心修改3】经纬度映射 ---
-                new_lon = REF_LON + (x_rot / m_per_deg_lon)
-                new_lat = REF_LAT + (y_rot / m_per_deg_lat)
-
-                data.append({
-                    "id": vid,
-                    "time": time_str,  # 现在是日期时间格式了
-                    "longitude": new_lon,
-                    "latitude": new_lat,
-                    "speed": speed,
-                    "type": veh.get("type"),
-                    # 保留原始秒数用于调试(可选)
-                    # "sim_time": sim_seconds
-                })
-                count += 1
-
-            root.clear()
+    # 读取列式存储（首次使用时由 fcd.xml 转换，见 fcd_store.py），按列整体计算
+    store = open_store(FCD_FILE)
+    if store is None:
+        print(f"错误: 找不到文件 {FCD_FILE}")
+        return
+    sim_seconds = np.asarray(store.column("time"))
+    # 原始 SUMO 坐标 (米)，以 float64 计算
+    x_raw = np.asarray(store.column("x"), dtype=np.float64)
+    y_raw = np.asarray(store.column("y"), dtype=np.float64)
+
+    # --- 【核心修改1】时间格式化 ---
+    # 将仿真的秒数加到基准时间上，格式化为 Kepler 喜欢的字符串格式: YYYY-MM-DD HH:MM:SS
+    time_str = (pd.Timestamp(BASE_TIME) + pd.to_timedelta(sim_seconds, unit="s")).strftime("%Y-%m-%d %H:%M:%S")
+
+    # --- 【核心修改2】坐标旋转 (顺时针) ---
+    # 注意：这里假设 (0,0) 是旋转中心。如果路网中心不是(0,0)，可能需要先平移再旋转
+    # 通常 SUMO 路网是以 (0,0) 为起点的，这里直接旋转即可
+    x_rot = x_raw * cos_theta + y_raw * sin_theta
+    y_rot = y_raw * cos_theta - x_raw * sin_theta
+
+    # --- 【核心修改3】经纬度映射 ---
+    data = {
+        "id": np.asarray(store.vehicles, dtype=object)[store.column("veh")],
+        "time": time_str,  # 现在是日期时间格式了
+        "longitude": REF_LON + (x_rot / m_per_deg_lon),
+        "latitude": REF_LAT + (y_rot / m_per_deg_lat),
+        "speed": np.asarray(store.column("speed")),
+        "type": np.asarray(store.types, dtype=object)[store.column("type")],
+    }
+    count = len(store)
 
     print(f"解析完成，正在保存 CSV (共 {count} 条数据)...")
     df = pd.DataFrame(data)
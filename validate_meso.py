@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# 中观仿真验证：同一组配置（无轨迹控制）分别以微观与中观（cav_plus.py --meso）运行，
+# 对比延误 / 停车 / 速度与排队指标，以及仿真速度，结果写入 report.json 与 report.md。
+# 两组运行都经 multi_cav_plus.py 调度，同样按内容键缓存，重复执行只补跑缺失的任务。
+
+VALIDATION_FOLDER = "output/meso_validation"
+FIDELITIES = ("micro", "meso")
+CATEGORIES = ("HV", "HV_same", "CAV")
+TRIP_METRICS = ("avg_delay_s", "avg_stops_count", "avg_speed_m_s")
+QUEUE_METRICS = ("max_queue_hv", "max_queue_cav")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="中观 / 微观仿真结果对比")
+    parser.add_argument("--signal", nargs="+", choices=["on", "off"], default=["on", "off"],
+                        help="信号优先取值（默认 on off；轨迹控制在中观下不可用，两组均关闭）")
+    parser.add_argument("--scales", nargs="+", type=float, default=[1.0, 88 / 52],
+                        help="交通流量缩放比例（默认 1.0 与 88/52）")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[1, 2, 3], help="SUMO 随机种子")
+    parser.add_argument("--end", type=float, default=1800, help="仿真时长（秒，默认 1800）")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="同时运行的仿真数")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="相对误差容限（默认 0.1，超出的指标在报告中标出）")
+    parser.add_argument("--folder", default=VALIDATION_FOLDER, help="输出根目录")
+    # 其余参数原样传给 multi_cav_plus.py（如 --corridor、--backend traci）
+    return parser.parse_known_args()
+
+
+def run_sweep(fidelity, args, extra):
+    """以 multi_cav_plus.py 运行一组配置，返回 {任务名: 结果}"""
+    folder = os.path.join(args.folder, fidelity)
+    cmd = [sys.executable, "multi_cav_plus.py", "--traj", "off", "--signal", *args.signal,
+           "--scales", *map(str, args.scales), "--seeds", *map(str, args.seeds),
+           "--jobs", str(args.jobs), "--folder", folder, "--end", str(args.end)] + extra
+    if fidelity == "meso":
+        cmd.append("--meso")
+    print(f"[meso] 运行{fidelity}组: {' '.join(cmd)}")
+    subprocess.run(cmd)
+    try:
+        with open(os.path.join(folder, "sweep_results.json"), "r", encoding="utf-8") as f:
+            return {r["name"]: r for r in json.load(f)["results"]}
+    except (OSError, ValueError, KeyError):
+        print(f"[meso] {fidelity}组没有生成 sweep_results.json")
+        return {}
+
+
+def load_values(folder):
+    """analysis_result.json -> {指标名: 值}（类别.指标 与 全局排队指标）"""
+    with open(os.path.join(folder, "analysis_result.json"), "r", encoding="utf-8") as f:
+        res = json.load(f)
+    values = {}
+    for cat in CATEGORIES:
+        m = res["Metrics"][cat]
+        if m["sample_size"] == 0:
+            continue
+        for name in TRIP_METRICS:
+            values[f"{cat}.{name}"] = m[name]
+    for name in QUEUE_METRICS:
+        values[name] = res["Global"][name]
+    return values
+
+
+def rel_error(meso, micro):
+    return None if micro == 0 else (meso - micro) / abs(micro)
+
+
+def compare(results):
+    """按任务名配对比较，返回逐任务对比"""
+    pairs = []
+    for name in sorted(set(results["micro"]) & set(results["meso"])):
+        micro, meso = results["micro"][name], results["meso"][name]
+        if micro["exit_code"] != 0 or meso["exit_code"] != 0:
+            print(f"[meso] {name}: 运行失败，跳过")
+            continue
+        a, b = load_values(micro["folder"]), load_values(meso["folder"])
+        pairs.append({
+            "name": name,
+            "config": name.rsplit("_s", 1)[0] if micro.get("seed") is not None else name,
+            "steps_per_s": {"micro": micro.get("steps_per_s"), "meso": meso.get("steps_per_s")},
+            "metrics": {k: {"micro": a[k], "meso": b[k], "rel_error": rel_error(b[k], a[k])}
+                        for k in a if k in b},
+        })
+    return pairs
+
+
+def summarize(pairs, tolerance):
+    """
+    按配置（各种子合并）与指标汇总：{配置: {指标: 统计}}。
+    bias 为中观均值相对微观均值的偏差（系统偏差），max_abs_rel_error 为逐任务相对误差的最大值。
+    """
+    values = {}
+    for pair in pairs:
+        for key, v in pair["metrics"].items():
+            values.setdefault(pair["config"], {}).setdefault(key, []).append(v)
+    groups = {}
+    for config, metrics in values.items():
+        groups[config] = {}
+        for key, vs in metrics.items():
+            micro = sum(v["micro"] for v in vs) / len(vs)
+            meso = sum(v["meso"] for v in vs) / len(vs)
+            errs = [abs(v["rel_error"]) for v in vs if v["rel_error"] is not None]
+            bias = rel_error(meso, micro)
+            groups[config][key] = {
+                "runs": len(vs),
+                "micro_mean": round(micro, 3),
+                "meso_mean": round(meso, 3),
+                "bias": None if bias is None else round(bias, 4),
+                "max_abs_rel_error": round(max(errs), 4) if errs else None,
+                "within_tolerance": bias is not None and abs(bias) <= tolerance,
+            }
+    return groups
+
+
+def speedup(pairs):
+    """中观相对微观的平均 steps/s 倍数"""
+    ratios = [p["steps_per_s"]["meso"] / p["steps_per_s"]["micro"] for p in pairs
+              if p["steps_per_s"]["micro"] and p["steps_per_s"]["meso"]]
+    return round(sum(ratios) / len(ratios), 2) if ratios else None
+
+
+def write_markdown(path, groups, ratio, args):
+    lines = [
+        "# 中观 / 微观仿真对比",
+        "",
+        f"- 轨迹控制关闭，种子 {' '.join(map(str, args.seeds))}，时长 {args.end:g}s",
+        f"- 中观 steps/s 为微观的 {ratio}x" if ratio else "- 无 steps/s 数据",
+        f"- 相对偏差容限 {args.tolerance:g}（超出的指标标 ✗）",
+    ]
+    for config, summary in groups.items():
+        lines += [
+            "",
+            f"## {config}",
+            "",
+            "| 指标 | 微观均值 | 中观均值 | 相对偏差 | 最大逐任务误差 | |",
+            "|------|---------|---------|---------|--------------|---|",
+        ]
+        for key, s in summary.items():
+            bias = "-" if s["bias"] is None else f"{s['bias']:+.1%}"
+            worst = "-" if s["max_abs_rel_error"] is None else f"{s['max_abs_rel_error']:.1%}"
+            lines.append(f"| {key} | {s['micro_mean']} | {s['meso_mean']} | {bias} | {worst} | "
+                         f"{'✓' if s['within_tolerance'] else '✗'} |")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return lines
+
+
+def main():
+    args, extra = parse_args()
+    results = {fidelity: run_sweep(fidelity, args, extra) for fidelity in FIDELITIES}
+    pairs = compare(results)
+    if not pairs:
+        print("[meso] 没有可对比的任务")
+        return 1
+    groups = summarize(pairs, args.tolerance)
+    ratio = speedup(pairs)
+    report = {"signal": args.signal, "scales": args.scales, "seeds": args.seeds, "end": args.end,
+              "tolerance": args.tolerance, "speedup": ratio, "summary": groups, "runs": pairs}
+    os.makedirs(args.folder, exist_ok=True)
+    with open(os.path.join(args.folder, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    lines = write_markdown(os.path.join(args.folder, "report.md"), groups, ratio, args)
+    print("\n".join(lines))
+    print(f"[meso] 报告已保存到 {args.folder}/report.json, report.md")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import traci
+
+
+class VehicleActuator:
+    """
+    差分式执行层：记录每辆车每个属性最近一次下发的值，
+    本步内的写操作先暂存，步末 flush() 时只下发与已下发值不同的命令。
+    setSpeed / setSpeedMode / setTau / setMinGap / setColor 在 SUMO 中均为持久设置，
+    重复下发相同值没有任何效果，只是白白增加 TraCI 往返。
+    """
+
+    def __init__(self, conn=traci, use_color=True):
+        self.conn = conn
+        # 无 GUI 时颜色无人观看，setColor 直接丢弃
+        self.use_color = use_color
+        # conn=None：控制器进程中只暂存命令，由 take() 交给主进程的执行层 merge()
+        self._setters = {} if conn is None else {
+            "speed": conn.vehicle.setSpeed,
+            "speed_mode": conn.vehicle.setSpeedMode,
+            "tau": conn.vehicle.setTau,
+            "min_gap": conn.vehicle.setMinGap,
+            "color": conn.vehicle.setColor,
+        }
+        self._committed = {}   # veh_id -> {attr: value}
+        self._pending = {}     # veh_id -> {attr: value}（按写入顺序）
+        self._released = set() # 本步 flush 后即清除记录的车辆
+        self.sent = 0
+        self.suppressed = 0
+        self.skipped_color = 0
+
+    # ---------------- 写操作（暂存） ----------------
+    def _set(self, veh_id, attr, value):
+        attrs = self._pending.setdefault(veh_id, {})
+        if attr in attrs:
+            # 同一步内重复写同一属性，只保留最后一次
+            self.suppressed += 1
+        attrs[attr] = value
+
+    def set_speed(self, veh_id, speed):
+        self._set(veh_id, "speed", speed)
+
+    def set_speed_mode(self, veh_id, mode):
+        self._set(veh_id, "speed_mode", mode)
+
+    def set_tau(self, veh_id, tau):
+        self._set(veh_id, "tau", tau)
+
+    def set_min_gap(self, veh_id, min_gap):
+        self._set(veh_id, "min_gap", min_gap)
+
+    def set_color(self, veh_id, color):
+        if not self.use_color:
+            self.skipped_color += 1
+            return
+        self._set(veh_id, "color", tuple(color))
+
+    # ---------------- 步末下发 ----------------
+    def flush(self):
+        """每步末尾调用一次：只下发真正发生变化的属性"""
+        for veh_id, attrs in self._pending.items():
+            committed = self._committed.setdefault(veh_id, {})
+            for attr, value in attrs.items():
+                if committed.get(attr) == value:
+                    self.suppressed += 1
+                    continue
+                self._setters[attr](veh_id, value)
+                committed[attr] = value
+                self.sent += 1
+        self._pending = {}
+        for veh_id in self._released:
+            self._committed.pop(veh_id, None)
+        self._released = set()
+
+    def take(self):
+        """取出本步暂存的命令 {veh_id: {attr: value}} 及统计（控制器进程中代替 flush）"""
+        pending, self._pending = self._pending, {}
+        stats = (self.suppressed, self.skipped_color)
+        self.suppressed = 0
+        self.skipped_color = 0
+        return pending, stats
+
+    def merge(self, pending, stats=(0, 0)):
+        """并入控制器进程暂存的命令，随本步 flush() 一起做差分下发"""
+        for veh_id, attrs in pending.items():
+            for attr, value in attrs.items():
+                self._set(veh_id, attr, value)
+        self.suppressed += stats[0]
+        self.skipped_color += stats[1]
+
+    def release(self, veh_id):
+        """车辆退出控制：本步恢复默认值的命令下发后清除其记录"""
+        self._released.add(veh_id)
+
+    def forget(self, veh_id):
+        """车辆离开路网后清除其记录"""
+        self._committed.pop(veh_id, None)
+        self._pending.pop(veh_id, None)
+
+    def report(self):
+        total = self.sent + self.suppressed
+        ratio = self.suppressed / total * 100 if total > 0 else 0.0
+        print(f"[actuator] 下发 {self.sent} 条命令, 抑制重复 {self.suppressed} 条 ({ratio:.1f}%), "
+              f"跳过 setColor {self.skipped_color} 条")
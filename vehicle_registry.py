@@ -0,0 +1,92 @@
+from enum import IntEnum
+import traci
+
+
+class VehClass(IntEnum):
+    CAV = 0       # 网联自动驾驶车（taxi 车型）
+    HV_SAME = 1   # 与受控编队同一流向（东西直行）的人工驾驶车
+    HV = 2        # 其他人工驾驶车
+    BUS = 3       # 公交车
+
+
+def is_same_path(veh_id):
+    # 受控流向：东西直行（车辆 ID 由 flow 名生成，纯字符串判断）
+    return ("straight" in veh_id) and (("east" in veh_id) or ("west" in veh_id))
+
+
+def classify_vehicle(veh_id, type_id, same_path=is_same_path):
+    """按车辆 ID 与车型 ID 分类（每辆车只调用一次）"""
+    if veh_id.startswith("bus_") or "bus" in type_id:
+        return VehClass.BUS
+    if "taxi" in type_id:
+        return VehClass.CAV
+    if same_path(veh_id):
+        return VehClass.HV_SAME
+    return VehClass.HV
+
+
+class VehicleRegistry:
+    """
+    基于出发/到达事件的车辆分类缓存：
+    1. 每步读取 getDepartedIDList，新出发车辆只在此时查询一次车型并分类
+    2. 读取 getArrivedIDList 移除已到达车辆
+    3. 控制器通过 O(1) 的成员判断和按类别预建的集合取车，不再逐步做字符串匹配和 getTypeID
+    各类别集合按出发顺序排列（dict 作为有序集合）。
+    """
+
+    def __init__(self, conn=traci, same_path=is_same_path):
+        self.conn = conn
+        self.same_path = same_path
+        self.classes = {}                               # veh_id -> VehClass
+        self.by_class = {c: {} for c in VehClass}       # VehClass -> {veh_id: None}
+        self.path_cavs = {}                             # 受控流向上的 CAV
+        self.classified = 0
+        # 本步出发 / 到达的车辆（供在线指标等按车订阅的组件使用）
+        self.departed = ()
+        self.arrived = ()
+
+    def update(self):
+        """在 simulationStep() 之后调用"""
+        self.arrived = self.conn.simulation.getArrivedIDList()
+        for veh_id in self.arrived:
+            cls = self.classes.pop(veh_id, None)
+            if cls is not None:
+                self.by_class[cls].pop(veh_id, None)
+                self.path_cavs.pop(veh_id, None)
+        self.departed = self.conn.simulation.getDepartedIDList()
+        for veh_id in self.departed:
+            self._add(veh_id)
+
+    def add_running(self):
+        """分类当前已在网的车辆（如从保存的状态启动时），在仿真开始前调用一次"""
+        for veh_id in self.conn.vehicle.getIDList():
+            if veh_id not in self.classes:
+                self._add(veh_id)
+
+    def _add(self, veh_id):
+        type_id = self.conn.vehicle.getTypeID(veh_id)
+        cls = classify_vehicle(veh_id, type_id, self.same_path)
+        self.classes[veh_id] = cls
+        self.by_class[cls][veh_id] = None
+        if cls == VehClass.CAV and self.same_path(veh_id):
+            self.path_cavs[veh_id] = None
+        self.classified += 1
+
+    # ---------------- 查询 ----------------
+    def get(self, veh_id):
+        """车辆类别，未出发或已到达返回 None"""
+        return self.classes.get(veh_id)
+
+    def is_cav(self, veh_id):
+        return self.classes.get(veh_id) == VehClass.CAV
+
+    def is_path_cav(self, veh_id):
+        """受控流向（东西直行）上的 CAV"""
+        return veh_id in self.path_cavs
+
+    def is_alive(self, veh_id):
+        return veh_id in self.classes
+
+    def members(self, cls):
+        """某类别的全部在网车辆（集合视图，按出发顺序）"""
+        return self.by_class[cls].keys()
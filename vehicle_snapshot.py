@@ -0,0 +1,150 @@
+import traci
+import traci.constants as tc
+from collections import namedtuple
+from types import MappingProxyType
+
+# 单车状态（只读），字段与原先逐车调用的 TraCI getter 一一对应
+VehicleState = namedtuple(
+    "VehicleState",
+    ["type_id", "lane_id", "speed", "accel", "lane_pos"]
+)
+
+# 车辆订阅变量：getTypeID / getLaneID / getSpeed / getAcceleration / getLanePosition
+VEHICLE_VARS = (
+    tc.VAR_TYPE,
+    tc.VAR_LANE_ID,
+    tc.VAR_SPEED,
+    tc.VAR_ACCELERATION,
+    tc.VAR_LANEPOSITION,
+)
+
+
+class VehicleSnapshot:
+    """
+    基于订阅的每步状态快照：
+    1. 对编队车道订阅车辆列表（LAST_STEP_VEHICLE_ID_LIST）
+    2. 车辆首次进入编队车道时订阅一次状态变量，离开后退订
+    3. 每步通过 getAllSubscriptionResults 一次性取回所有数值，
+       控制器只读本步视图，不再逐车发起 TraCI 往返
+    """
+
+    def __init__(self, lanes, conn=traci, veh_filter=None, topology=None, shared=None):
+        self.conn = conn
+        self.lanes = list(lanes)
+        # 车辆 ID 预筛选（纯字符串判断，不走 TraCI），None 表示订阅全部
+        self.veh_filter = veh_filter
+        # shared：已以 VEHICLE_VARS 的超集订阅所有车辆的组件（在线指标），本步订阅结果取其 results，
+        # 不再逐车订阅 / 退订（同一车辆的订阅会互相覆盖），也不再重复取回订阅结果
+        self.shared = shared
+        self.time = None
+        self.lane_length = {}
+        self._subscribed = set()
+        self._lane_vehs = {}
+        self._states = {}
+        self._alive = frozenset()
+
+        for lane in self.lanes:
+            # 车道长度是静态属性：优先取自路网拓扑索引，否则通过 TraCI 只取一次
+            if topology is not None:
+                self.lane_length[lane] = topology.lane_length[lane]
+            else:
+                self.lane_length[lane] = conn.lane.getLength(lane)
+            conn.lane.subscribe(lane, [tc.LAST_STEP_VEHICLE_ID_LIST])
+
+    def update(self):
+        """在 simulationStep() 之后调用，刷新本步视图"""
+        self.time = self.conn.simulation.getTime()
+        lane_res = self.conn.lane.getAllSubscriptionResults()
+
+        lane_vehs = {}
+        on_lanes = set()
+        for lane in self.lanes:
+            vehs = lane_res.get(lane, {}).get(tc.LAST_STEP_VEHICLE_ID_LIST, ())
+            if self.veh_filter is not None:
+                vehs = tuple(v for v in vehs if self.veh_filter(v))
+            else:
+                vehs = tuple(vehs)
+            lane_vehs[lane] = vehs
+            on_lanes.update(vehs)
+
+        # 新进入编队车道的车辆：订阅一次（订阅应答即包含当前数值）
+        for veh_id in on_lanes - self._subscribed:
+            if self.shared is None:
+                self.conn.vehicle.subscribe(veh_id, VEHICLE_VARS)
+            self._subscribed.add(veh_id)
+
+        if self.shared is None:
+            veh_res = self.conn.vehicle.getAllSubscriptionResults()
+        else:
+            veh_res = self.shared.results
+        # 仍在路网中的已订阅车辆（已到达终点的车辆订阅会被 SUMO 自动移除）
+        self._alive = frozenset(v for v in self._subscribed if v in veh_res)
+
+        # 离开编队车道但仍在路网中的车辆：退订
+        for veh_id in self._subscribed - on_lanes:
+            if veh_id in self._alive and self.shared is None:
+                self.conn.vehicle.unsubscribe(veh_id)
+        self._subscribed = on_lanes
+
+        states = {}
+        for veh_id in on_lanes:
+            res = veh_res[veh_id]
+            states[veh_id] = VehicleState(
+                res[tc.VAR_TYPE],
+                res[tc.VAR_LANE_ID],
+                res[tc.VAR_SPEED],
+                res[tc.VAR_ACCELERATION],
+                res[tc.VAR_LANEPOSITION],
+            )
+        self._lane_vehs = lane_vehs
+        self._states = states
+
+    # ---------------- 只读查询 ----------------
+    def lane_vehicles(self, lane):
+        """车道上的车辆 ID（顺序与 getLastStepVehicleIDs 一致）"""
+        return self._lane_vehs.get(lane, ())
+
+    def state(self, veh_id):
+        return self._states[veh_id]
+
+    @property
+    def states(self):
+        return MappingProxyType(self._states)
+
+    def is_alive(self, veh_id):
+        """上一帧已订阅的车辆本步是否仍在路网中"""
+        return veh_id in self._alive
+
+    def export(self, lanes):
+        """一组车道的本步视图 (车道 -> 车辆, 车辆 -> 状态)，供控制器分片使用（可序列化）"""
+        lane_vehs = {lane: self._lane_vehs.get(lane, ()) for lane in lanes}
+        states = {v: self._states[v] for vehs in lane_vehs.values() for v in vehs}
+        return lane_vehs, states
+
+
+class SnapshotView:
+    """
+    控制器进程中的只读快照：内容由主进程 VehicleSnapshot.export() 按分片车道导出后传入，
+    查询接口与 VehicleSnapshot 相同，不持有 TraCI 连接。
+    """
+
+    def __init__(self, lane_length):
+        self.lane_length = lane_length
+        self.time = None
+        self._lane_vehs = {}
+        self._states = {}
+
+    def load(self, time, lane_vehs, states):
+        self.time = time
+        self._lane_vehs = lane_vehs
+        self._states = states
+
+    def lane_vehicles(self, lane):
+        return self._lane_vehs.get(lane, ())
+
+    def state(self, veh_id):
+        return self._states[veh_id]
+
+    @property
+    def states(self):
+        return MappingProxyType(self._states)